@@ -0,0 +1,170 @@
+<?php
+require_once("../inc/db.php");
+require_once("../inc/cache.php");
+
+// Faceted Pokémon filter, answered from the pokemon_facet read model in one
+// query: a page of matching Pokémon plus type, generation and category counts
+// over everything that matched.
+//   type         comma list, a Pokémon must have all of them (water,ground)
+//   generation   comma list, any of them (3,4)
+//   category     comma list of legendary, mythical, baby, standard
+//   legendary    true or false, shorthand for including/excluding legendaries
+//   min_<stat>, max_<stat>   hp, attack, defense, special_attack, special_defense, speed, total
+//   sort         order (default), name, or a stat (highest first)
+//   limit, offset   page, limit 1-500 (default 50)
+// e.g. filter.php?generation=4&type=water&min_speed=100&legendary=false
+$stats = ["hp", "attack", "defense", "special_attack", "special_defense", "speed", "total"];
+$categories = ["legendary", "mythical", "baby", "standard"];
+
+function listParameter($name) {
+    if (!isset($_GET[$name]) || trim($_GET[$name]) === "") {
+        return [];
+    }
+    return array_values(array_filter(array_map("trim", explode(",", strtolower($_GET[$name]))), "strlen"));
+}
+
+function pgArray($values) {
+    // Array literal for a text[]/int[] parameter; values are quoted, so commas and braces stay literal
+    return "{" . implode(",", array_map(function ($v) {
+        return "\"" . addcslashes($v, "\"\\") . "\"";
+    }, $values)) . "}";
+}
+
+$conditions = [];
+$params = [];
+function addCondition(&$conditions, &$params, $template, $value) {
+    $params[] = $value;
+    $conditions[] = str_replace("?", "$" . count($params), $template);
+}
+
+$types = listParameter("type");
+if (!empty($types)) {
+    addCondition($conditions, $params, "types @> ?::text[]", pgArray($types));
+}
+$generations = array_map("intval", listParameter("generation"));
+if (!empty($generations)) {
+    addCondition($conditions, $params, "generation = ANY(?::int[])", pgArray($generations));
+}
+$category = array_values(array_intersect(listParameter("category"), $categories));
+if (!empty($category)) {
+    addCondition($conditions, $params, "category = ANY(?::text[])", pgArray($category));
+}
+if (isset($_GET['legendary'])) {
+    addCondition($conditions, $params, $_GET['legendary'] === "true" ? "category = ?" : "category <> ?", "legendary");
+}
+foreach ($stats as $stat) {
+    if (isset($_GET["min_$stat"]) && is_numeric($_GET["min_$stat"])) {
+        addCondition($conditions, $params, "$stat >= ?", (int)$_GET["min_$stat"]);
+    }
+    if (isset($_GET["max_$stat"]) && is_numeric($_GET["max_$stat"])) {
+        addCondition($conditions, $params, "$stat <= ?", (int)$_GET["max_$stat"]);
+    }
+}
+
+$sort = isset($_GET['sort']) ? $_GET['sort'] : "order";
+if (in_array($sort, $stats, true)) {
+    $orderBy = "$sort DESC, \"order\"";
+} elseif ($sort === "name") {
+    $orderBy = "name, \"order\"";
+} else {
+    $orderBy = "\"order\"";
+}
+$limit = isset($_GET['limit']) ? max(1, min(500, (int)$_GET['limit'])) : 50;
+$offset = isset($_GET['offset']) ? max(0, (int)$_GET['offset']) : 0;
+
+// Results only change with the data; revalidations skip the database
+$conn = null;
+$version = datasetVersion();
+if ($version === null) {
+    $conn = connectDB("read");
+    $version = datasetVersion($conn);
+}
+if (sendValidators($version)) {
+    exit;
+}
+if ($conn === null) {
+    $conn = connectDB("read");
+}
+
+header("Content-Type: application/xml");
+
+// Without filters the counts are the precomputed ones; otherwise they are
+// aggregated over the filtered rows, which are computed once for both the
+// page and the counts
+if (empty($conditions)) {
+    $counts = "SELECT facet, value, count FROM pokemon_facet_count";
+} else {
+    $counts = "SELECT 'total' AS facet, 'all' AS value, count(*) AS count FROM filtered
+        UNION ALL
+        SELECT 'type', t.type, count(*) FROM filtered f, unnest(f.types) AS t(type) GROUP BY t.type
+        UNION ALL
+        SELECT 'generation', f.generation::text, count(*) FROM filtered f WHERE f.generation IS NOT NULL GROUP BY f.generation
+        UNION ALL
+        SELECT 'category', f.category, count(*) FROM filtered f GROUP BY f.category";
+}
+$params[] = $limit;
+$params[] = $offset;
+$sql = "WITH filtered AS (
+        SELECT * FROM pokemon_facet" . (empty($conditions) ? "" : " WHERE " . implode(" AND ", $conditions)) . "
+    ), page AS (
+        SELECT row_number() OVER (ORDER BY $orderBy) AS position,
+            name, sprite_front_default, primary_type, secondary_type, generation, category,
+            hp, attack, defense, special_attack, special_defense, speed, total
+        FROM filtered
+        ORDER BY $orderBy
+        LIMIT $" . (count($params) - 1) . " OFFSET $" . count($params) . "
+    ), counts AS ($counts)
+    SELECT (SELECT json_agg(page ORDER BY position) FROM page) AS rows,
+        (SELECT json_agg(counts ORDER BY facet, count DESC, value) FROM counts) AS facets";
+
+$result = queryParams($conn, $sql, $params, $sqlState);
+if (!$result && $sqlState === UNDEFINED_TABLE) {
+    http_response_code(503);
+    die("<error>Facet index missing; load the data with db_init.py.</error>");
+}
+if (!$result) {
+    http_response_code(500);
+    die("<error>Filter failed.</error>");
+}
+$row = pg_fetch_assoc($result);
+$rows = json_decode($row['rows'] ?? "null", true) ?: [];
+$facets = [];
+$total = 0;
+foreach (json_decode($row['facets'] ?? "null", true) ?: [] as $count) {
+    if ($count['facet'] === "total") {
+        $total = (int)$count['count'];
+    } else {
+        $facets[$count['facet']][$count['value']] = (int)$count['count'];
+    }
+}
+
+echo "<?xml version=\"1.0\" encoding=\"UTF-8\"?>";
+echo "<pokemon_filter total=\"$total\" limit=\"$limit\" offset=\"$offset\">";
+echo "<facets>";
+foreach ($facets as $facet => $values) {
+    echo "<facet name=\"" . htmlspecialchars($facet) . "\">";
+    foreach ($values as $value => $count) {
+        echo "<value count=\"$count\">" . htmlspecialchars($value) . "</value>";
+    }
+    echo "</facet>";
+}
+echo "</facets>";
+echo "<pokemon_list>";
+foreach ($rows as $pokemon) {
+    echo "<pokemon>";
+    echo "<name>" . htmlspecialchars($pokemon['name']) . "</name>";
+    echo "<sprite>" . htmlspecialchars($pokemon['sprite_front_default'] ?? "") . "</sprite>";
+    echo "<primary_type>" . htmlspecialchars($pokemon['primary_type'] ?? "") . "</primary_type>";
+    echo "<secondary_type>" . htmlspecialchars($pokemon['secondary_type'] ?? "") . "</secondary_type>";
+    echo "<generation>" . (int)$pokemon['generation'] . "</generation>";
+    echo "<category>" . htmlspecialchars($pokemon['category']) . "</category>";
+    echo "<stats";
+    foreach ($stats as $stat) {
+        echo " $stat=\"" . (int)$pokemon[$stat] . "\"";
+    }
+    echo "/>";
+    echo "</pokemon>";
+}
+echo "</pokemon_list>";
+echo "</pokemon_filter>";
+?>
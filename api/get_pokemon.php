@@ -1,67 +1,188 @@
 <?php
-header("Content-Type: application/xml");
-echo "<?xml version=\"1.0\" encoding=\"UTF-8\"?>";
-
 require_once("../inc/db.php");
-
-$conn = connectDB();
+require_once("../inc/cache.php");
+require_once("../inc/snapshot.php");
 
 // Read query parameters
 $searchName = isset($_GET['pokemon']) ? trim($_GET['pokemon']) : null;
 $isRandom = isset($_GET['random']) && $_GET['random'] === "true";
+// One Pokémon's pokemon_detail row, by id or exact name
+$detail = isset($_GET['detail']) && trim($_GET['detail']) !== "" ? trim($_GET['detail']) : null;
+// "xml" (default) or "ndjson": a header line naming the fields, then one JSON array per Pokémon
+$format = isset($_GET['format']) && $_GET['format'] === "ndjson" ? "ndjson" : "xml";
 
-// Start building SQL and params
-$sql = "SELECT name, sprite_front_default, primary_type, secondary_type FROM pokemon";
-$params = [];
-$conditions = [];
+// On a read node set up to serve the loader's dataset file (see
+// inc/snapshot.php), the file answers everything and no database is needed
+$snapshot = openSnapshot();
 
-// Add name filter if provided
-if ($searchName !== null && $searchName !== "") {
-    $conditions[] = "LOWER(name) LIKE LOWER($1)";
-    $params[] = "%" . $searchName . "%";
+// Read-only, so a streaming replica may answer; connect before any output so
+// a failure can still set the status code. A revalidation that still matches
+// the published dataset version is answered before connecting at all.
+$conn = null;
+if ($isRandom) {
+    // A different Pokémon on every request
+    header("Cache-Control: no-store");
+} else {
+    $version = datasetVersion();
+    if ($version === null && $snapshot !== null) {
+        $version = snapshotVersion($snapshot);
+    } elseif ($version === null) {
+        $conn = connectDB("read");
+        $version = datasetVersion($conn);
+    }
+    if (sendValidators($version, $format)) {
+        exit;
+    }
 }
-
-// Add WHERE clause if needed
-if (!empty($conditions)) {
-    $sql .= " WHERE " . implode(" AND ", $conditions);
+if ($snapshot === null && $conn === null) {
+    $conn = connectDB("read");
 }
 
-// Randomization or ordering
-if ($isRandom) {
-    $sql .= " ORDER BY RANDOM() LIMIT 1";
+if ($format === "ndjson") {
+    header("Content-Type: application/x-ndjson; charset=UTF-8");
 } else {
-    $sql .= " ORDER BY \"order\" ASC";
+    header("Content-Type: application/xml");
+    echo "<?xml version=\"1.0\" encoding=\"UTF-8\"?>";
 }
 
-// Execute query
-$result = pg_query_params($conn, $sql, $params);
-
-if (!$result || pg_num_rows($result) === 0) {
-    echo "<pokemon_list></pokemon_list>"; // empty
+if ($detail !== null) {
+    $id = ctype_digit($detail) ? (int)$detail : null;
+    if ($snapshot !== null) {
+        $row = snapshotDetail($snapshot, $id, $detail);
+    } else {
+        $result = $id !== null
+            ? pg_query_params($conn, "SELECT * FROM pokemon_detail WHERE id = $1", [$id])
+            : pg_query_params($conn, "SELECT * FROM pokemon_detail WHERE LOWER(name) = LOWER($1) LIMIT 1", [$detail]);
+        $row = $result ? pg_fetch_assoc($result) : null;
+    }
+    if (!$row) {
+        http_response_code(404);
+    }
+    if ($format === "ndjson") {
+        echo json_encode($row ?: null, JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE) . "\n";
+    } elseif ($row) {
+        echo "<pokemon_detail>";
+        foreach ($row as $column => $value) {
+            echo "<$column>" . htmlspecialchars((string)$value) . "</$column>";
+        }
+        echo "</pokemon_detail>";
+    } else {
+        echo "<pokemon_detail></pokemon_detail>";
+    }
     exit;
 }
 
+// Send every batch as soon as it is rendered instead of buffering the response
+while (ob_get_level() > 0) {
+    ob_end_flush();
+}
+ob_implicit_flush(true);
+
+// Read from the pre-joined list view built by the loader, or from the base
+// table when the database was filled without it (e.g. by Assemble.py)
+function listQuery($relation, $searchName, $isRandom) {
+    $columns = "name, sprite_front_default, primary_type, secondary_type";
+    if ($relation === "pokemon_list_card") {
+        // Sprite atlas offsets, NULL until sprite_atlas.py has been run
+        $columns .= ", atlas_sheet, atlas_x, atlas_y, atlas_width, atlas_height";
+    }
+    $sql = "SELECT $columns FROM $relation";
+    $params = [];
+
+    // Add name filter if provided
+    if ($searchName !== null && $searchName !== "") {
+        $sql .= " WHERE LOWER(name) LIKE LOWER($1)";
+        $params[] = "%" . $searchName . "%";
+    }
+
+    // Randomization or ordering
+    if ($isRandom) {
+        $sql .= " ORDER BY RANDOM() LIMIT 1";
+    } else {
+        $sql .= " ORDER BY \"order\" ASC";
+    }
+    return [$sql, $params];
+}
+
+// Read rows through a server-side cursor so neither PHP nor libpq ever holds
+// the whole result; each batch is flushed before the next one is fetched.
+// $queries are tried in order, the next one only when a relation is missing,
+// so the common case costs no extra round trip.
+function streamRows($conn, $queries, $batchSize = 200) {
+    $declared = false;
+    foreach ($queries as [$sql, $params]) {
+        pg_query($conn, "BEGIN");
+        if (queryParams($conn, "DECLARE pokemon_cursor NO SCROLL CURSOR FOR $sql", $params, $sqlState)) {
+            $declared = true;
+            break;
+        }
+        pg_query($conn, "ROLLBACK");
+        if ($sqlState !== UNDEFINED_TABLE) {
+            break;
+        }
+    }
+    if (!$declared) {
+        return;
+    }
+    do {
+        $result = pg_query($conn, "FETCH $batchSize FROM pokemon_cursor");
+        $count = $result ? pg_num_rows($result) : 0;
+        for ($i = 0; $i < $count; $i++) {
+            yield pg_fetch_assoc($result, $i);
+        }
+        flush();
+    } while ($count === $batchSize);
+    pg_query($conn, "COMMIT");
+}
+
+function renderXml($row) {
+    $xml = "<pokemon>";
+    $xml .= "<name>" . htmlspecialchars($row['name']) . "</name>";
+    $xml .= "<sprite>" . htmlspecialchars($row['sprite_front_default']) . "</sprite>";
+    $xml .= "<primary_type>" . htmlspecialchars($row['primary_type']) . "</primary_type>";
+    $xml .= "<secondary_type>" . htmlspecialchars($row['secondary_type']) . "</secondary_type>";
+    if (isset($row['atlas_sheet'])) {
+        $xml .= "<atlas sheet=\"" . htmlspecialchars($row['atlas_sheet']) . "\""
+            . " x=\"" . (int)$row['atlas_x'] . "\" y=\"" . (int)$row['atlas_y'] . "\""
+            . " width=\"" . (int)$row['atlas_width'] . "\" height=\"" . (int)$row['atlas_height'] . "\"/>";
+    }
+    $xml .= "</pokemon>";
+    return $xml;
+}
+
+function renderNdjson($row) {
+    $atlas = isset($row['atlas_sheet'])
+        ? [$row['atlas_sheet'], (int)$row['atlas_x'], (int)$row['atlas_y'], (int)$row['atlas_width'], (int)$row['atlas_height']]
+        : null;
+    return json_encode(
+        [$row['name'], $row['sprite_front_default'], $row['primary_type'], $row['secondary_type'], $atlas],
+        JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE
+    ) . "\n";
+}
+
+$rows = $snapshot !== null
+    ? snapshotRows($snapshot, $searchName, $isRandom)
+    : streamRows($conn, [
+        listQuery("pokemon_list_card", $searchName, $isRandom),
+        listQuery("pokemon", $searchName, $isRandom)
+    ]);
+
 // Render response
-if ($isRandom) {
+if ($format === "ndjson") {
+    echo json_encode(["fields" => ["name", "sprite", "primary_type", "secondary_type", "atlas"]]) . "\n";
+    foreach ($rows as $row) {
+        echo renderNdjson($row);
+    }
+} elseif ($isRandom) {
     // Only one random Pokémon
-    $row = pg_fetch_assoc($result);
-    echo "<pokemon>";
-    echo "<name>" . htmlspecialchars($row['name']) . "</name>";
-    echo "<sprite>" . htmlspecialchars($row['sprite_front_default']) . "</sprite>";
-    echo "<primary_type>" . htmlspecialchars($row['primary_type']) . "</primary_type>";
-    echo "<secondary_type>" . htmlspecialchars($row['secondary_type']) . "</secondary_type>";
-    echo "</pokemon>";
+    $row = $rows->current();
+    echo $row ? renderXml($row) : "<pokemon_list></pokemon_list>";
 } else {
     // Full or filtered list
     echo "<pokemon_list>";
-    while ($row = pg_fetch_assoc($result)) {
-        echo "<pokemon>";
-        echo "<name>" . htmlspecialchars($row['name']) . "</name>";
-        echo "<sprite>" . htmlspecialchars($row['sprite_front_default']) . "</sprite>";
-        echo "<primary_type>" . htmlspecialchars($row['primary_type']) . "</primary_type>";
-        echo "<secondary_type>" . htmlspecialchars($row['secondary_type']) . "</secondary_type>";
-        echo "</pokemon>";
+    foreach ($rows as $row) {
+        echo renderXml($row);
     }
     echo "</pokemon_list>";
 }
-?>
\ No newline at end of file
+?>
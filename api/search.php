@@ -0,0 +1,86 @@
+<?php
+require_once("../inc/db.php");
+require_once("../inc/cache.php");
+
+// Ranked full-text search over ability effects, move and species descriptions,
+// answered from the search_document read model and its GIN index.
+//   q      search text, web search syntax ("quoted phrases", -excluded, or)
+//   kind   optional: ability, move or species
+//   limit  optional: 1-100, default 20
+$query = isset($_GET['q']) ? trim($_GET['q']) : "";
+$kind = isset($_GET['kind']) && in_array($_GET['kind'], ["ability", "move", "species"], true) ? $_GET['kind'] : null;
+$limit = isset($_GET['limit']) ? max(1, min(100, (int)$_GET['limit'])) : 20;
+
+if ($query === "") {
+    http_response_code(400);
+    header("Content-Type: application/xml");
+    die("<error>Missing search text (q).</error>");
+}
+
+// Results only change with the data, so revalidations are answered from the
+// published dataset version without touching the database
+$conn = null;
+$version = datasetVersion();
+if ($version === null) {
+    $conn = connectDB("read");
+    $version = datasetVersion($conn);
+}
+if (sendValidators($version)) {
+    exit;
+}
+if ($conn === null) {
+    $conn = connectDB("read");
+}
+
+header("Content-Type: application/xml");
+
+// Documents matching every term rank first; the rest only need one term, so
+// a natural-language query ("moves that cause paralysis") still finds
+// descriptions that word it differently (queries with phrases or exclusions
+// stay strict). Both tests use the GIN index, and only the returned page is
+// highlighted.
+$sql = "WITH parsed AS (
+        SELECT websearch_to_tsquery('english', $1) AS strict
+    ), q AS (
+        SELECT strict, CASE WHEN strict::text ~ '!|<->' THEN strict
+            ELSE replace(strict::text, ' & ', ' | ')::tsquery END AS loose
+        FROM parsed
+    ), hits AS (
+        SELECT d.kind, d.id, d.name, d.summary,
+            d.document @@ q.strict AS exact,
+            ts_rank_cd(d.document, q.loose, 1) AS rank
+        FROM search_document d, q
+        WHERE d.document @@ q.loose" . ($kind !== null ? " AND d.kind = $3" : "") . "
+        ORDER BY exact DESC, rank DESC, d.name
+        LIMIT $2
+    )
+    SELECT hits.kind, hits.id, hits.name, hits.exact, round(hits.rank::numeric, 4) AS rank,
+        ts_headline('english', hits.summary, q.loose, 'MaxFragments=1, MaxWords=25, MinWords=8') AS snippet
+    FROM hits, q
+    ORDER BY hits.exact DESC, hits.rank DESC, hits.name";
+$params = [$query, $limit];
+if ($kind !== null) {
+    $params[] = $kind;
+}
+
+$result = queryParams($conn, $sql, $params, $sqlState);
+if (!$result && $sqlState === UNDEFINED_TABLE) {
+    http_response_code(503);
+    die("<error>Search index missing; load the data with db_init.py.</error>");
+}
+if (!$result) {
+    http_response_code(500);
+    die("<error>Search failed.</error>");
+}
+
+echo "<?xml version=\"1.0\" encoding=\"UTF-8\"?>";
+echo "<search_results query=\"" . htmlspecialchars($query) . "\">";
+while ($row = pg_fetch_assoc($result)) {
+    echo "<result kind=\"" . $row['kind'] . "\" id=\"" . (int)$row['id'] . "\""
+        . " rank=\"" . $row['rank'] . "\" exact=\"" . ($row['exact'] === "t" ? "true" : "false") . "\">";
+    echo "<name>" . htmlspecialchars($row['name']) . "</name>";
+    echo "<snippet>" . htmlspecialchars($row['snippet']) . "</snippet>";
+    echo "</result>";
+}
+echo "</search_results>";
+?>
@@ -0,0 +1,74 @@
+<?php
+require_once("../inc/cache.php");
+
+// "Pokémon like this one": nearest neighbours by base stats, height and
+// weight, answered by the in-memory index of similar.py
+// ("python3 similar.py serve"; SIMILAR_URL overrides where it listens).
+//   pokemon      name or id
+//   k            optional: 1-100, default 10
+//   type         optional comma list, neighbours must have all of them
+//   generation   optional comma list, any of them
+$similarUrl = getenv("SIMILAR_URL") ?: "http://127.0.0.1:8091";
+
+header("Content-Type: application/xml");
+if (!isset($_GET['pokemon']) || trim($_GET['pokemon']) === "") {
+    http_response_code(400);
+    die("<error>Missing Pokémon (pokemon).</error>");
+}
+
+// The index is rebuilt from the published dataset version, so the same
+// validators apply
+if (sendValidators(datasetVersion())) {
+    exit;
+}
+
+$query = http_build_query(array_filter([
+    "pokemon" => trim($_GET['pokemon']),
+    "k" => isset($_GET['k']) ? (int)$_GET['k'] : null,
+    "type" => $_GET['type'] ?? null,
+    "generation" => $_GET['generation'] ?? null
+], function ($value) {
+    return $value !== null && $value !== "";
+}));
+$context = stream_context_create(["http" => ["timeout" => 2, "ignore_errors" => true]]);
+$body = @file_get_contents("$similarUrl/similar?$query", false, $context);
+if ($body === false) {
+    http_response_code(503);
+    die("<error>Similarity service unavailable.</error>");
+}
+$response = json_decode($body, true);
+if (isset($response['error'])) {
+    // The service's own status: 404 for an unknown Pokémon, 400 for a bad query
+    $status = 502;
+    if (isset($http_response_header[0]) && preg_match('#^HTTP/\S+\s+(\d{3})#', $http_response_header[0], $match)) {
+        $status = (int)$match[1];
+    }
+    http_response_code($status);
+    die("<error>" . htmlspecialchars($response['error']) . "</error>");
+}
+
+function renderSimilar($pokemon, $distance = null) {
+    $xml = "<pokemon id=\"" . (int)$pokemon['id'] . "\"" . ($distance !== null ? " distance=\"" . (float)$distance . "\"" : "") . ">";
+    $xml .= "<name>" . htmlspecialchars($pokemon['name']) . "</name>";
+    $xml .= "<primary_type>" . htmlspecialchars($pokemon['types'][0] ?? "") . "</primary_type>";
+    $xml .= "<secondary_type>" . htmlspecialchars($pokemon['types'][1] ?? "") . "</secondary_type>";
+    $xml .= "<generation>" . (int)$pokemon['generation'] . "</generation>";
+    $xml .= "<stats";
+    foreach ($pokemon['stats'] as $stat => $value) {
+        $xml .= " $stat=\"" . (int)$value . "\"";
+    }
+    $xml .= "/>";
+    $xml .= "</pokemon>";
+    return $xml;
+}
+
+echo "<?xml version=\"1.0\" encoding=\"UTF-8\"?>";
+echo "<similar>";
+echo "<target>" . renderSimilar($response['target']) . "</target>";
+echo "<pokemon_list>";
+foreach ($response['results'] as $result) {
+    echo renderSimilar($result, $result['distance']);
+}
+echo "</pokemon_list>";
+echo "</similar>";
+?>
@@ -0,0 +1,68 @@
+# Compares egg group / variety membership queries on the old stringified
+# columns (LIKE scan) against native arrays with a GIN index (@> lookup).
+#
+# Usage: python3 benchmarks/array_containment.py [rows] [repeats]
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+from db_init import SQLEngine
+
+EGG_GROUPS = ['monster', 'water1', 'bug', 'flying', 'ground', 'fairy', 'plant', 'humanshape',
+              'water3', 'mineral', 'indeterminate', 'water2', 'ditto', 'dragon', 'no-eggs']
+
+SETUP = [
+    "CREATE TEMP TABLE bench_species_array (id INTEGER PRIMARY KEY, egg_group TEXT[], varieties INTEGER[])",
+    """
+    INSERT INTO bench_species_array
+    SELECT g,
+        CASE WHEN g % 100 = 0 THEN ARRAY['no-eggs']
+             ELSE ARRAY[(:groups)[1 + g % 14], (:groups)[1 + (g * 7) % 14]] END,
+        ARRAY[g, g + 10000]
+    FROM generate_series(1, :rows) g
+    """,
+    "CREATE INDEX ON bench_species_array USING GIN (egg_group)",
+    "CREATE INDEX ON bench_species_array USING GIN (varieties)",
+    #Same data in the previous Python-repr / "[a, b]" text encoding
+    """
+    CREATE TEMP TABLE bench_species_text AS
+    SELECT id,
+        '[''' || array_to_string(egg_group, ''', ''') || ''']' AS egg_group,
+        '[' || array_to_string(varieties, ', ') || ']' AS varieties
+    FROM bench_species_array
+    """,
+    "ANALYZE bench_species_array",
+    "ANALYZE bench_species_text"
+]
+
+QUERIES = [
+    ("egg group, LIKE on text", "SELECT count(*) FROM bench_species_text WHERE egg_group LIKE '%''no-eggs''%'"),
+    ("egg group, @> on TEXT[]", "SELECT count(*) FROM bench_species_array WHERE egg_group @> ARRAY['no-eggs']"),
+    ("variety, LIKE on text", "SELECT count(*) FROM bench_species_text WHERE varieties LIKE '%[4242,%' OR varieties LIKE '%, 4242]%'"),
+    ("variety, @> on INTEGER[]", "SELECT count(*) FROM bench_species_array WHERE varieties @> ARRAY[4242]")
+]
+
+def run(rows, repeats):
+    with SQLEngine.get().connect() as conn:
+        for statement in SETUP:
+            conn.execute(sqlalchemy.text(statement), {'groups': EGG_GROUPS, 'rows': rows})
+
+        print(f"{rows} rows, median of {repeats} runs")
+        for name, query in QUERIES:
+            count = conn.execute(sqlalchemy.text(query)).scalar()
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(sqlalchemy.text(query)).scalar()
+                samples.append(time.perf_counter() - start)
+            print(f"  {name:<26} {statistics.median(samples) * 1000:9.3f} ms  ({count} matches)")
+        conn.rollback()
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(rows, repeats)
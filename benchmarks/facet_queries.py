@@ -0,0 +1,113 @@
+# Representative filter combinations of api/filter.php, timed in the database:
+# each runs against the pokemon_facet read model and, for comparison, as the
+# equivalent join of pokemon with pokemon_species. Reports the median
+# execution time (EXPLAIN ANALYZE, so no network or rendering) and the indexes
+# each plan used, and records the run under benchmarks/results/.
+# The endpoint itself is load tested with: load_test.py run facets
+#
+# Usage: python3 benchmarks/facet_queries.py [repeats]
+import os
+import sys
+import json
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+
+from db_init import SQLEngine
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+#name -> (conditions on pokemon_facet, the same on pokemon p JOIN pokemon_species s)
+COMBOS = {
+    'gen 4 water, speed > 100, not legendary': (
+        "generation = 4 AND types @> ARRAY['water'] AND speed > 100 AND category <> 'legendary'",
+        "s.generation = 4 AND 'water' IN (p.primary_type, p.secondary_type) AND p.speed > 100 AND NOT s.is_legendary"
+    ),
+    'dual type water/ground': (
+        "types @> ARRAY['water', 'ground']",
+        "'water' IN (p.primary_type, p.secondary_type) AND 'ground' IN (p.primary_type, p.secondary_type)"
+    ),
+    'legendaries of gen 1-3': (
+        "category = 'legendary' AND generation = ANY(ARRAY[1, 2, 3])",
+        "s.is_legendary AND s.generation IN (1, 2, 3)"
+    ),
+    'fast attackers': (
+        "attack >= 130 AND speed >= 100",
+        "p.attack >= 130 AND p.speed >= 100"
+    ),
+    'total >= 600, not legendary or mythical': (
+        "total >= 600 AND category = ANY(ARRAY['standard', 'baby'])",
+        "p.hp + p.attack + p.defense + p.special_attack + p.special_defense + p.speed >= 600 AND NOT s.is_legendary AND NOT s.is_mythical"
+    ),
+    'dragon types': (
+        "types @> ARRAY['dragon']",
+        "'dragon' IN (p.primary_type, p.secondary_type)"
+    )
+}
+
+def facet_sql(conditions:str) -> str:
+    #The shape filter.php sends: one page plus counts over all matches
+    return f"""
+    WITH filtered AS (SELECT * FROM pokemon_facet WHERE {conditions}),
+    page AS (SELECT name, speed FROM filtered ORDER BY "order" LIMIT 50),
+    counts AS (
+        SELECT 'type' AS facet, t.type AS value, count(*) FROM filtered f, unnest(f.types) AS t(type) GROUP BY t.type
+        UNION ALL SELECT 'generation', f.generation::text, count(*) FROM filtered f GROUP BY f.generation
+        UNION ALL SELECT 'category', f.category, count(*) FROM filtered f GROUP BY f.category
+    )
+    SELECT (SELECT json_agg(page) FROM page), (SELECT json_agg(counts) FROM counts)
+    """
+
+def join_sql(conditions:str) -> str:
+    return f"""
+    WITH filtered AS (
+        SELECT p.*, s.generation, s.is_legendary FROM pokemon p JOIN pokemon_species s ON s.id = p.species WHERE {conditions}
+    ),
+    page AS (SELECT name, speed FROM filtered ORDER BY "order" LIMIT 50),
+    counts AS (
+        SELECT 'type' AS facet, t.type AS value, count(*) FROM filtered f, unnest(ARRAY[f.primary_type, f.secondary_type]) AS t(type) WHERE t.type IS NOT NULL GROUP BY t.type
+        UNION ALL SELECT 'generation', f.generation::text, count(*) FROM filtered f GROUP BY f.generation
+        UNION ALL SELECT 'legendary', f.is_legendary::text, count(*) FROM filtered f GROUP BY f.is_legendary
+    )
+    SELECT (SELECT json_agg(page) FROM page), (SELECT json_agg(counts) FROM counts)
+    """
+
+def indexes(plan:dict) -> set[str]:
+    found = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        found |= indexes(child)
+    return found
+
+def measure(conn, sql:str, repeats:int) -> tuple[float, list[str]]:
+    samples = []
+    used = set()
+    for _ in range(repeats):
+        plan = conn.execute(sqlalchemy.text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()[0]
+        samples.append(plan['Execution Time'])
+        used = indexes(plan['Plan'])
+    return statistics.median(samples), sorted(used)
+
+def run(repeats:int):
+    result = {'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'repeats': repeats, 'combos': {}}
+    with SQLEngine.get().connect() as conn:
+        if conn.execute(sqlalchemy.text("SELECT to_regclass('pokemon_facet')")).scalar() is None:
+            print("pokemon_facet does not exist, run db_init.py first")
+            return
+        print(f"{'combination':<42} {'facet ms':>9} {'join ms':>9}   indexes used (facet)")
+        for name, (facet_conditions, join_conditions) in COMBOS.items():
+            facet_ms, used = measure(conn, facet_sql(facet_conditions), repeats)
+            join_ms, _ = measure(conn, join_sql(join_conditions), repeats)
+            result['combos'][name] = {'facet_ms': facet_ms, 'join_ms': join_ms, 'indexes': used}
+            print(f"{name:<42} {facet_ms:>9.3f} {join_ms:>9.3f}   {', '.join(used) or 'none'}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"facets-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
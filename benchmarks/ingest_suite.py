@@ -0,0 +1,409 @@
+# Benchmark suite for the ingest path: URL parsing, JSON decoding, the
+# process() transforms and python/Assemble.py's from_json on recorded
+# payloads, insert statement building (insert_sql of both loaders),
+# row-wise against batched inserts, and a full ThreadPool run against a local
+# fixture server. Every run is recorded under benchmarks/results/ and two runs
+# can be compared; a case is flagged when it is both slower by more than the
+# threshold and the difference is significant (Mann-Whitney U, p < 0.05).
+#
+# Usage:
+#   python3 benchmarks/ingest_suite.py record <dir> [per entity]   store live REST payloads as fixtures
+#   python3 benchmarks/ingest_suite.py serve <dir> [port]          serve them as a PokeAPI stand-in
+#   python3 benchmarks/ingest_suite.py run <dir> [repeats]         run the suite and record the results
+#   python3 benchmarks/ingest_suite.py compare <baseline> <candidate> [threshold %]
+import os
+import io
+import sys
+import json
+import math
+import time
+import timeit
+import warnings
+import threading
+import statistics
+import subprocess
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python"))
+
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql
+
+import db_init
+import Assemble
+from db_init import Data, FetchThread, SQLEngine, ThreadPool
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BENCH_DATABASE = "pokemon_bench"
+
+ENTITIES = ['ability', 'move', 'pokemon', 'pokemon-species', 'evolution-chain', 'type']
+
+#Entity -> process threads fed by its fetch thread in ThreadPool
+PROCESSORS = {
+    'ability': [db_init.AbilityProcessThread],
+    'move': [db_init.MoveProcessThread],
+    'pokemon': [db_init.PokemonProcessThread, db_init.PokemonMoveProcessThread, db_init.LearnsetProcessThread],
+    'pokemon-species': [db_init.PokemonSpeciesProcessThread],
+    'evolution-chain': [db_init.EvolutionChainProcessThread, db_init.EvolutionClosureProcessThread],
+    'type': [db_init.TypeEfficacyProcessThread]
+}
+
+#Process thread -> SQL thread whose insert_sql receives its rows; learnset is COPY-loaded, not built
+WRITERS = {
+    db_init.AbilityProcessThread: db_init.AbilitySQLThread,
+    db_init.MoveProcessThread: db_init.MoveSQLThread,
+    db_init.PokemonProcessThread: db_init.PokemonSQLThread,
+    db_init.PokemonMoveProcessThread: db_init.PokemonMoveSQLThread,
+    db_init.PokemonSpeciesProcessThread: db_init.PokemonSpeciesSQLThread,
+    db_init.EvolutionChainProcessThread: db_init.EvolutionChainSQLThread,
+    db_init.EvolutionClosureProcessThread: db_init.EvolutionClosureSQLThread,
+    db_init.TypeEfficacyProcessThread: db_init.TypeEfficacySQLThread
+}
+
+#Entity -> row class of the first-time fill in python/Assemble.py, with its own from_json and insert_sql
+ASSEMBLE_ROWS = {
+    'ability': Assemble.Ability,
+    'pokemon': Assemble.Pokemon,
+    'pokemon-species': Assemble.PokemonSpecies
+}
+
+#Tables without foreign keys, so they can be loaded into a scratch schema on their own
+INSERT_TABLES = [
+    (db_init.AbilityProcessThread, db_init.AbilitySQLThread, 'ability'),
+    (db_init.MoveProcessThread, db_init.MoveSQLThread, 'move'),
+    (db_init.PokemonSpeciesProcessThread, db_init.PokemonSpeciesSQLThread, 'pokemon-species')
+]
+
+#Fixtures
+
+def record(directory:str, per_entity:int = 50):
+    for name in ENTITIES:
+        index = Data.fetch_json(name)
+        ids = [Data.get_url_index(node['url']) for node in index['results']][:per_entity]
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        print(f"Recording {len(ids)} {name} payloads...")
+        for id in ids:
+            with open(os.path.join(directory, name, f"{id}.json"), "w") as f:
+                json.dump(Data.fetch_json(name, id), f)
+    print(f"Fixtures recorded in {directory}")
+
+def load_fixtures(directory:str) -> dict[str, list[str]]:
+    #Raw response bodies per entity, in id order
+    fixtures = {}
+    for name in ENTITIES:
+        folder = os.path.join(directory, name)
+        files = sorted((f for f in os.listdir(folder) if f.endswith(".json")), key=lambda f: int(f[:-5]))
+        fixtures[name] = []
+        for file in files:
+            with open(os.path.join(folder, file)) as f:
+                fixtures[name].append(f.read())
+    return fixtures
+
+def fixture_server(directory:str, port:int = 0) -> ThreadingHTTPServer:
+    #Answers the two REST shapes Data.fetch_json asks for: the index and one resource
+    class Fixtures(BaseHTTPRequestHandler):
+        def do_GET(self):
+            segments = [s for s in self.path.split("?")[0].split("/") if s]
+            body = None
+            if len(segments) >= 1 and segments[-1] in ENTITIES:
+                name = segments[-1]
+                ids = sorted(int(f[:-5]) for f in os.listdir(os.path.join(directory, name)) if f.endswith(".json"))
+                base = f"http://{self.headers['Host']}/api/v2/{name}"
+                body = json.dumps({
+                    'count': len(ids),
+                    'results': [{'name': str(id), 'url': f"{base}/{id}/"} for id in ids]
+                }).encode()
+            elif len(segments) >= 2 and segments[-2] in ENTITIES:
+                path = os.path.join(directory, segments[-2], segments[-1] + ".json")
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        body = f.read()
+            self.send_response(200 if body is not None else 404)
+            body = body if body is not None else b'{"detail": "Not found."}'
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer(("localhost", port), Fixtures)
+
+def serve(directory:str, port:int = 8089):
+    server = fixture_server(directory, port)
+    print(f"Serving fixtures from {directory} at http://localhost:{port}/api/v2")
+    print(f"Run the loader with POKEAPI_URL=http://localhost:{port}/api/v2 python3 db_init.py")
+    server.serve_forever()
+
+#Cases; each returns a list of samples in seconds
+
+def sample(function, repeats:int) -> list[float]:
+    function()  #warm up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def processors(name:str) -> list:
+    #Process threads only need a fetch thread to attach to; neither is started
+    return [cls(FetchThread(name)) for cls in PROCESSORS[name]]
+
+def processed_rows(processor, payloads:list[dict]) -> list[dict]:
+    rows = []
+    for payload in payloads:
+        result = processor.process(payload)
+        for item in result if isinstance(result, list) else [result]:
+            rows.extend(item if isinstance(item, list) else [item])
+    return rows
+
+def bench_url_index(repeats:int) -> dict[str, list[float]]:
+    #Per call, averaged over a timeit loop so the sample is above the timer resolution
+    url = "https://pokeapi.co/api/v2/pokemon-species/1025/"
+    timer = timeit.Timer(lambda: Data.get_url_index(url))
+    loops, _ = timer.autorange()
+    return {'get_url_index': [t / loops for t in timer.repeat(repeats, loops)]}
+
+def bench_transforms(fixtures:dict[str, list[str]], repeats:int) -> dict[str, list[float]]:
+    cases = {}
+    for name, bodies in fixtures.items():
+        cases[f"json_decode/{name}"] = sample(lambda: [json.loads(b) for b in bodies], repeats)
+        payloads = [json.loads(b) for b in bodies]
+        for processor in processors(name):
+            cases[f"process/{processor.name}"] = sample(lambda: processed_rows(processor, payloads), repeats)
+        if name in ASSEMBLE_ROWS:
+            row_class = ASSEMBLE_ROWS[name]
+            cases[f"from_json/{name}"] = sample(lambda: [row_class.from_json(p) for p in payloads], repeats)
+    return cases
+
+def bench_statements(fixtures:dict[str, list[str]], repeats:int) -> dict[str, list[float]]:
+    #What session.execute does with insert_sql's statement before it reaches the driver:
+    #compile for the row's keys and bind the parameters, with no database and no statement cache
+    dialect = postgresql.dialect()
+    cases = {}
+    for name, bodies in fixtures.items():
+        payloads = [json.loads(b) for b in bodies]
+        for processor in processors(name):
+            writer = WRITERS.get(type(processor))
+            if writer is None:
+                continue
+            table = writer.define_table(sqlalchemy.MetaData())
+            rows = processed_rows(processor, payloads)
+            if not rows:
+                continue
+            def build(table=table, rows=rows):
+                for row in rows:
+                    table.insert().compile(dialect=dialect, column_keys=list(row)).construct_params(row)
+            cases[f"insert_sql/{processor.name}"] = sample(build, repeats)
+        #Assemble.py hands session.execute a text() statement and the object's attributes
+        if name in ASSEMBLE_ROWS:
+            objects = [ASSEMBLE_ROWS[name].from_json(p) for p in payloads]
+            def build_assemble(objects=objects):
+                for o in objects:
+                    statement, params = o.insert_sql()
+                    sqlalchemy.text(statement).compile(dialect=dialect).construct_params(params)
+            cases[f"Assemble insert_sql/{name}"] = sample(build_assemble, repeats)
+    return cases
+
+def bench_inserts(engine, fixtures:dict[str, list[str]], repeats:int) -> dict[str, list[float]]:
+    #Row-wise is what SQLThread does per processed document (one insert, one commit);
+    #batched sends every row as one executemany in one transaction
+    cases = {}
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("DROP SCHEMA IF EXISTS bench_ingest CASCADE"))
+        conn.execute(sqlalchemy.text("CREATE SCHEMA bench_ingest"))
+    metadata = sqlalchemy.MetaData(schema="bench_ingest")
+    session = sessionmaker(bind=engine)()
+    try:
+        for process_class, sql_class, name in INSERT_TABLES:
+            table = sql_class.define_table(metadata)
+            metadata.create_all(engine, tables=[table])
+            rows = processed_rows(process_class(FetchThread(name)), [json.loads(b) for b in fixtures[name]])
+
+            def truncate():
+                session.execute(sqlalchemy.text(f"TRUNCATE {table.schema}.{table.name}"))
+                session.commit()
+
+            def row_wise():
+                truncate()
+                for row in rows:
+                    session.execute(table.insert(), [row])
+                    session.commit()
+
+            def batched():
+                truncate()
+                session.execute(table.insert(), rows)
+                session.commit()
+
+            cases[f"insert_row_wise/{name}"] = sample(row_wise, repeats)
+            cases[f"insert_batched/{name}"] = sample(batched, repeats)
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text("DROP SCHEMA IF EXISTS bench_ingest CASCADE"))
+    return cases
+
+def reset_bench_database(admin_url:str) -> str:
+    #A throwaway database so the end-to-end run never touches the served data
+    admin = sqlalchemy.create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(sqlalchemy.text(f"DROP DATABASE IF EXISTS {BENCH_DATABASE} WITH (FORCE)"))
+        conn.execute(sqlalchemy.text(f"CREATE DATABASE {BENCH_DATABASE}"))
+    admin.dispose()
+    return admin_url.rsplit("/", 1)[0] + "/" + BENCH_DATABASE
+
+def bench_end_to_end(directory:str, admin_url:str, repeats:int) -> dict[str, list[float]]:
+    server = fixture_server(directory)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = Data.URL
+    Data.URL = f"http://localhost:{server.server_address[1]}/api/v2"
+    samples = []
+    try:
+        for _ in range(repeats):
+            if SQLEngine._engine is not None:
+                SQLEngine._engine.dispose()
+            SQLEngine._URL = reset_bench_database(admin_url)
+            SQLEngine._engine = None
+            pool = ThreadPool(update_time=0.05)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pool.start()
+                pool.join()
+            samples.append(time.perf_counter() - start)
+        SQLEngine._engine.dispose()
+    finally:
+        Data.URL = url
+        SQLEngine._URL = admin_url
+        SQLEngine._engine = None
+        server.shutdown()
+    return {'end_to_end': samples}
+
+def git_revision() -> str|None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(directory:str, repeats:int = 20):
+    #ThreadPool copies every table into the shared MetaData again; the copies are skipped with a warning
+    warnings.filterwarnings("ignore", message=".*already exists within the given MetaData.*")
+    fixtures = load_fixtures(directory)
+    result = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'fixtures': {name: len(bodies) for name, bodies in fixtures.items()},
+        'repeats': repeats,
+        'cases': {}
+    }
+    cases = result['cases']
+    cases.update(bench_url_index(repeats))
+    cases.update(bench_transforms(fixtures, repeats))
+    cases.update(bench_statements(fixtures, repeats))
+
+    admin_url = SQLEngine._URL
+    try:
+        with SQLEngine.get().connect():
+            pass
+    except sqlalchemy.exc.OperationalError as e:
+        print(f"Skipping database cases, cannot connect to {admin_url}: {e.orig}")
+    else:
+        cases.update(bench_inserts(SQLEngine.get(), fixtures, repeats))
+        cases.update(bench_end_to_end(directory, admin_url, max(3, repeats // 5)))
+
+    print(f"{'case':<40} {'median':>12} {'stdev':>12}   ({repeats} repeats)")
+    for name, samples in cases.items():
+        print(f"{name:<40} {format_seconds(statistics.median(samples)):>12} {format_seconds(statistics.pstdev(samples)):>12}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"ingest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+#Comparison
+
+def format_seconds(value:float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if abs(value) >= scale:
+            return f"{value / scale:.3f} {unit}"
+    return f"{value / 1e-9:.1f} ns"
+
+def mann_whitney(a:list[float], b:list[float]) -> float:
+    #Two-sided p-value, normal approximation with tie correction
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    n = n1 + n2
+    u = sum(r for r, (_, group) in zip(ranks, combined) if group == 0) - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return math.erfc(abs(z) / math.sqrt(2))
+
+def compare(baseline_path:str, candidate_path:str, threshold:float = 5.0) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['revision']} {baseline['timestamp']}")
+    print(f"candidate {candidate['revision']} {candidate['timestamp']}")
+    if baseline['fixtures'] != candidate['fixtures']:
+        print("Warning: the runs used different fixture sets")
+    print(f"{'case':<40} {'baseline':>12} {'candidate':>12} {'change':>9} {'p':>7}")
+
+    regressions = []
+    for name, samples in candidate['cases'].items():
+        if name not in baseline['cases']:
+            print(f"{name:<40} {'-':>12} {format_seconds(statistics.median(samples)):>12}   (new)")
+            continue
+        before = statistics.median(baseline['cases'][name])
+        after = statistics.median(samples)
+        change = (after - before) * 100 / before if before else 0.0
+        p = mann_whitney(baseline['cases'][name], samples)
+        flag = ""
+        if p < 0.05 and change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif p < 0.05 and change < -threshold:
+            flag = "  improved"
+        print(f"{name:<40} {format_seconds(before):>12} {format_seconds(after):>12} {change:>+8.1f}% {p:>7.3f}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} significant regression{'s' if len(regressions) > 1 else ''} above {threshold:g}%: {', '.join(regressions)}")
+        return 1
+    print(f"\nNo significant regressions above {threshold:g}%")
+    return 0
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "record" and len(sys.argv) > 2:
+        record(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 50)
+    elif command == "serve" and len(sys.argv) > 2:
+        serve(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 8089)
+    elif command == "run" and len(sys.argv) > 2:
+        run(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+    elif command == "compare" and len(sys.argv) > 3:
+        sys.exit(compare(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else 5.0))
+    else:
+        print("Usage: ingest_suite.py record <dir> [per entity] | serve <dir> [port] | run <dir> [repeats] | compare <baseline> <candidate> [threshold %]")
@@ -0,0 +1,63 @@
+# Times "moves a pokémon learns in a version group" on the partitioned learnset
+# table, as loaded and after growing it by copying every version group under
+# new ids (the way the table grows as games are added).
+#
+# Usage: python3 benchmarks/learnset_query.py [growth factor] [repeats]
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+from db_init import SQLEngine
+
+QUERY = """
+    SELECT m.name, l.level_learned_at, lm.name
+    FROM bench_learnset.learnset l
+    JOIN move m ON m.id = l.move
+    JOIN move_learn_method lm ON lm.id = l.learn_method
+    WHERE l.version_group = (SELECT id FROM version_group WHERE name = :version_group)
+      AND l.pokemon = :pokemon
+    ORDER BY l.learn_method, l.level_learned_at
+"""
+
+def build(conn, factor):
+    conn.execute(sqlalchemy.text("DROP SCHEMA IF EXISTS bench_learnset CASCADE"))
+    conn.execute(sqlalchemy.text("CREATE SCHEMA bench_learnset"))
+    conn.execute(sqlalchemy.text(
+        "CREATE TABLE bench_learnset.learnset (LIKE public.learnset INCLUDING ALL) PARTITION BY LIST (version_group)"
+    ))
+    groups = [row[0] for row in conn.execute(sqlalchemy.text("SELECT DISTINCT version_group FROM learnset"))]
+    for copy in range(factor):
+        for group in groups:
+            target = group + 100 * copy
+            conn.execute(sqlalchemy.text(
+                f"CREATE TABLE bench_learnset.learnset_vg_{target} PARTITION OF bench_learnset.learnset FOR VALUES IN ({target})"
+            ))
+            conn.execute(sqlalchemy.text(
+                f"INSERT INTO bench_learnset.learnset SELECT {target}, pokemon, learn_method, level_learned_at, move "
+                f"FROM learnset WHERE version_group = {group}"
+            ))
+    conn.execute(sqlalchemy.text("ANALYZE bench_learnset.learnset"))
+    return conn.execute(sqlalchemy.text("SELECT count(*) FROM bench_learnset.learnset")).scalar()
+
+def run(factor, repeats, pokemon=25, version_group="scarlet-violet"):
+    with SQLEngine.get().connect() as conn:
+        for growth in sorted({1, factor}):
+            rows = build(conn, growth)
+            params = {'pokemon': pokemon, 'version_group': version_group}
+            moves = len(conn.execute(sqlalchemy.text(QUERY), params).all())
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(sqlalchemy.text(QUERY), params).all()
+                samples.append(time.perf_counter() - start)
+            print(f"{rows:9d} rows: {statistics.median(samples) * 1000:7.3f} ms median ({moves} moves, {version_group})")
+        conn.rollback()
+
+if __name__ == "__main__":
+    factor = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run(factor, repeats)
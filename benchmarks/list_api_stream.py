@@ -0,0 +1,64 @@
+# Compares the XML and NDJSON list responses: payload size, time to first
+# byte and total transfer time. Results are printed and recorded under
+# benchmarks/results/.
+#
+# Usage: python3 benchmarks/list_api_stream.py [api url] [repeats]
+import os
+import sys
+import json
+import time
+import statistics
+import http.client
+from urllib.parse import urlsplit
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+FORMATS = {
+    'xml': "",
+    'ndjson': "format=ndjson"
+}
+
+def measure(url):
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    start = time.perf_counter()
+    connection.request("GET", path)
+    response = connection.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - start
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - start
+    connection.close()
+    return ttfb, total, size
+
+def run(api_url, repeats):
+    result = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'api': api_url,
+        'repeats': repeats,
+        'formats': {}
+    }
+    print(f"{'format':<8} {'bytes':>10} {'ttfb ms':>10} {'total ms':>10}   (median of {repeats})")
+    for name, query in FORMATS.items():
+        url = api_url + ("?" + query if query else "")
+        measure(url)  #warm up the page cache and the view
+        samples = [measure(url) for _ in range(repeats)]
+        entry = {
+            'bytes': samples[-1][2],
+            'ttfb_ms': statistics.median(s[0] for s in samples) * 1000,
+            'total_ms': statistics.median(s[1] for s in samples) * 1000
+        }
+        result['formats'][name] = entry
+        print(f"{name:<8} {entry['bytes']:>10d} {entry['ttfb_ms']:>10.1f} {entry['total_ms']:>10.1f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"list_api_stream-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    api_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000/api/get_pokemon.php"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run(api_url, repeats)
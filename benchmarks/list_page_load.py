@@ -0,0 +1,66 @@
+# Simulates a cold load of Web/pokemon.html: fetches the list endpoint, then
+# every image it references, once with per-card sprite URLs and once with the
+# sprite atlas sheets. Results are printed and recorded under benchmarks/results/.
+#
+# Usage: python3 benchmarks/list_page_load.py [page url] [connections]
+import os
+import sys
+import json
+import time
+import urllib.request
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+def load_images(urls, connections):
+    #Browsers open ~6 connections per host, so that is the default parallelism
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        size = sum(len(body) for body in executor.map(fetch, urls))
+    return {'requests': len(urls), 'bytes': size, 'seconds': time.perf_counter() - start}
+
+def run(page_url, connections):
+    api_url = urljoin(page_url, "api/get_pokemon.php")
+    start = time.perf_counter()
+    document = fetch(api_url)
+    api_seconds = time.perf_counter() - start
+
+    cards = ET.fromstring(document).findall("pokemon")
+    sprites = sorted({urljoin(page_url, c.findtext("sprite")) for c in cards if c.findtext("sprite")})
+    sheets = sorted({urljoin(page_url, c.find("atlas").get("sheet")) for c in cards if c.find("atlas") is not None})
+
+    result = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'page': page_url,
+        'connections': connections,
+        'cards': len(cards),
+        'api': {'bytes': len(document), 'seconds': api_seconds},
+        'per_image': load_images(sprites, connections)
+    }
+    if sheets:
+        result['atlas'] = load_images(sheets, connections)
+
+    for mode in ['per_image', 'atlas']:
+        if mode in result:
+            r = result[mode]
+            total = api_seconds + r['seconds']
+            print(f"{mode:<10} {r['requests']:5d} image requests  {r['bytes'] / 1024:9.1f} KiB  {total * 1000:9.1f} ms page load")
+    if not sheets:
+        print("No <atlas> entries in the list response; run sprite_atlas.py to compare.")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"list_page_load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    page_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000/Web/pokemon.html"
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    run(page_url, connections)
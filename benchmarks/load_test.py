@@ -0,0 +1,179 @@
+# Closed-loop load generator for the read path. A scenario file under
+# benchmarks/scenarios/ lists weighted request paths, optionally with {name}
+# placeholders filled from its "values"; each virtual user keeps one HTTP
+# connection and sends the next request as soon as the previous one finished.
+# For every concurrency level it reports throughput and p50/p95/p99 latency,
+# and records the run under benchmarks/results/ for run over run comparison.
+#
+# Usage:
+#   python3 benchmarks/load_test.py run <scenario> [base url] [concurrency,...] [seconds]
+#   python3 benchmarks/load_test.py compare <baseline> <candidate>
+import os
+import sys
+import json
+import time
+import random
+import threading
+import statistics
+import http.client
+from urllib.parse import urlsplit, quote
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+SCENARIOS_DIR = os.path.join(BENCH_DIR, "scenarios")
+WARMUP_SECONDS = 2
+
+def load_scenario(name:str) -> dict:
+    path = name if os.path.isfile(name) else os.path.join(SCENARIOS_DIR, name + ".json")
+    with open(path) as f:
+        scenario = json.load(f)
+    scenario['name'] = os.path.splitext(os.path.basename(path))[0]
+    return scenario
+
+def request_paths(scenario:dict, rng:random.Random):
+    #Endless stream of paths, drawn by weight, placeholders filled at random
+    templates = scenario['requests']
+    weights = [t.get('weight', 1) for t in templates]
+    values = scenario.get('values', {})
+    while True:
+        template = rng.choices(templates, weights)[0]['path']
+        yield template.format(**{key: quote(rng.choice(options)) for key, options in values.items()})
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url:str, scenario:dict, seed:int, measure_from:float, stop_at:float):
+        super().__init__(daemon=True)
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/") + "/"
+        self.paths = request_paths(scenario, random.Random(seed))
+        self.measure_from = measure_from
+        self.stop_at = stop_at
+        self.latencies = []
+        self.errors = 0
+        self.bytes = 0
+        self.connection = None
+
+    def send(self, path:str) -> tuple[int, int]:
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        self.connection.request("GET", self.prefix + path)
+        response = self.connection.getresponse()
+        size = len(response.read())
+        if response.will_close:
+            #php -S answers every request with Connection: close
+            self.connection.close()
+            self.connection = None
+        return response.status, size
+
+    def run(self):
+        while True:
+            start = time.perf_counter()
+            if start >= self.stop_at:
+                break
+            try:
+                status, size = self.send(next(self.paths))
+                failed = status >= 400
+            except (OSError, http.client.HTTPException):
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+                failed, size = True, 0
+            end = time.perf_counter()
+            if start < self.measure_from or end > self.stop_at:
+                continue
+            if failed:
+                self.errors += 1
+            else:
+                self.latencies.append(end - start)
+                self.bytes += size
+        if self.connection is not None:
+            self.connection.close()
+
+def percentile(ordered:list[float], q:float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_level(base_url:str, scenario:dict, concurrency:int, seconds:float) -> dict:
+    measure_from = time.perf_counter() + WARMUP_SECONDS
+    stop_at = measure_from + seconds
+    users = [VirtualUser(base_url, scenario, seed, measure_from, stop_at) for seed in range(concurrency)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+
+    latencies = sorted(l for user in users for l in user.latencies)
+    errors = sum(user.errors for user in users)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': len(latencies) / seconds,
+        'bytes_per_second': sum(user.bytes for user in users) / seconds,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0
+    }
+
+def run(scenario_name:str, base_url:str, levels:list[int], seconds:float):
+    scenario = load_scenario(scenario_name)
+    result = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'scenario': scenario['name'],
+        'base_url': base_url,
+        'seconds': seconds,
+        'levels': []
+    }
+    print(f"{scenario['name']}: {scenario.get('description', '')}")
+    print(f"{'users':>6} {'req/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for concurrency in levels:
+        level = run_level(base_url, scenario, concurrency, seconds)
+        result['levels'].append(level)
+        print(f"{concurrency:>6} {level['throughput_rps']:>9.1f} {level['errors']:>7d} {level['p50_ms']:>9.1f} "
+              f"{level['p95_ms']:>9.1f} {level['p99_ms']:>9.1f} {level['max_ms']:>9.1f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"load-{scenario['name']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+def compare(baseline_path:str, candidate_path:str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    if baseline['scenario'] != candidate['scenario']:
+        print(f"Warning: comparing scenario {baseline['scenario']} with {candidate['scenario']}")
+
+    def change(before, after):
+        return f"{(after - before) * 100 / before:+.1f}%" if before else "-"
+
+    before_levels = {level['concurrency']: level for level in baseline['levels']}
+    print(f"{'users':>6} {'req/s':>20} {'p95 ms':>20} {'p99 ms':>20}")
+    for after in candidate['levels']:
+        before = before_levels.get(after['concurrency'])
+        if before is None:
+            continue
+        print(f"{after['concurrency']:>6}", *(
+            f"{after[key]:>10.1f} {change(before[key], after[key]):>9}" for key in ('throughput_rps', 'p95_ms', 'p99_ms')
+        ))
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "run" and len(sys.argv) > 2:
+        run(
+            sys.argv[2],
+            sys.argv[3] if len(sys.argv) > 3 else "http://localhost:8000/",
+            [int(c) for c in sys.argv[4].split(",")] if len(sys.argv) > 4 else [1, 4, 16],
+            float(sys.argv[5]) if len(sys.argv) > 5 else 10.0
+        )
+    elif command == "compare" and len(sys.argv) > 3:
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        scenarios = sorted(f[:-5] for f in os.listdir(SCENARIOS_DIR) if f.endswith(".json"))
+        print(f"Usage: load_test.py run <{'|'.join(scenarios)}|file> [base url] [concurrency,...] [seconds] | compare <baseline> <candidate>")
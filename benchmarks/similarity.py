@@ -0,0 +1,95 @@
+# Query latency of the similar.py nearest-neighbour index on synthetically
+# enlarged data: the real Pokémon (or, without a database, random stat lines)
+# are resampled with jitter to each size, and single queries are timed with
+# and without type/generation filters, next to the throughput of batched
+# queries. Results are printed and recorded under benchmarks/results/.
+#
+# Usage: python3 benchmarks/similarity.py [size,...] [queries]
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from similar import SimilarityIndex, FEATURES
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SIZES = [1000, 10000, 100000, 1000000]
+TYPES = ['normal', 'fire', 'water', 'grass', 'electric', 'ice', 'fighting', 'poison', 'ground',
+    'flying', 'psychic', 'bug', 'rock', 'ghost', 'dragon', 'dark', 'steel', 'fairy']
+
+def source() -> SimilarityIndex:
+    try:
+        from db_init import SQLEngine
+        with SQLEngine.get().connect() as conn:
+            index = SimilarityIndex.load(conn)
+        print(f"Enlarging {len(index.ids)} Pokémon from the database")
+        return index
+    except Exception as e:
+        print(f"No database ({type(e).__name__}), enlarging random stat lines")
+    rng = np.random.default_rng(0)
+    n = 1000
+    features = np.concatenate([rng.integers(5, 200, (n, 6)), rng.integers(1, 100, (n, 1)), rng.integers(1, 10000, (n, 1))], axis=1)
+    types = np.stack([rng.integers(0, len(TYPES), n), np.where(rng.random(n) < 0.5, rng.integers(0, len(TYPES), n), -1)], axis=1)
+    return SimilarityIndex(np.arange(1, n + 1, dtype=np.int32), [f"pokemon-{i}" for i in range(1, n + 1)],
+        features.astype(np.float32), types.astype(np.int16), rng.integers(1, 10, n).astype(np.int16), TYPES)
+
+def enlarge(base:SimilarityIndex, size:int, rng:np.random.Generator) -> SimilarityIndex:
+    picks = rng.integers(0, len(base.ids), size)
+    features = base.raw[picks] * rng.normal(1, 0.1, (size, len(FEATURES)))
+    return SimilarityIndex(np.arange(1, size + 1, dtype=np.int32), [f"pokemon-{i}" for i in range(1, size + 1)],
+        np.maximum(features, 1).astype(np.float32), base.types[picks], base.generation[picks], base.type_names)
+
+def latency(index:SimilarityIndex, rows:np.ndarray, mask) -> dict:
+    samples = []
+    for row in rows:
+        start = time.perf_counter()
+        index.nearest(index.vectors[row], 10, mask(), exclude=np.array([row]))
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {q: samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 for q, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+
+def run(sizes:list[int], queries:int):
+    rng = np.random.default_rng(1)
+    base = source()
+    some_type = base.type_names[0] if base.type_names else None
+    result = {'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'queries': queries, 'sizes': {}}
+
+    print(f"{'size':>9} {'query':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for size in sizes:
+        index = enlarge(base, size, rng)
+        rows = rng.integers(0, size, queries)
+        cases = {
+            'unfiltered': lambda: None,
+            #The mask is part of the query, so it is built inside the timing
+            f'type {some_type}': lambda: index.mask([some_type]),
+            'generation 1-3': lambda: index.mask(None, [1, 2, 3]),
+            f'type {some_type}, gen 1-3': lambda: index.mask([some_type], [1, 2, 3])
+        }
+        result['sizes'][size] = {}
+        for name, mask in cases.items():
+            timing = latency(index, rows, mask)
+            result['sizes'][size][name] = timing
+            print(f"{size:>9} {name:<22} {timing['p50']:>8.3f} {timing['p95']:>8.3f} {timing['p99']:>8.3f}")
+
+        batch = index.vectors[rng.integers(0, size, 1024)]
+        start = time.perf_counter()
+        index.nearest(batch, 10, batch_size=256)
+        rate = len(batch) / (time.perf_counter() - start)
+        result['sizes'][size]['batched_queries_per_second'] = rate
+        print(f"{size:>9} {'batch of 1024':<22} {rate:>8.0f} queries/s")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"similarity-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    run(
+        [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else SIZES,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    )
@@ -0,0 +1,96 @@
+# Startup cost of the control scripts: per-module import time from
+# python -X importtime (with the heaviest nested imports), and the wall time
+# of control.py commands that must stay instant, next to a bare interpreter.
+# Results are printed and recorded under benchmarks/results/.
+#
+# Usage: python3 benchmarks/startup.py [repeats]
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PYTHON_DIR = os.path.join(ROOT, "python")
+
+#(module, directory it is imported from)
+MODULES = [
+    ('control', PYTHON_DIR),
+    ('stop', PYTHON_DIR),
+    ('start', PYTHON_DIR),
+    ('Assemble', PYTHON_DIR),
+    ('db_init', ROOT)
+]
+
+COMMANDS = {
+    'python -c pass': [sys.executable, "-c", "pass"],
+    'control.py status': [sys.executable, "control.py", "status"]
+}
+
+def import_time(module, directory):
+    #Returns (cumulative microseconds, heaviest nested imports) or None when the import fails
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        return None
+    nested = []
+    total = None
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if name == module:
+            total = int(cumulative_us)
+        else:
+            nested.append((name, int(cumulative_us)))
+    nested.sort(key=lambda n: -n[1])
+    return total, nested[:5]
+
+def wall_time(command, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=PYTHON_DIR, capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run(repeats):
+    result = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'repeats': repeats,
+        'imports': {},
+        'commands': {}
+    }
+
+    print(f"{'module':<10} {'import ms':>10}   heaviest nested imports (median of {repeats})")
+    for module, directory in MODULES:
+        import_time(module, directory)  #first run writes __pycache__
+        samples = [import_time(module, directory) for _ in range(repeats)]
+        if samples[0] is None:
+            print(f"{module:<10} {'failed':>10}   (dependencies missing?)")
+            result['imports'][module] = None
+            continue
+        total = statistics.median(s[0] for s in samples) / 1000
+        nested = samples[-1][1]
+        result['imports'][module] = {'ms': total, 'nested': {name: us / 1000 for name, us in nested}}
+        print(f"{module:<10} {total:>10.1f}   " + ", ".join(f"{name} {us / 1000:.1f}" for name, us in nested))
+
+    print(f"\n{'command':<20} {'wall ms':>10}")
+    for name, command in COMMANDS.items():
+        seconds = wall_time(command, repeats)
+        result['commands'][name] = seconds * 1000
+        print(f"{name:<20} {seconds * 1000:>10.1f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
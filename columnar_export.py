@@ -0,0 +1,184 @@
+# Columnar export of the loaded dataset for notebooks and batch jobs. Every
+# table is streamed out of one consistent snapshot in record batches of a
+# bounded number of rows, and each batch is appended both to a zstd Parquet
+# file (compact, for moving around) and to an uncompressed Arrow IPC file,
+# which ArrowDataset memory-maps so columns are read without copying.
+# An export lands in export/<dataset version>/ with a manifest; data that
+# was already exported is not exported again.
+#
+# Usage:
+#   python3 columnar_export.py export               (or python3 db_init.py --export-parquet)
+#   python3 columnar_export.py info [directory]
+#
+#   from columnar_export import ArrowDataset
+#   stats = ArrowDataset().table("pokemon", ["name", "attack", "speed"])
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+import sqlalchemy
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "pyarrow"])
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+from dataset_version import DatasetVersion
+from db_init import (
+    SQLEngine, PokemonSQLThread, PokemonSpeciesSQLThread, AbilitySQLThread, MoveSQLThread,
+    PokemonMoveSQLThread, EvolutionChainSQLThread, TypeEfficacySQLThread
+)
+
+EXPORT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "export")
+#Names the directory of the newest export, a symlink would not work on every OS
+LATEST_FILE = "latest.json"
+MANIFEST_FILE = "manifest.json"
+
+TABLES = [
+    PokemonSQLThread, PokemonSpeciesSQLThread, AbilitySQLThread, MoveSQLThread,
+    PokemonMoveSQLThread, EvolutionChainSQLThread, TypeEfficacySQLThread
+]
+BATCH_ROWS = 50000
+COMPRESSION = "zstd"
+
+def arrow_type(column_type) -> pa.DataType:
+    if isinstance(column_type, sqlalchemy.ARRAY):
+        return pa.list_(arrow_type(column_type.item_type))
+    if isinstance(column_type, sqlalchemy.BigInteger):
+        return pa.int64()
+    if isinstance(column_type, sqlalchemy.Integer):
+        return pa.int32()
+    if isinstance(column_type, sqlalchemy.Float):
+        return pa.float64()
+    if isinstance(column_type, sqlalchemy.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, sqlalchemy.DateTime):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+def arrow_schema(table:sqlalchemy.Table) -> pa.Schema:
+    return pa.schema([pa.field(c.name, arrow_type(c.type), nullable=c.nullable) for c in table.columns])
+
+class ColumnarExport:
+    def __init__(self, engine, root:str = EXPORT_ROOT, batch_rows:int = BATCH_ROWS):
+        self.engine = engine
+        self.root = root
+        self.batch_rows = batch_rows
+
+    def export_table(self, conn, table:sqlalchemy.Table, directory:str) -> dict:
+        schema = arrow_schema(table)
+        #Sorted by key so row group statistics let readers skip whole groups
+        order = list(table.primary_key.columns) or list(table.columns)[:1]
+        result = conn.execution_options(stream_results=True, yield_per=self.batch_rows).execute(
+            sqlalchemy.select(table).order_by(*order)
+        )
+
+        parquet_path = os.path.join(directory, f"{table.name}.parquet")
+        arrow_path = os.path.join(directory, f"{table.name}.arrow")
+        rows = 0
+        with pq.ParquetWriter(parquet_path, schema, compression=COMPRESSION) as parquet, \
+                pa.OSFile(arrow_path, "wb") as sink, pa.ipc.new_file(sink, schema) as arrow:
+            #Only one batch of rows is held at a time, whatever the table size
+            for partition in result.partitions():
+                columns = list(zip(*partition))
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+                )
+                parquet.write_batch(batch)
+                arrow.write_batch(batch)
+                rows += batch.num_rows
+
+        return {
+            'rows': rows,
+            'parquet': os.path.basename(parquet_path),
+            'parquet_bytes': os.path.getsize(parquet_path),
+            'arrow': os.path.basename(arrow_path),
+            'arrow_bytes': os.path.getsize(arrow_path),
+            'columns': {field.name: str(field.type) for field in schema}
+        }
+
+    def run(self) -> str:
+        started = time.perf_counter()
+        #One snapshot for every table, so the files agree with each other and with the version stamp
+        with self.engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+            with conn.begin():
+                version = DatasetVersion.current(conn)
+                name = version['content_hash'][:16] if version else "unversioned-" + time.strftime("%Y%m%d-%H%M%S")
+                directory = os.path.join(self.root, name)
+                if os.path.isfile(os.path.join(directory, MANIFEST_FILE)):
+                    print(f"Dataset version {name} is already exported in {directory}")
+                    self.set_latest(name)
+                    return directory
+
+                #Written aside and renamed, a reader never finds a half written export
+                temporary = directory + ".tmp"
+                shutil.rmtree(temporary, ignore_errors=True)
+                os.makedirs(temporary)
+                manifest = {'dataset_version': version, 'exported_at': time.strftime("%Y-%m-%dT%H:%M:%S"), 'tables': {}}
+                for cls in TABLES:
+                    table = cls.define_table(sqlalchemy.MetaData())
+                    start = time.perf_counter()
+                    manifest['tables'][table.name] = self.export_table(conn, table, temporary)
+                    exported = manifest['tables'][table.name]
+                    print(f"Exported {exported['rows']:7d} rows of {table.name} ({exported['parquet_bytes'] / 1024:.0f} KiB parquet) in {time.perf_counter() - start:.2f} s")
+
+        with open(os.path.join(temporary, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        #A directory without a manifest is what an interrupted rename left behind
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(temporary, directory)
+        self.set_latest(name)
+        print(f"Export complete in {time.perf_counter() - started:.2f} s: {directory}")
+        return directory
+
+    def set_latest(self, name:str):
+        temporary = os.path.join(self.root, LATEST_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump({'directory': name}, f)
+        os.replace(temporary, os.path.join(self.root, LATEST_FILE))
+
+class ArrowDataset:
+    #Read side of an export; the newest one unless a directory is given
+    def __init__(self, directory:str|None = None, root:str = EXPORT_ROOT):
+        if directory is None:
+            with open(os.path.join(root, LATEST_FILE)) as f:
+                directory = os.path.join(root, json.load(f)['directory'])
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def tables(self) -> list[str]:
+        return list(self.manifest['tables'])
+
+    def table(self, name:str, columns:list[str]|None = None) -> pa.Table:
+        #Memory-mapped Arrow IPC: the buffers point into the page cache, nothing is decoded or copied
+        source = pa.memory_map(os.path.join(self.directory, self.manifest['tables'][name]['arrow']), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def parquet(self, name:str, columns:list[str]|None = None, filters=None) -> pa.Table:
+        #The compressed copy, decoding only the requested columns and row groups that can match
+        return pq.read_table(os.path.join(self.directory, self.manifest['tables'][name]['parquet']), columns=columns, filters=filters)
+
+def info(directory:str|None):
+    dataset = ArrowDataset(directory)
+    version = dataset.manifest['dataset_version']
+    print(f"{dataset.directory} (dataset version {version['content_hash'][:16] if version else 'none'}, exported {dataset.manifest['exported_at']})")
+    for name, table in dataset.manifest['tables'].items():
+        print(f"  {name:<18} {table['rows']:8d} rows  {table['parquet_bytes'] / 1024:8.0f} KiB parquet  {table['arrow_bytes'] / 1024:8.0f} KiB arrow")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "export":
+        ColumnarExport(SQLEngine.get()).run()
+    elif command == "info":
+        info(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print("Usage: columnar_export.py export | info [directory]")
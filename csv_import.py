@@ -0,0 +1,313 @@
+# Offline bulk import from PokeAPI's CSV data dump (data/v2/csv in the PokeAPI
+# repository). The raw tables are joined and pivoted into our rows with pandas
+# and streamed into Postgres with COPY, so a full rebuild needs no network.
+#
+# Usage: python3 csv_import.py <path to data/v2/csv>
+import os
+import sys
+import io
+import time
+import subprocess
+
+import sqlalchemy
+
+try:
+    import pandas as pd
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "pandas"])
+    import pandas as pd
+
+from db_init import (
+    SQLEngine, ReadModels, AbilitySQLThread, MoveSQLThread, PokemonSpeciesSQLThread, PokemonSQLThread,
+    PokemonMoveSQLThread, LearnsetSQLThread, EvolutionChainSQLThread, EvolutionClosureSQLThread, TypeEfficacySQLThread
+)
+
+ENGLISH = 9
+NATIONAL_DEX = 1
+SPRITES_URL = "https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon"
+CRIES_URL = "https://raw.githubusercontent.com/PokeAPI/cries/main/cries/pokemon"
+
+#In foreign key order, the same tables db_init.py fills
+TABLES = [
+    AbilitySQLThread, MoveSQLThread, PokemonSpeciesSQLThread, PokemonSQLThread,
+    PokemonMoveSQLThread, LearnsetSQLThread, EvolutionChainSQLThread, EvolutionClosureSQLThread, TypeEfficacySQLThread
+]
+
+def array_literal(values) -> str|None:
+    if not isinstance(values, list):
+        return None
+    quoted = ['"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values]
+    return "{" + ",".join(quoted) + "}"
+
+def copy_frame(cursor, table:sqlalchemy.Table, frame:pd.DataFrame, chunk_size:int = 100000) -> int:
+    columns = [c for c in table.columns if c.name in frame.columns]
+    frame = frame[[c.name for c in columns]].copy()
+
+    #Coerce to what COPY expects for the column type: no "1.0" integers, arrays as literals
+    for column in columns:
+        series = frame[column.name]
+        if isinstance(column.type, sqlalchemy.Integer):
+            frame[column.name] = pd.to_numeric(series).round().astype("Int64")
+        elif isinstance(column.type, sqlalchemy.Boolean):
+            frame[column.name] = series.astype("boolean")
+        elif isinstance(column.type, sqlalchemy.ARRAY):
+            frame[column.name] = series.map(array_literal)
+        elif pd.api.types.is_float_dtype(series):
+            frame[column.name] = series.round().astype("Int64")
+
+    names = ", ".join(f'"{c.name}"' for c in columns)
+    for start in range(0, len(frame), chunk_size):
+        buffer = io.StringIO()
+        frame.iloc[start:start + chunk_size].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table.name} ({names}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(frame)
+
+class CSVImport:
+    def __init__(self, directory:str):
+        self.directory = directory
+        self._frames = {}
+
+    def read(self, name:str) -> pd.DataFrame:
+        if name not in self._frames:
+            self._frames[name] = pd.read_csv(os.path.join(self.directory, name + ".csv"))
+        return self._frames[name]
+
+    def identifiers(self, name:str) -> pd.Series:
+        frame = self.read(name)
+        return frame.set_index('id')['identifier']
+
+    def english(self, name:str, key:str, language:str = 'local_language_id', latest:str|None = None) -> pd.DataFrame:
+        #The REST loaders keep the last English entry, which is the newest version's text
+        frame = self.read(name)
+        frame = frame[frame[language] == ENGLISH]
+        if latest is not None:
+            frame = frame.sort_values(latest)
+        return frame.drop_duplicates(key, keep='last').set_index(key)
+
+    def ability(self) -> pd.DataFrame:
+        abilities = self.read("abilities")
+        names = self.english("ability_names", "ability_id")
+        prose = self.english("ability_prose", "ability_id")
+        flavor = self.english("ability_flavor_text", "ability_id", language='language_id', latest='version_group_id')
+
+        ids = abilities['id']
+        return pd.DataFrame({
+            'id': ids,
+            'name': ids.map(names['name']).fillna(abilities['identifier']),
+            'effect': ids.map(prose['effect']).fillna("No description."),
+            'short_effect': ids.map(prose['short_effect']).fillna("No description."),
+            'description': ids.map(flavor['flavor_text']).fillna("No description."),
+            'generation': abilities['generation_id']
+        })
+
+    def move(self) -> pd.DataFrame:
+        moves = self.read("moves")
+        meta = self.read("move_meta").set_index('move_id')
+        names = self.english("move_names", "move_id")
+        flavor = self.english("move_flavor_text", "move_id", language='language_id', latest='version_group_id')
+
+        ids = moves['id']
+        frame = pd.DataFrame({
+            'id': ids,
+            'name': ids.map(names['name']).fillna(moves['identifier']),
+            'accuracy': moves['accuracy'],
+            'damage_class': moves['damage_class_id'].map(self.identifiers("move_damage_classes")),
+            'effect_chance': moves['effect_chance'],
+            'generation': moves['generation_id'],
+            'ailment': ids.map(meta['meta_ailment_id']).map(self.identifiers("move_meta_ailments")),
+            'power': moves['power'],
+            'pp': moves['pp'],
+            'priority': moves['priority'],
+            'target': moves['target_id'].map(self.identifiers("move_targets")),
+            'type': moves['type_id'].map(self.identifiers("types")),
+            'description': ids.map(flavor['flavor_text']).fillna("No description.")
+        })
+        for key in ['ailment_chance', 'crit_rate', 'drain', 'flinch_chance', 'healing', 'max_hits', 'max_turns', 'min_hits', 'min_turns', 'stat_chance']:
+            frame[key] = ids.map(meta[key])
+        return frame
+
+    def pokemon_species(self) -> pd.DataFrame:
+        species = self.read("pokemon_species")
+        names = self.english("pokemon_species_names", "pokemon_species_id")
+        flavor = self.english("pokemon_species_flavor_text", "species_id", language='language_id', latest='version_id')
+        dex = self.read("pokemon_dex_numbers")
+        dex = dex[dex['pokedex_id'] == NATIONAL_DEX].set_index('species_id')['pokedex_number']
+        egg_groups = self.read("pokemon_egg_groups")
+        egg_groups = egg_groups.assign(name=egg_groups['egg_group_id'].map(self.identifiers("egg_groups")))
+        egg_groups = egg_groups.groupby('species_id')['name'].agg(list)
+        varieties = self.read("pokemon").groupby('species_id')['id'].agg(list)
+
+        ids = species['id']
+        frame = species[['id', 'base_happiness', 'capture_rate', 'gender_rate', 'hatch_counter', 'order']].copy()
+        for key in ['is_baby', 'is_legendary', 'is_mythical']:
+            frame[key] = species[key].astype(bool)
+        for key, table in [('color', 'pokemon_colors'), ('growth_rate', 'growth_rates'), ('habitat', 'pokemon_habitats'), ('shape', 'pokemon_shapes')]:
+            frame[key] = species[key + '_id'].map(self.identifiers(table)).str.replace("-", " ")
+        frame['generation'] = species['generation_id']
+        frame['national_pokedex_number'] = ids.map(dex).fillna(-1)
+        frame['name'] = ids.map(names['name']).fillna(species['identifier'])
+        frame['genera'] = ids.map(names['genus']).fillna("")
+        frame['egg_group'] = ids.map(egg_groups).map(lambda v: v if isinstance(v, list) else [])
+        frame['varieties'] = ids.map(varieties).map(lambda v: v if isinstance(v, list) else [])
+        frame['description'] = ids.map(flavor['flavor_text']).fillna("No description.")
+        return frame
+
+    def pokemon(self) -> pd.DataFrame:
+        pokemon = self.read("pokemon")
+        ids = pokemon['id']
+        frame = pokemon[['id', 'base_experience', 'height', 'weight', 'order']].copy()
+        frame['name'] = pokemon['identifier']
+        frame['species'] = pokemon['species_id']
+
+        #Ability slots 1-3 pivoted into columns, -1 when the slot is empty like the REST loader
+        abilities = self.read("pokemon_abilities").pivot_table(index='pokemon_id', columns='slot', values='ability_id', aggfunc='first')
+        for slot, key in [(1, 'primary_ability'), (2, 'secondary_ability'), (3, 'hidden_ability')]:
+            frame[key] = ids.map(abilities[slot]).fillna(-1) if slot in abilities.columns else -1
+
+        #One row per (pokemon, stat) pivoted into hp/attack/... and their *_effort columns
+        stats = self.read("pokemon_stats")
+        stats = stats.assign(stat=stats['stat_id'].map(self.identifiers("stats")).str.replace("-", "_"))
+        base = stats.pivot_table(index='pokemon_id', columns='stat', values='base_stat', aggfunc='first')
+        effort = stats.pivot_table(index='pokemon_id', columns='stat', values='effort', aggfunc='first')
+        for stat in ['hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed']:
+            frame[stat] = ids.map(base[stat])
+            frame[stat + '_effort'] = ids.map(effort[stat])
+
+        types = self.read("pokemon_types")
+        types = types.assign(type=types['type_id'].map(self.identifiers("types")))
+        by_slot = types.pivot_table(index='pokemon_id', columns='slot', values='type', aggfunc='first')
+        frame['primary_type'] = ids.map(by_slot[1])
+        frame['secondary_type'] = ids.map(by_slot[2]) if 2 in by_slot.columns else None
+
+        #The dump has no media columns; these follow the sprite/cry repositories' layout
+        path = ids.astype(str)
+        frame['sprite_front_default'] = SPRITES_URL + "/" + path + ".png"
+        frame['sprite_front_shiny'] = SPRITES_URL + "/shiny/" + path + ".png"
+        frame['sprite_back_default'] = SPRITES_URL + "/back/" + path + ".png"
+        frame['sprite_back_shiny'] = SPRITES_URL + "/back/shiny/" + path + ".png"
+        frame['cry'] = CRIES_URL + "/latest/" + path + ".ogg"
+        frame['cry_legacy'] = CRIES_URL + "/legacy/" + path + ".ogg"
+        return frame
+
+    def learnset(self) -> pd.DataFrame:
+        moves = self.read("pokemon_moves")
+        return pd.DataFrame({
+            'version_group': moves['version_group_id'],
+            'pokemon': moves['pokemon_id'],
+            'learn_method': moves['pokemon_move_method_id'],
+            'level_learned_at': moves['level'],
+            'move': moves['move_id']
+        }).drop_duplicates()
+
+    def pokemon_move(self) -> pd.DataFrame:
+        #Same selection as PokemonMoveProcessThread: the newest version group per move
+        moves = self.read("pokemon_moves").sort_values(['pokemon_id', 'move_id', 'version_group_id'])
+        moves = moves.drop_duplicates(['pokemon_id', 'move_id'], keep='last')
+        return pd.DataFrame({
+            'pokemon': moves['pokemon_id'],
+            'move': moves['move_id'],
+            'level_learned_at': moves['level'],
+            'learn_method': moves['pokemon_move_method_id'].map(self.identifiers("pokemon_move_methods"))
+        })
+
+    def evolution_chain(self) -> pd.DataFrame:
+        species = self.read("pokemon_species").dropna(subset=['evolves_from_species_id'])
+        evolutions = self.read("pokemon_evolution").sort_values('id').drop_duplicates('evolved_species_id', keep='first')
+        edges = species.merge(evolutions, left_on='id', right_on='evolved_species_id', suffixes=('', '_evolution'))
+
+        items = self.identifiers("items")
+        types = self.identifiers("types")
+        frame = pd.DataFrame({
+            'from': edges['evolves_from_species_id'],
+            'to': edges['id'],
+            'chain': edges['evolution_chain_id'],
+            'item': edges['trigger_item_id'].map(items),
+            'held_item': edges['held_item_id'].map(items),
+            'known_move': edges['known_move_id'],
+            'known_move_type': edges['known_move_type_id'].map(types),
+            'trigger': edges['evolution_trigger_id'].map(self.identifiers("evolution_triggers")),
+            'party_species': edges['party_species_id'],
+            'party_type': edges['party_type_id'].map(types),
+            'trade_species': edges['trade_species_id'],
+            'gender': edges['gender_id'],
+            'min_beauty': edges['minimum_beauty'],
+            'min_happiness': edges['minimum_happiness'],
+            'min_level': edges['minimum_level'],
+            'needs_overworld_rain': edges['needs_overworld_rain'].astype("boolean"),
+            'time_of_day': edges['time_of_day'],
+            'turn_upside_down': edges['turn_upside_down'].astype("boolean"),
+            'relative_physical_stats': edges['relative_physical_stats']
+        })
+        #EvolutionChainProcessThread stores falsy details as NULL
+        for key in ['gender', 'min_beauty', 'min_happiness', 'min_level', 'needs_overworld_rain', 'time_of_day', 'turn_upside_down', 'relative_physical_stats']:
+            series = frame[key]
+            empty = series == "" if pd.api.types.is_object_dtype(series) else series == 0
+            frame[key] = series.mask(series.isna() | empty.fillna(True))
+        return frame
+
+    def evolution_closure(self) -> pd.DataFrame:
+        species = self.read("pokemon_species")
+        parent = species.set_index('id')['evolves_from_species_id'].dropna().astype(int)
+
+        #Walk every species up its chain one level per iteration, all species at once
+        level = pd.DataFrame({'descendant': species['id'], 'ancestor': species['id'], 'depth': 0})
+        levels = []
+        while len(level) > 0:
+            levels.append(level)
+            level = level.assign(ancestor=level['ancestor'].map(parent), depth=level['depth'] + 1)
+            level = level.dropna(subset=['ancestor']).astype({'ancestor': int})
+
+        closure = pd.concat(levels, ignore_index=True)
+        closure['stage'] = closure['descendant'].map(closure.groupby('descendant')['depth'].max())
+        closure['chain'] = closure['descendant'].map(species.set_index('id')['evolution_chain_id'])
+        return closure
+
+    def type_efficacy(self) -> pd.DataFrame:
+        #Neutral pairs are left out, as in the REST damage relations
+        efficacy = self.read("type_efficacy")
+        efficacy = efficacy[efficacy['damage_factor'] != 100]
+        types = self.identifiers("types")
+        return pd.DataFrame({
+            'attacking_type': efficacy['damage_type_id'].map(types),
+            'defending_type': efficacy['target_type_id'].map(types),
+            'factor': efficacy['damage_factor'] / 100
+        })
+
+    def run(self):
+        started = time.perf_counter()
+        engine = SQLEngine.get()
+        metadata = sqlalchemy.MetaData()
+        tables = [cls.define_table(metadata) for cls in TABLES]
+        metadata.create_all(engine)
+
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text(LearnsetSQLThread.lookup_tables_sql()))
+            names = ", ".join(table.name for table in tables)
+            conn.execute(sqlalchemy.text(f"TRUNCATE {names}, version_group, move_learn_method CASCADE"))
+            cursor = conn.connection.cursor()
+
+            lookups = [
+                (sqlalchemy.table('version_group', sqlalchemy.column('id'), sqlalchemy.column('name')), "version_groups"),
+                (sqlalchemy.table('move_learn_method', sqlalchemy.column('id'), sqlalchemy.column('name')), "pokemon_move_methods")
+            ]
+            for table, source in lookups:
+                frame = self.read(source)[['id', 'identifier']].rename(columns={'identifier': 'name'})
+                copy_frame(cursor, table, frame)
+            for version_group in self.read("version_groups")['id']:
+                conn.execute(sqlalchemy.text(LearnsetSQLThread.partition_sql(int(version_group))))
+
+            for table in tables:
+                start = time.perf_counter()
+                rows = copy_frame(cursor, table, getattr(self, table.name)())
+                print(f"Copied {rows:7d} rows into {table.name} in {time.perf_counter() - start:.2f} s")
+
+        print("Refreshing read models...")
+        ReadModels.refresh(engine)
+        print(f"CSV import complete in {time.perf_counter() - started:.2f} s")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: csv_import.py <path to PokeAPI data/v2/csv>")
+        sys.exit(1)
+    CSVImport(sys.argv[1]).run()
@@ -0,0 +1,106 @@
+# Read-only dataset file for read nodes without a database. Whenever the
+# loader publishes a dataset version it also writes inc/dataset.sqlite: the
+# list cards in display order (rowid = position, so a random pick is one
+# rowid lookup), the detail rows, indexes on id and lower-cased name, and the
+# version stamp. api/get_pokemon.php answers list, search, random and detail
+# requests from it on read nodes that opt in (SERVE_DATASET_FILE=1), opening
+# it read-only with mmap so every PHP worker shares the same pages through
+# the page cache. Elsewhere the file is ignored and the API reads Postgres.
+#
+# Copy the file to a read node (with the Web/ and api/ folders) and set
+# SERVE_DATASET_FILE=1 to serve without Postgres; the file is replaced by
+# rename, so copying it in place is atomic as well.
+#
+# Usage: python3 dataset_snapshot.py [path]
+import os
+import sys
+import time
+import sqlite3
+
+import sqlalchemy
+
+from dataset_version import DatasetVersion
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inc", "dataset.sqlite")
+#Bumped whenever the layout below changes; readers check PRAGMA user_version
+FORMAT_VERSION = 1
+
+#Same columns, in the same order, as get_pokemon.php reads from pokemon_list_card
+LIST_COLUMNS = [
+    'id', 'order', 'name', 'sprite_front_default', 'primary_type', 'secondary_type',
+    'atlas_sheet', 'atlas_x', 'atlas_y', 'atlas_width', 'atlas_height'
+]
+
+class DatasetSnapshot:
+    @staticmethod
+    def write(conn, schema:str|None = None, path:str = SNAPSHOT_FILE) -> str|None:
+        started = time.perf_counter()
+        prefix = f"{schema}." if schema else ""
+        if conn.execute(sqlalchemy.text("SELECT to_regclass(:name)"), {'name': prefix + "pokemon_list_card"}).scalar() is None:
+            print("No read models to snapshot, skipping the dataset file")
+            return None
+        version = DatasetVersion.current(conn, schema)
+        names = ", ".join(f'"{c}"' for c in LIST_COLUMNS)
+        cards = conn.execute(sqlalchemy.text(f'SELECT {names} FROM {prefix}pokemon_list_card ORDER BY "order", id')).all()
+        detail = conn.execute(sqlalchemy.text(f"SELECT * FROM {prefix}pokemon_detail ORDER BY id"))
+        detail_columns = list(detail.keys())
+        details = detail.all()
+
+        #Built aside and renamed, so open readers keep the old file and new ones get the whole new one
+        temporary = path + ".tmp"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        db = sqlite3.connect(temporary)
+        try:
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA page_size = 4096")
+            db.execute(f"PRAGMA user_version = {FORMAT_VERSION}")
+
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ('content_hash', version['content_hash'] if version else None),
+                ('loaded_at', str(version['loaded_at']) if version else None),
+                ('count', str(len(cards))),
+                ('built_at', str(int(time.time())))
+            ])
+
+            #rowid is the 1-based position in display order
+            db.execute(f"CREATE TABLE pokemon_list ({names}, name_lower TEXT)")
+            db.executemany(
+                f"INSERT INTO pokemon_list (rowid, {names}, name_lower) VALUES ({', '.join('?' * (len(LIST_COLUMNS) + 2))})",
+                [(position, *row, (row[2] or "").lower()) for position, row in enumerate(cards, start=1)]
+            )
+            db.execute("CREATE UNIQUE INDEX pokemon_list_id ON pokemon_list (id)")
+            db.execute("CREATE INDEX pokemon_list_name ON pokemon_list (name_lower)")
+
+            columns = ", ".join(f'"{c}"' + (" INTEGER PRIMARY KEY" if c == 'id' else "") for c in detail_columns)
+            db.execute(f"CREATE TABLE pokemon_detail ({columns}, name_lower TEXT)")
+            name = detail_columns.index('name')
+            db.executemany(
+                f"INSERT INTO pokemon_detail VALUES ({', '.join('?' * (len(detail_columns) + 1))})",
+                [(*(DatasetSnapshot.value(v) for v in row), (row[name] or "").lower()) for row in details]
+            )
+            db.execute("CREATE INDEX pokemon_detail_name ON pokemon_detail (name_lower)")
+
+            db.commit()
+            db.execute("ANALYZE")
+            db.execute("VACUUM")
+        finally:
+            db.close()
+        os.replace(temporary, path)
+        print(f"Wrote {len(cards)} Pokémon to {path} ({os.path.getsize(path) / 1024:.0f} KiB) in {time.perf_counter() - started:.2f} s")
+        return path
+
+    @staticmethod
+    def value(v):
+        #Booleans as Postgres prints them, so both backends render the same detail
+        if isinstance(v, bool):
+            return 't' if v else 'f'
+        if v is None or isinstance(v, (int, float, str)):
+            return v
+        return str(v)
+
+if __name__ == "__main__":
+    from db_init import SQLEngine
+    with SQLEngine.get().connect() as conn:
+        DatasetSnapshot.write(conn, path=sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_FILE)
@@ -0,0 +1,84 @@
+# Dataset version stamp. Every read model refresh hashes what the API serves and
+# records the hash with the time it first appeared; the current stamp is also
+# published to inc/dataset_version.json, where the PHP API reads its cache
+# validators (ETag / Last-Modified) without touching the database.
+import os
+import json
+import hashlib
+
+import sqlalchemy
+
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inc", "dataset_version.json")
+
+class DatasetVersion:
+    @staticmethod
+    def create_table_sql() -> str:
+        #One row per distinct content; reloading the current data keeps its loaded_at, returning to
+        #earlier content stamps it anew so Last-Modified never goes backwards
+        return """
+        CREATE TABLE IF NOT EXISTS dataset_version (
+            content_hash TEXT PRIMARY KEY,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            confirmed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+
+    @staticmethod
+    def content_hash(conn, relations:list[str]) -> str:
+        digest = hashlib.sha256()
+        for relation in relations:
+            part = conn.execute(sqlalchemy.text(
+                f"SELECT md5(coalesce(string_agg(r::text, E'\\n' ORDER BY r::text), '')) FROM {relation} r"
+            )).scalar()
+            digest.update(f"{relation}:{part}\n".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def stamp(conn, relations:list[str]) -> dict:
+        conn.execute(sqlalchemy.text(DatasetVersion.create_table_sql()))
+        content_hash = DatasetVersion.content_hash(conn, relations)
+        conn.execute(sqlalchemy.text("""
+            INSERT INTO dataset_version (content_hash) VALUES (:hash)
+            ON CONFLICT (content_hash) DO UPDATE SET
+                loaded_at = CASE
+                    WHEN dataset_version.content_hash = (SELECT content_hash FROM dataset_version ORDER BY confirmed_at DESC LIMIT 1)
+                    THEN dataset_version.loaded_at ELSE now()
+                END,
+                confirmed_at = now()
+        """), {'hash': content_hash})
+        return DatasetVersion.current(conn)
+
+    @staticmethod
+    def restamp(conn, schema:str|None = None):
+        #The current content becomes live again without a load (a rollback): new loaded_at, as in stamp()
+        table = f"{schema}.dataset_version" if schema else "dataset_version"
+        if conn.execute(sqlalchemy.text("SELECT to_regclass(:table)"), {'table': table}).scalar() is None:
+            return
+        conn.execute(sqlalchemy.text(f"""
+            UPDATE {table} SET loaded_at = now(), confirmed_at = now()
+            WHERE content_hash = (SELECT content_hash FROM {table} ORDER BY confirmed_at DESC LIMIT 1)
+        """))
+
+    @staticmethod
+    def current(conn, schema:str|None = None) -> dict|None:
+        table = f"{schema}.dataset_version" if schema else "dataset_version"
+        if conn.execute(sqlalchemy.text("SELECT to_regclass(:table)"), {'table': table}).scalar() is None:
+            return None
+        row = conn.execute(sqlalchemy.text(f"""
+            SELECT content_hash, extract(epoch FROM loaded_at)::bigint, extract(epoch FROM confirmed_at)::bigint
+            FROM {table} ORDER BY confirmed_at DESC LIMIT 1
+        """)).first()
+        if row is None:
+            return None
+        return {'content_hash': row[0], 'loaded_at': row[1], 'confirmed_at': row[2]}
+
+    @staticmethod
+    def publish(version:dict|None, path:str = VERSION_FILE):
+        if version is None:
+            return
+        #Written aside and renamed so a request never reads half a file
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(version, f)
+        os.replace(temporary, path)
+        print(f"Dataset version {version['content_hash'][:16]} published")
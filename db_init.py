@@ -3,6 +3,7 @@ import subprocess
 
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql
 
 try:
     import requests
@@ -20,14 +21,27 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "psycopg2"])
     import psycopg2
 
+import io
 import json
 import threading
 from abc import ABC, abstractmethod
 import time
 import subprocess
 import os
+import hashlib
+
+from media_mirror import MediaMirror
+from sprite_atlas import SpriteAtlas
+from graphql_source import GraphQLSource
+from stage_profiler import StageProfiler
+from schema_swap import SchemaSwap, SHADOW
+from dataset_version import DatasetVersion
+from dataset_snapshot import DatasetSnapshot
 
 class Data:
+    #POKEAPI_URL points the loader at a mirror or a fixture server (benchmarks/ingest_suite.py serve)
+    URL = os.environ.get("POKEAPI_URL", "https://pokeapi.co/api/v2")
+    
     @staticmethod
     def get_url_index(url:str):
         segments = url.rstrip('/').split('/')
@@ -36,7 +50,7 @@ class Data:
         
     @staticmethod
     def fetch_json(name:str, id:[int|None]=None):
-        url = f'https://pokeapi.co/api/v2/{name}'
+        url = f'{Data.URL}/{name}'
         if id is None:
             url = url + "?limit=100000&offset=0"
         else:
@@ -79,6 +93,23 @@ class FetchThread(threading.Thread):
         
         self.has_finished = True
 
+class GraphQLFetchThread(FetchThread):
+    #Feeds the same process threads, but from paged, field-projected GraphQL batches
+    #reshaped into REST documents (see graphql_source.py)
+    def run(self):
+        try:
+            source = GraphQLSource()
+            self.max = source.count(self.name)
+            
+            for record in source.records(self.name):
+                self.notify_listeners(record)
+                self.progress += 1
+        except Exception as e:
+            self.exception = e
+            self.exception_count += 1
+        
+        self.has_finished = True
+
 class ProcessThread(threading.Thread, ABC):
     def __init__(self, name:str, fetch_thread:FetchThread):
         super().__init__()
@@ -142,15 +173,35 @@ class ProcessThread(threading.Thread, ABC):
 
 class SQLEngine:
     _URL = 'postgresql://postgres@localhost:5432/postgres'
+    _SCHEMA = None
     _engine = None
     
     @staticmethod
     def get():
         if SQLEngine._engine is None:
-            SQLEngine._engine = sqlalchemy.create_engine(SQLEngine._URL)
+            connect_args, execution_options = {}, {}
+            if SQLEngine._SCHEMA:
+                #Table objects are created and written in the schema by name: through search_path alone,
+                #create_all would find the live tables in public and skip creating them. Raw SQL resolves
+                #through search_path, which puts the schema first
+                connect_args = {'options': f'-csearch_path={SQLEngine._SCHEMA},public'}
+                execution_options = {'schema_translate_map': {None: SQLEngine._SCHEMA}}
+            SQLEngine._engine = sqlalchemy.create_engine(SQLEngine._URL, connect_args=connect_args, execution_options=execution_options)
         return SQLEngine._engine
+    
+    @staticmethod
+    def use_schema(schema:str|None):
+        #Engines handed out from here on read and write schema (None: the database default)
+        if SQLEngine._engine is not None:
+            SQLEngine._engine.dispose()
+        SQLEngine._SCHEMA = schema
+        SQLEngine._engine = None
 
 class SQLThread(threading.Thread, ABC):
+    #One MetaData for every thread's table so foreign keys between them resolve at create time
+    metadata = sqlalchemy.MetaData()
+    _create_lock = threading.Lock()
+    
     def __init__(self, name, process_thread:ProcessThread):
         super().__init__()
         self.name = name
@@ -161,8 +212,8 @@ class SQLThread(threading.Thread, ABC):
         self._progress = 0
         self.exception_count = 0
         self._session = None
-        self._metadata = sqlalchemy.MetaData()
-        self._table = self.define_table(self._metadata)
+        self._metadata = SQLThread.metadata
+        self._table = self.define_table(sqlalchemy.MetaData()).to_metadata(self._metadata)
     
     @property
     def max(self):
@@ -208,16 +259,19 @@ class SQLThread(threading.Thread, ABC):
                     self.insert_sql(d)
                 self.commit()
             except:
+                self.rollback()
                 self.exception_count += 1
             self.progress += 1
 
     
+    @staticmethod
     @abstractmethod
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         pass
     
     def create_sql(self):
-        self._metadata.create_all(SQLEngine.get())
+        with SQLThread._create_lock:
+            self._metadata.create_all(SQLEngine.get())
     
     def insert_sql(self, d):
         self._session.execute(self._table.insert(), d if isinstance(d, list) else [d])
@@ -225,6 +279,9 @@ class SQLThread(threading.Thread, ABC):
     def commit(self):
         self._session.commit()
     
+    def rollback(self):
+        self._session.rollback()
+    
 class AbilityProcessThread(ProcessThread):
     def __init__(self, fetch_thread:FetchThread):
         super().__init__("ability", fetch_thread)
@@ -332,7 +389,7 @@ class MoveProcessThread(ProcessThread):
         pokemon_dict['description'] = "No description."
         for l in data['flavor_text_entries']:
             if l['language']['name'] == "en":
-                pokemon_dict['descriprion'] = l['flavor_text']
+                pokemon_dict['description'] = l['flavor_text']
         
         return pokemon_dict
 
@@ -362,7 +419,7 @@ class PokemonSpeciesProcessThread(ProcessThread):
             pokemon_dict[key] = data[key]['name'].replace("-", " ") if data[key] else None
         
         #Egg groups
-        pokemon_dict['egg_group'] = str([g['name'] for g in data['egg_groups']]) if data['egg_groups'] else None
+        pokemon_dict['egg_group'] = [g['name'] for g in data['egg_groups']]
         
         #Genera
         pokemon_dict['genera'] = ""
@@ -393,12 +450,7 @@ class PokemonSpeciesProcessThread(ProcessThread):
        
         #Varieties
         try:
-            pokemon_dict['varieties'] = ""
-            for i, s in enumerate([Data.get_url_index(v['pokemon']['url']) for v in data['varieties']]):
-                pokemon_dict['varieties'] += str(s)
-                if i > 0:
-                    pokemon_dict['varieties'] += ", "
-            pokemon_dict['varieties'] = "[" + pokemon_dict['varieties'] + "]"
+            pokemon_dict['varieties'] = [Data.get_url_index(v['pokemon']['url']) for v in data['varieties']]
         except:
             pass
         
@@ -497,6 +549,32 @@ class PokemonMoveProcessThread(ProcessThread):
         
         return pokemon_move_list
 
+class LearnsetProcessThread(ProcessThread):
+    def __init__(self, fetch_thread:FetchThread):
+        super().__init__("learnset", fetch_thread)
+    
+    def process(self, data):
+        #Unlike pokemon-move, keeps every version group a move is learned in.
+        #Version groups and learn methods are stored as their PokeAPI ids.
+        pokemon_index = data['id']
+        
+        learnset_list = []
+        for move in data['moves']:
+            move_index = Data.get_url_index(move['move']['url'])
+            for details in move['version_group_details']:
+                learnset_list.append({
+                    'pokemon': pokemon_index,
+                    'move': move_index,
+                    'version_group': Data.get_url_index(details['version_group']['url']),
+                    'version_group_name': details['version_group']['name'],
+                    'learn_method': Data.get_url_index(details['move_learn_method']['url']),
+                    'learn_method_name': details['move_learn_method']['name'],
+                    'level_learned_at': details['level_learned_at']
+                })
+        
+        #Handed to the SQL thread as one unit so the pokémon's learnset is replaced as a whole
+        return [learnset_list]
+
 class EvolutionChainProcessThread(ProcessThread):
     def __init__(self, fetch_thread:FetchThread):
         super().__init__("evolution-chain", fetch_thread)
@@ -537,13 +615,66 @@ class EvolutionChainProcessThread(ProcessThread):
             
             return evolution_list
         
-        return self.process(data['chain'], recursion=True)
+        evolution_list = self.process(data['chain'], recursion=True)
+        for entry in evolution_list:
+            entry['chain'] = data['id']
+        return evolution_list
+
+class EvolutionClosureProcessThread(ProcessThread):
+    def __init__(self, fetch_thread:FetchThread):
+        super().__init__("evolution-closure", fetch_thread)
+    
+    def process(self, data):
+        #Every ancestor/descendant pair of one chain, each species paired with itself at depth 0,
+        #so family and "evolves into" lookups need no recursive query
+        chain = data['id']
+        closure_list = []
+        
+        def walk(node, stage, ancestors):
+            species = Data.get_url_index(node['species']['url'])
+            path = ancestors + [species]
+            for depth, ancestor in enumerate(reversed(path)):
+                closure_list.append({
+                    'chain': chain,
+                    'ancestor': ancestor,
+                    'descendant': species,
+                    'depth': depth,
+                    'stage': stage
+                })
+            for evolution in node['evolves_to']:
+                walk(evolution, stage + 1, path)
+        
+        walk(data['chain'], 0, [])
+        
+        #Handed to the SQL thread as one unit so the chain is replaced as a whole
+        return [closure_list]
+
+class TypeEfficacyProcessThread(ProcessThread):
+    #Damage factor of every attacking type against the types it is not neutral to
+    FACTORS = {'double_damage_to': 2.0, 'half_damage_to': 0.5, 'no_damage_to': 0.0}
+    
+    def __init__(self, fetch_thread:FetchThread):
+        super().__init__("type-efficacy", fetch_thread)
+    
+    def process(self, data):
+        efficacy_list = []
+        for relation, factor in TypeEfficacyProcessThread.FACTORS.items():
+            for target in data['damage_relations'][relation]:
+                efficacy_list.append({
+                    'attacking_type': data['name'],
+                    'defending_type': target['name'],
+                    'factor': factor
+                })
+        
+        #One unit per attacking type, so a reload replaces its relations as a whole
+        return [efficacy_list]
 
 class AbilitySQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("ability", process_thread)
 
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'ability', metadata,
             sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
@@ -558,7 +689,8 @@ class MoveSQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("move", process_thread)
     
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'move', metadata,
             sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
@@ -590,7 +722,8 @@ class PokemonSQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("pokemon", process_thread)
     
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'pokemon', metadata,
             sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
@@ -633,7 +766,8 @@ class PokemonSpeciesSQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("pokemon-species", process_thread)
     
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'pokemon_species', metadata,
             sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
@@ -653,16 +787,19 @@ class PokemonSpeciesSQLThread(SQLThread):
             sqlalchemy.Column('shape', sqlalchemy.Text),
             sqlalchemy.Column('genera', sqlalchemy.Text),
             sqlalchemy.Column('name', sqlalchemy.Text),
-            sqlalchemy.Column('egg_group', sqlalchemy.Text),
-            sqlalchemy.Column('varieties', sqlalchemy.Text),
-            sqlalchemy.Column('description', sqlalchemy.Text)
+            sqlalchemy.Column('egg_group', postgresql.ARRAY(sqlalchemy.Text)),
+            sqlalchemy.Column('varieties', postgresql.ARRAY(sqlalchemy.Integer)),
+            sqlalchemy.Column('description', sqlalchemy.Text),
+            sqlalchemy.Index('pokemon_species_egg_group', 'egg_group', postgresql_using='gin'),
+            sqlalchemy.Index('pokemon_species_varieties', 'varieties', postgresql_using='gin')
         )
 
 class PokemonMoveSQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("pokemon-move", process_thread)
     
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'pokemon_move', metadata,
             sqlalchemy.Column('pokemon', sqlalchemy.Integer, sqlalchemy.ForeignKey('pokemon.id')),
@@ -671,16 +808,106 @@ class PokemonMoveSQLThread(SQLThread):
             sqlalchemy.Column('learn_method', sqlalchemy.Text)
         )
 
+class LearnsetSQLThread(SQLThread):
+    COLUMNS = ['version_group', 'pokemon', 'learn_method', 'level_learned_at', 'move']
+    
+    def __init__(self, process_thread:ProcessThread):
+        super().__init__("learnset", process_thread)
+        self._partitions = set()
+        #Created in the open transaction, known to exist only once it commits
+        self._new_partitions = set()
+    
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+        #Partitioned by version group, all small integer codes; the primary key doubles as
+        #the index for "moves X learns in version group Y" within each partition
+        return sqlalchemy.Table(
+            'learnset', metadata,
+            sqlalchemy.Column('version_group', sqlalchemy.SmallInteger, primary_key=True),
+            sqlalchemy.Column('pokemon', sqlalchemy.SmallInteger, primary_key=True),
+            sqlalchemy.Column('learn_method', sqlalchemy.SmallInteger, primary_key=True),
+            sqlalchemy.Column('level_learned_at', sqlalchemy.SmallInteger, primary_key=True),
+            sqlalchemy.Column('move', sqlalchemy.SmallInteger, primary_key=True),
+            sqlalchemy.Index('learnset_move', 'move', 'version_group', postgresql_include=['pokemon']),
+            postgresql_partition_by='LIST (version_group)'
+        )
+    
+    @staticmethod
+    def lookup_tables_sql() -> str:
+        return """
+        CREATE TABLE IF NOT EXISTS version_group (
+            id SMALLINT PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS move_learn_method (
+            id SMALLINT PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        """
+    
+    @staticmethod
+    def partition_sql(version_group:int) -> str:
+        return f"CREATE TABLE IF NOT EXISTS learnset_vg_{version_group} PARTITION OF learnset FOR VALUES IN ({version_group})"
+    
+    def create_sql(self):
+        super().create_sql()
+        with SQLEngine.get().begin() as conn:
+            conn.execute(sqlalchemy.text(LearnsetSQLThread.lookup_tables_sql()))
+    
+    def create_partitions(self, rows):
+        for version_group in {row['version_group'] for row in rows} - self._partitions:
+            self._session.execute(sqlalchemy.text(LearnsetSQLThread.partition_sql(version_group)))
+            self._new_partitions.add(version_group)
+        
+        names = {(row['version_group'], row['version_group_name']) for row in rows}
+        if names:
+            self._session.execute(
+                sqlalchemy.text("INSERT INTO version_group (id, name) VALUES (:id, :name) ON CONFLICT (id) DO NOTHING"),
+                [{'id': i, 'name': n} for i, n in names]
+            )
+        names = {(row['learn_method'], row['learn_method_name']) for row in rows}
+        if names:
+            self._session.execute(
+                sqlalchemy.text("INSERT INTO move_learn_method (id, name) VALUES (:id, :name) ON CONFLICT (id) DO NOTHING"),
+                [{'id': i, 'name': n} for i, n in names]
+            )
+    
+    def commit(self):
+        super().commit()
+        self._partitions |= self._new_partitions
+        self._new_partitions.clear()
+    
+    def rollback(self):
+        #The rollback undid the CREATE TABLE, so the partition is created again with the next rows
+        super().rollback()
+        self._new_partitions.clear()
+    
+    def insert_sql(self, d):
+        rows = d if isinstance(d, list) else [d]
+        if len(rows) == 0:
+            return
+        self.create_partitions(rows)
+        self._session.execute(self._table.delete().where(self._table.c.pokemon == rows[0]['pokemon']))
+        
+        #COPY through the session's own connection so it commits with the delete above
+        buffer = io.StringIO()
+        for row in {tuple(row[c] for c in LearnsetSQLThread.COLUMNS) for row in rows}:
+            buffer.write("\t".join(str(v) for v in row) + "\n")
+        buffer.seek(0)
+        cursor = self._session.connection().connection.cursor()
+        cursor.copy_expert(f"COPY learnset ({', '.join(LearnsetSQLThread.COLUMNS)}) FROM STDIN", buffer)
+
 class EvolutionChainSQLThread(SQLThread):
     def __init__(self, process_thread:ProcessThread):
         super().__init__("evolution-chain", process_thread)
     
-    def define_table(self, metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
         return sqlalchemy.Table(
             'evolution_chain', metadata,
             sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
-            sqlalchemy.Column('"from"', sqlalchemy.Integer, sqlalchemy.ForeignKey('pokemon.id')),
-            sqlalchemy.Column('"to"', sqlalchemy.Integer, sqlalchemy.ForeignKey('pokemon.id')),
+            sqlalchemy.Column('from', sqlalchemy.Integer, sqlalchemy.ForeignKey('pokemon.id')),
+            sqlalchemy.Column('to', sqlalchemy.Integer, sqlalchemy.ForeignKey('pokemon.id')),
             sqlalchemy.Column('gender', sqlalchemy.Integer),
             sqlalchemy.Column('min_beauty', sqlalchemy.Integer),
             sqlalchemy.Column('min_happiness', sqlalchemy.Integer),
@@ -696,28 +923,281 @@ class EvolutionChainSQLThread(SQLThread):
             sqlalchemy.Column('party_type', sqlalchemy.Text),
             sqlalchemy.Column('time_of_day', sqlalchemy.Text),
             sqlalchemy.Column('needs_overworld_rain', sqlalchemy.Boolean),
-            sqlalchemy.Column('turn_upside_down', sqlalchemy.Boolean)
+            sqlalchemy.Column('turn_upside_down', sqlalchemy.Boolean),
+            sqlalchemy.Column('chain', sqlalchemy.Integer, index=True)
         )
 
+class EvolutionClosureSQLThread(SQLThread):
+    def __init__(self, process_thread:ProcessThread):
+        super().__init__("evolution-closure", process_thread)
+    
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+        return sqlalchemy.Table(
+            'evolution_closure', metadata,
+            sqlalchemy.Column('ancestor', sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column('descendant', sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column('depth', sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Column('stage', sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Column('chain', sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Index('evolution_closure_descendant', 'descendant', 'ancestor', postgresql_include=['depth', 'stage', 'chain']),
+            sqlalchemy.Index('evolution_closure_chain', 'chain', 'stage', postgresql_include=['descendant'])
+        )
+    
+    def insert_sql(self, d):
+        #Replace the chain's previous closure, plus rows of species that moved in from another chain
+        rows = d if isinstance(d, list) else [d]
+        if len(rows) == 0:
+            return
+        species = [row['descendant'] for row in rows]
+        self._session.execute(self._table.delete().where(sqlalchemy.or_(
+            self._table.c.chain == rows[0]['chain'],
+            self._table.c.descendant.in_(species),
+            self._table.c.ancestor.in_(species)
+        )))
+        super().insert_sql(rows)
+
+class TypeEfficacySQLThread(SQLThread):
+    def __init__(self, process_thread:ProcessThread):
+        super().__init__("type-efficacy", process_thread)
+    
+    @staticmethod
+    def define_table(metadata:sqlalchemy.MetaData) -> sqlalchemy.Table:
+        return sqlalchemy.Table(
+            'type_efficacy', metadata,
+            sqlalchemy.Column('attacking_type', sqlalchemy.Text, primary_key=True),
+            sqlalchemy.Column('defending_type', sqlalchemy.Text, primary_key=True),
+            sqlalchemy.Column('factor', sqlalchemy.Float, nullable=False)
+        )
+    
+    def insert_sql(self, d):
+        rows = d if isinstance(d, list) else [d]
+        if len(rows) == 0:
+            return
+        self._session.execute(self._table.delete().where(self._table.c.attacking_type == rows[0]['attacking_type']))
+        super().insert_sql(rows)
+
+class ReadModels:
+    #Narrow, pre-joined relations for the web read path, rebuilt after each ingest.
+    #Each entry: (name, query, indexes); the first index must be unique so the
+    #view can be refreshed concurrently while pages are being served.
+    VIEWS = [
+        (
+            'pokemon_list_card',
+            """
+            SELECT p.id, p."order", p.name,
+                COALESCE(sm.path, p.sprite_front_default) AS sprite_front_default,
+                p.primary_type, p.secondary_type,
+                a.sheet AS atlas_sheet, a.x AS atlas_x, a.y AS atlas_y,
+                a.width AS atlas_width, a.height AS atlas_height
+            FROM pokemon p
+            LEFT JOIN media_asset sm ON sm.url = p.sprite_front_default
+            LEFT JOIN sprite_atlas a ON a.pokemon = p.id
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_list_card_id ON pokemon_list_card (id)',
+                'CREATE INDEX IF NOT EXISTS pokemon_list_card_order ON pokemon_list_card ("order") INCLUDE (name, sprite_front_default, primary_type, secondary_type, atlas_sheet, atlas_x, atlas_y, atlas_width, atlas_height)',
+                'CREATE INDEX IF NOT EXISTS pokemon_list_card_name ON pokemon_list_card USING GIN (LOWER(name) gin_trgm_ops)'
+            ]
+        ),
+        (
+            'pokemon_detail',
+            """
+            SELECT p.id, p.name, p.height, p.weight, p.base_experience,
+                p.hp, p.attack, p.defense, p.special_attack, p.special_defense, p.speed,
+                p.primary_type, p.secondary_type,
+                COALESCE(sm.path, p.sprite_front_default) AS sprite_front_default,
+                COALESCE(shm.path, p.sprite_front_shiny) AS sprite_front_shiny,
+                COALESCE(cm.path, p.cry) AS cry,
+                s.id AS species, s.genera, s.generation, s.is_baby, s.is_legendary, s.is_mythical,
+                s.color, s.habitat, s.description,
+                pa.name AS primary_ability, sa.name AS secondary_ability, ha.name AS hidden_ability
+            FROM pokemon p
+            LEFT JOIN pokemon_species s ON s.id = p.species
+            LEFT JOIN ability pa ON pa.id = p.primary_ability
+            LEFT JOIN ability sa ON sa.id = p.secondary_ability
+            LEFT JOIN ability ha ON ha.id = p.hidden_ability
+            LEFT JOIN media_asset sm ON sm.url = p.sprite_front_default
+            LEFT JOIN media_asset shm ON shm.url = p.sprite_front_shiny
+            LEFT JOIN media_asset cm ON cm.url = p.cry
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_detail_id ON pokemon_detail (id)'
+            ]
+        ),
+        (
+            'pokemon_learnset',
+            """
+            SELECT DISTINCT pm.pokemon, pm.move, m.name, m.type, m.damage_class, m.power, m.accuracy, m.pp,
+                pm.level_learned_at, pm.learn_method
+            FROM pokemon_move pm
+            JOIN move m ON m.id = pm.move
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_learnset_key ON pokemon_learnset (pokemon, move, learn_method, level_learned_at)',
+                'CREATE INDEX IF NOT EXISTS pokemon_learnset_pokemon ON pokemon_learnset (pokemon, learn_method, level_learned_at) INCLUDE (name, type, damage_class, power, accuracy, pp)'
+            ]
+        ),
+        (
+            'pokemon_evolution_line',
+            """
+            SELECT e.id, e."from", fs.name AS from_name, e."to", ts.name AS to_name,
+                e.trigger, e.min_level, e.item, e.time_of_day
+            FROM evolution_chain e
+            LEFT JOIN pokemon_species fs ON fs.id = e."from"
+            LEFT JOIN pokemon_species ts ON ts.id = e."to"
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_evolution_line_id ON pokemon_evolution_line (id)',
+                'CREATE INDEX IF NOT EXISTS pokemon_evolution_line_from ON pokemon_evolution_line ("from") INCLUDE ("to", to_name)',
+                'CREATE INDEX IF NOT EXISTS pokemon_evolution_line_to ON pokemon_evolution_line ("to") INCLUDE ("from", from_name)'
+            ]
+        ),
+        (
+            #Full-text search over abilities, moves and species. Weights: A name, B the short
+            #effect (the ailment for moves, the genus for species), C the long texts, D the kind,
+            #so "moves that ..." prefers moves without requiring the word in the text.
+            'search_document',
+            """
+            SELECT 'ability' AS kind, id, name, short_effect AS summary,
+                setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(short_effect, '')), 'B') ||
+                setweight(to_tsvector('english', COALESCE(effect, '') || ' ' || COALESCE(description, '')), 'C') ||
+                setweight(to_tsvector('english', 'ability'), 'D') AS document
+            FROM ability
+            UNION ALL
+            SELECT 'move', id, name, description,
+                setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(ailment, '')), 'B') ||
+                setweight(to_tsvector('english', COALESCE(description, '')), 'C') ||
+                setweight(to_tsvector('english', 'move'), 'D')
+            FROM move
+            UNION ALL
+            SELECT 'species', id, name, description,
+                setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(genera, '')), 'B') ||
+                setweight(to_tsvector('english', COALESCE(description, '')), 'C') ||
+                setweight(to_tsvector('english', 'pokemon species'), 'D')
+            FROM pokemon_species
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS search_document_key ON search_document (kind, id)',
+                'CREATE INDEX IF NOT EXISTS search_document_document ON search_document USING GIN (document)'
+            ]
+        ),
+        (
+            #Everything api/filter.php filters, sorts and counts on, in one row per Pokémon
+            'pokemon_facet',
+            """
+            SELECT p.id, p."order", p.name,
+                COALESCE(sm.path, p.sprite_front_default) AS sprite_front_default,
+                p.primary_type, p.secondary_type,
+                ARRAY_REMOVE(ARRAY[p.primary_type, p.secondary_type], NULL) AS types,
+                s.generation,
+                CASE WHEN s.is_legendary THEN 'legendary' WHEN s.is_mythical THEN 'mythical'
+                    WHEN s.is_baby THEN 'baby' ELSE 'standard' END AS category,
+                p.hp, p.attack, p.defense, p.special_attack, p.special_defense, p.speed,
+                p.hp + p.attack + p.defense + p.special_attack + p.special_defense + p.speed AS total
+            FROM pokemon p
+            LEFT JOIN pokemon_species s ON s.id = p.species
+            LEFT JOIN media_asset sm ON sm.url = p.sprite_front_default
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_facet_id ON pokemon_facet (id)',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_types ON pokemon_facet USING GIN (types)',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_generation ON pokemon_facet (generation, category, "order")',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_category ON pokemon_facet (category, generation, "order")',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_speed ON pokemon_facet (speed, generation)',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_attack ON pokemon_facet (attack, generation)',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_special_attack ON pokemon_facet (special_attack, generation)',
+                'CREATE INDEX IF NOT EXISTS pokemon_facet_total ON pokemon_facet (total, generation)'
+            ]
+        ),
+        (
+            #Facet counts over every Pokémon, so an unfiltered page does not aggregate at all
+            'pokemon_facet_count',
+            """
+            SELECT 'total' AS facet, 'all' AS value, count(*) AS count FROM pokemon_facet
+            UNION ALL
+            SELECT 'type', t.type, count(*) FROM pokemon_facet f, unnest(f.types) AS t(type) GROUP BY t.type
+            UNION ALL
+            SELECT 'generation', f.generation::text, count(*) FROM pokemon_facet f WHERE f.generation IS NOT NULL GROUP BY f.generation
+            UNION ALL
+            SELECT 'category', f.category, count(*) FROM pokemon_facet f GROUP BY f.category
+            """,
+            [
+                'CREATE UNIQUE INDEX IF NOT EXISTS pokemon_facet_count_key ON pokemon_facet_count (facet, value)'
+            ]
+        )
+    ]
+    
+    #Served from outside the views (the type chart behind matchup.py's cached matrix), hashed with them
+    STAMPED_TABLES = ['type_efficacy']
+    
+    #Off while loading into a shadow schema; SchemaSwap publishes once the shadow is live
+    publish_version = True
+    
+    @staticmethod
+    def create(conn):
+        conn.execute(sqlalchemy.text('CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public'))
+        conn.execute(sqlalchemy.text(MediaMirror.create_table_sql()))
+        conn.execute(sqlalchemy.text(SpriteAtlas.create_table_sql()))
+        conn.execute(sqlalchemy.text(DatasetVersion.create_table_sql()))
+        for name, query, indexes in ReadModels.VIEWS:
+            #The view comment holds a digest of its definition so changed views get rebuilt
+            digest = hashlib.sha1((query + "".join(indexes)).encode()).hexdigest()
+            #Looked up in the schema being written only, a shadow load must not see the live view
+            current = conn.execute(
+                sqlalchemy.text("SELECT obj_description(to_regclass(quote_ident(current_schema()) || '.' || :name), 'pg_class')"), {'name': name}
+            ).scalar()
+            if current != digest:
+                conn.execute(sqlalchemy.text(f'DROP MATERIALIZED VIEW IF EXISTS {name} CASCADE'))
+                conn.execute(sqlalchemy.text(f'CREATE MATERIALIZED VIEW {name} AS {query}'))
+                conn.execute(sqlalchemy.text(f"COMMENT ON MATERIALIZED VIEW {name} IS '{digest}'"))
+            for index in indexes:
+                conn.execute(sqlalchemy.text(index))
+    
+    @staticmethod
+    def refresh(engine):
+        with engine.begin() as conn:
+            ReadModels.create(conn)
+            for name, _, _ in ReadModels.VIEWS:
+                conn.execute(sqlalchemy.text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {name}'))
+                conn.execute(sqlalchemy.text(f'ANALYZE {name}'))
+            #Stamped in the same transaction, so the version changes exactly when the views do
+            tables = [t for t in ReadModels.STAMPED_TABLES if conn.execute(sqlalchemy.text("SELECT to_regclass(:name)"), {'name': t}).scalar()]
+            version = DatasetVersion.stamp(conn, [name for name, _, _ in ReadModels.VIEWS] + tables)
+        if ReadModels.publish_version:
+            #The dataset file first, so the published validators never run ahead of it
+            with engine.connect() as conn:
+                DatasetSnapshot.write(conn)
+            DatasetVersion.publish(version)
+
 class ThreadPool(threading.Thread):
-    def __init__(self, print_coordinates = (0, 0), update_time:float = 0.2, fancy_print = False):
+    def __init__(self, print_coordinates = (0, 0), update_time:float = 0.2, fancy_print = False, mirror_media = False, sprite_atlas = False, graphql = False, profile = False):
         super().__init__()
         
+        self.mirror_media = mirror_media
+        self.sprite_atlas = sprite_atlas
+        self.profile = profile
+        
         self.threads = []
         
-        ability_fetch_thread = FetchThread("ability")
+        fetch_thread_class = GraphQLFetchThread if graphql else FetchThread
+        
+        ability_fetch_thread = fetch_thread_class("ability")
         self.threads.append(ability_fetch_thread)
         
         ability_process_thread = AbilityProcessThread(ability_fetch_thread)
         self.threads.append(ability_process_thread)
         
-        move_fetch_thread = FetchThread("move")
+        move_fetch_thread = fetch_thread_class("move")
         self.threads.append(move_fetch_thread)
         
         move_process_thread = MoveProcessThread(move_fetch_thread)
         self.threads.append(move_process_thread)
         
-        pokemon_fetch_thread = FetchThread("pokemon")
+        pokemon_fetch_thread = fetch_thread_class("pokemon")
         self.threads.append(pokemon_fetch_thread)
         
         pokemon_process_thread = PokemonProcessThread(pokemon_fetch_thread)
@@ -726,17 +1206,29 @@ class ThreadPool(threading.Thread):
         pokemon_move_process_thread = PokemonMoveProcessThread(pokemon_fetch_thread)
         self.threads.append(pokemon_move_process_thread)
         
-        pokemon_species_fetch_thread = FetchThread("pokemon-species")
+        learnset_process_thread = LearnsetProcessThread(pokemon_fetch_thread)
+        self.threads.append(learnset_process_thread)
+        
+        pokemon_species_fetch_thread = fetch_thread_class("pokemon-species")
         self.threads.append(pokemon_species_fetch_thread)
         
         pokemon_species_process_thread = PokemonSpeciesProcessThread(pokemon_species_fetch_thread)
         self.threads.append(pokemon_species_process_thread)
         
-        evolution_chain_fetch_thread = FetchThread("evolution-chain")
+        evolution_chain_fetch_thread = fetch_thread_class("evolution-chain")
         self.threads.append(evolution_chain_fetch_thread)
         
         evolution_chain_process_thread = EvolutionChainProcessThread(evolution_chain_fetch_thread)
         self.threads.append(evolution_chain_process_thread)
+        
+        evolution_closure_process_thread = EvolutionClosureProcessThread(evolution_chain_fetch_thread)
+        self.threads.append(evolution_closure_process_thread)
+        
+        type_fetch_thread = fetch_thread_class("type")
+        self.threads.append(type_fetch_thread)
+        
+        type_efficacy_process_thread = TypeEfficacyProcessThread(type_fetch_thread)
+        self.threads.append(type_efficacy_process_thread)
 
         ability_sql_thread = AbilitySQLThread(ability_process_thread)
         self.threads.append(ability_sql_thread)
@@ -753,27 +1245,37 @@ class ThreadPool(threading.Thread):
         pokemon_move_sql_thread = PokemonMoveSQLThread(pokemon_move_process_thread)
         self.threads.append(pokemon_move_sql_thread)
 
+        learnset_sql_thread = LearnsetSQLThread(learnset_process_thread)
+        self.threads.append(learnset_sql_thread)
+
         evolution_chain_sql_thread = EvolutionChainSQLThread(evolution_chain_process_thread)
         self.threads.append(evolution_chain_sql_thread)
+
+        evolution_closure_sql_thread = EvolutionClosureSQLThread(evolution_closure_process_thread)
+        self.threads.append(evolution_closure_sql_thread)
+
+        type_efficacy_sql_thread = TypeEfficacySQLThread(type_efficacy_process_thread)
+        self.threads.append(type_efficacy_sql_thread)
         
         self.print_x, self.print_y = print_coordinates
         
         self.update_time = update_time
         self.fancy_print = fancy_print
     
+    @staticmethod
+    def stage(thread) -> str:
+        if isinstance(thread, FetchThread):
+            return "Fetch"
+        if isinstance(thread, ProcessThread):
+            return "Process"
+        if isinstance(thread, SQLThread):
+            return "SQL"
+        return "Post"
+    
     def get_strings(self) -> list[str]:
         names = []
         for thread in self.threads:
-            string = ""
-            if isinstance(thread, FetchThread):
-                string += "Fetch "
-            if isinstance(thread, ProcessThread):
-                string += "Process "
-            if isinstance(thread, SQLThread):
-                string += "SQL "
-            
-            string += f'Thread {thread.name}'
-            names.append(string)
+            names.append(f'{ThreadPool.stage(thread)} Thread {thread.name}')
         
         output = []
         
@@ -811,8 +1313,14 @@ class ThreadPool(threading.Thread):
         print(f"\033[{y};{x}H{string}")
     
     def run(self):
+        profiler = StageProfiler() if self.profile else None
+        if profiler:
+            profiler.start()
+        
         for thread in self.threads:
             thread.start()
+            if profiler:
+                profiler.watch(thread, ThreadPool.stage(thread), thread.name)
         
         while not self.has_finished:
             strings = self.get_strings()
@@ -831,10 +1339,75 @@ class ThreadPool(threading.Thread):
                     print(string)
             time.sleep(self.update_time)
         for i in self.threads:
+            i.join()
             if isinstance(i, SQLThread):
                 i.commit()
+            #Idents of finished threads are reused, by the post-ingest executors among others
+            if profiler:
+                profiler.unwatch(i)
+        
+        #Post-ingest steps run on this thread
+        if profiler:
+            profiler.watch(self, ThreadPool.stage(self), "post-ingest")
+        
+        if self.mirror_media:
+            MediaMirror(SQLEngine.get()).run()
+        if self.sprite_atlas:
+            SpriteAtlas(SQLEngine.get()).run()
+        
+        print("Refreshing read models...")
+        ReadModels.refresh(SQLEngine.get())
+        
+        if profiler:
+            profiler.stop()
+            profiler.write()
 
-pool = ThreadPool(update_time=1, fancy_print=True)
-pool.start()
-pool.join()
-print("Done")
\ No newline at end of file
+#The cluster python/Assemble.py manages, when the loader runs on the same host
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python", "Database")
+
+def switch_profile(profile:str):
+    if not os.path.isfile(os.path.join(DATABASE_DIR, "postgresql.conf")):
+        print(f"No local cluster in {DATABASE_DIR}, keeping the server's configuration")
+        return
+    sys.path.insert(0, os.path.dirname(DATABASE_DIR))
+    import Assemble
+    Assemble.Tuning.switch(profile, DATABASE_DIR)
+
+if __name__ == "__main__":
+    #Load into a shadow schema and swap it in once validated, the site keeps serving the old data meanwhile
+    swap = SchemaSwap(SQLEngine.get()) if "--blue-green" in sys.argv else None
+    if swap:
+        swap.prepare()
+        SQLEngine.use_schema(SHADOW)
+        ReadModels.publish_version = False
+    
+    pool = ThreadPool(
+        update_time=1,
+        fancy_print=True,
+        mirror_media="--mirror-media" in sys.argv,
+        sprite_atlas="--sprite-atlas" in sys.argv,
+        graphql="--graphql" in sys.argv,
+        profile="--profile" in sys.argv
+    )
+    #Bulk-load settings (rare checkpoints, asynchronous commit, big maintenance memory) for the
+    #duration of the load, then back to serving; both are reloads, no restart
+    bulk_profile = "--bulk-profile" in sys.argv
+    if bulk_profile:
+        switch_profile("bulk-load")
+    try:
+        pool.start()
+        pool.join()
+    finally:
+        if bulk_profile:
+            switch_profile("serve")
+    
+    if swap:
+        SQLEngine.use_schema(None)
+        SchemaSwap(SQLEngine.get()).run()
+    
+    #Columnar copy of the live tables for analytics, see columnar_export.py
+    if "--export-parquet" in sys.argv:
+        from columnar_export import ColumnarExport
+        ColumnarExport(SQLEngine.get()).run()
+    
+    print("Done")
\ No newline at end of file
@@ -0,0 +1,329 @@
+# Alternative fetch source: pages through PokeAPI's GraphQL endpoint, asking
+# only for the fields the process threads map, and reshapes every record into
+# the REST document those threads already understand.
+#
+# Usage:
+#   python3 db_init.py --graphql                    (POKEAPI_GRAPHQL_URL overrides the endpoint)
+#   python3 graphql_source.py record <dir>          store the live responses in <dir>
+#   python3 graphql_source.py serve <dir> [port]    replay them as a local stand-in
+import os
+import sys
+import json
+import hashlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+GRAPHQL_URL = os.environ.get("POKEAPI_GRAPHQL_URL", "https://beta.pokeapi.co/graphql/v1beta")
+REST_URL = "https://pokeapi.co/api/v2"
+SPRITES_URL = "https://raw.githubusercontent.com/PokeAPI/sprites/master/"
+
+EN = {'name': 'en'}
+ONLY_EN = 'where: {pokemon_v2_language: {name: {_eq: "en"}}}'
+LATEST_EN = ONLY_EN + ', order_by: {id: desc}, limit: 1'
+
+def ref(kind:str, id:int|None, name:str|None = None) -> dict|None:
+    #REST style {name, url} reference; Data.get_url_index reads the id back from the url
+    if id is None:
+        return None
+    return {'name': name, 'url': f"{REST_URL}/{kind}/{id}/"}
+
+def named(node:dict|None) -> dict|None:
+    return {'name': node['name']} if node else None
+
+def english(entries:list[dict]) -> list[dict]:
+    return [dict(entry, language=EN) for entry in entries]
+
+def json_field(value):
+    #jsonb columns come back either decoded or as a string depending on the server version
+    return json.loads(value) if isinstance(value, str) else (value or {})
+
+def sprite_url(value:str|None) -> str|None:
+    if value and value.startswith("/media/"):
+        return SPRITES_URL + value[len("/media/"):]
+    return value
+
+def ability(row:dict) -> dict:
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'generation': ref('generation', row['generation_id']),
+        'effect_entries': english(row['effects']),
+        'flavor_text_entries': english(row['flavor']),
+        'names': english(row['names'])
+    }
+
+def move(row:dict) -> dict:
+    meta = row['meta'][0] if row['meta'] else None
+    if meta is not None:
+        meta = dict(meta, ailment=named(meta['ailment']))
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'accuracy': row['accuracy'],
+        'power': row['power'],
+        'pp': row['pp'],
+        'priority': row['priority'],
+        'effect_chance': row['effect_chance'],
+        'generation': ref('generation', row['generation_id']),
+        'damage_class': named(row['damage_class']),
+        'target': named(row['target']),
+        'type': named(row['type']),
+        'meta': meta,
+        'names': english(row['names']),
+        'flavor_text_entries': english(row['flavor'])
+    }
+
+def pokemon_species(row:dict) -> dict:
+    species = {key: row[key] for key in [
+        'id', 'name', 'base_happiness', 'capture_rate', 'gender_rate', 'hatch_counter',
+        'order', 'is_baby', 'is_legendary', 'is_mythical'
+    ]}
+    species.update({
+        'generation': ref('generation', row['generation_id']),
+        'color': named(row['color']),
+        'growth_rate': named(row['growth_rate']),
+        'habitat': named(row['habitat']),
+        'shape': named(row['shape']),
+        'egg_groups': [named(group['egg_group']) for group in row['egg_groups']],
+        'names': english({'name': n['name']} for n in row['names']),
+        'genera': english({'genus': n['genus']} for n in row['names']),
+        'pokedex_numbers': [{'pokedex': {'name': 'national'}, 'entry_number': d['pokedex_number']} for d in row['dex']],
+        'varieties': [{'pokemon': ref('pokemon', v['id'])} for v in row['varieties']],
+        'flavor_text_entries': english(row['flavor'])
+    })
+    return species
+
+def pokemon(row:dict) -> dict:
+    sprites = json_field(row['sprites'][0]['sprites']) if row['sprites'] else {}
+    cries = json_field(row['cries'][0]['cries']) if row['cries'] else {}
+
+    moves = OrderedDict()
+    for entry in row['moves']:
+        moves.setdefault(entry['move_id'], []).append({
+            'level_learned_at': entry['level'],
+            'move_learn_method': ref('move-learn-method', entry['learn_method']['id'], entry['learn_method']['name']),
+            'version_group': ref('version-group', entry['version_group']['id'], entry['version_group']['name'])
+        })
+
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'base_experience': row['base_experience'],
+        'height': row['height'],
+        'weight': row['weight'],
+        'order': row['order'],
+        'species': ref('pokemon-species', row['pokemon_species_id']),
+        'abilities': [{'ability': ref('ability', a['ability_id']), 'slot': a['slot']} for a in row['abilities']],
+        'stats': [{'stat': named(s['stat']), 'base_stat': s['base_stat'], 'effort': s['effort']} for s in row['stats']],
+        'types': [{'type': named(t['type'])} for t in row['types']],
+        'sprites': {
+            f"{side}_{kind}": sprite_url(sprites.get(f"{side}_{kind}"))
+            for side in ['front', 'back'] for kind in ['default', 'female', 'shiny_female', 'shiny']
+        },
+        'cries': {'latest': cries.get('latest'), 'legacy': cries.get('legacy')},
+        'moves': [{'move': ref('move', m), 'version_group_details': details} for m, details in moves.items()]
+    }
+
+def evolution_details(evolution:dict) -> dict:
+    return {
+        'item': named(evolution['item']),
+        'held_item': named(evolution['held_item']),
+        'known_move': ref('move', evolution['known_move_id'], evolution['known_move']['name'] if evolution['known_move'] else None),
+        'known_move_type': named(evolution['known_move_type']),
+        'trigger': named(evolution['trigger']),
+        'party_species': ref('pokemon-species', evolution['party_species_id']),
+        'party_type': named(evolution['party_type']),
+        'trade_species': ref('pokemon-species', evolution['trade_species_id']),
+        'gender': evolution['gender_id'],
+        **{key: evolution[key] for key in [
+            'min_beauty', 'min_happiness', 'min_level', 'needs_overworld_rain',
+            'time_of_day', 'turn_upside_down', 'relative_physical_stats'
+        ]}
+    }
+
+def evolution_chain(row:dict) -> dict:
+    #GraphQL returns the chain's species flat with a parent pointer; rebuild the REST tree
+    nodes = OrderedDict()
+    for species in row['species']:
+        nodes[species['id']] = {
+            'species': ref('pokemon-species', species['id'], species['name']),
+            'evolution_details': [evolution_details(e) for e in species['evolutions']],
+            'evolves_to': []
+        }
+    root = None
+    for species in row['species']:
+        parent = species['evolves_from_species_id']
+        if parent in nodes:
+            nodes[parent]['evolves_to'].append(nodes[species['id']])
+        elif root is None:
+            root = nodes[species['id']]
+    return {'id': row['id'], 'chain': root}
+
+def type_relations(row:dict) -> dict:
+    #Only the offensive side, keyed by the REST damage_relations lists; neutral pairs are omitted there too
+    relations = {'double_damage_to': [], 'half_damage_to': [], 'no_damage_to': []}
+    lists = {200: 'double_damage_to', 50: 'half_damage_to', 0: 'no_damage_to'}
+    for efficacy in row['efficacies']:
+        if efficacy['damage_factor'] in lists:
+            relations[lists[efficacy['damage_factor']]].append(named(efficacy['target']))
+    return {'id': row['id'], 'name': row['name'], 'damage_relations': relations}
+
+EVOLUTION_FIELDS = """
+    min_level min_happiness min_beauty gender_id time_of_day needs_overworld_rain
+    turn_upside_down relative_physical_stats known_move_id party_species_id trade_species_id
+    item: pokemon_v2_item { name }
+    held_item: pokemon_v2_itemByHeldItemId { name }
+    known_move: pokemon_v2_move { name }
+    known_move_type: pokemon_v2_type { name }
+    party_type: pokemon_v2_typeByPartyTypeId { name }
+    trigger: pokemon_v2_evolutiontrigger { name }
+"""
+
+#name: (root field, page size, selection, adapter)
+ENTITIES = {
+    'ability': ('pokemon_v2_ability', 500, f"""
+        id name generation_id
+        effects: pokemon_v2_abilityeffecttexts({ONLY_EN}) {{ effect short_effect }}
+        flavor: pokemon_v2_abilityflavortexts({LATEST_EN}) {{ flavor_text }}
+        names: pokemon_v2_abilitynames({ONLY_EN}) {{ name }}
+    """, ability),
+    'move': ('pokemon_v2_move', 500, f"""
+        id name accuracy power pp priority generation_id
+        effect_chance: move_effect_chance
+        damage_class: pokemon_v2_movedamageclass {{ name }}
+        target: pokemon_v2_movetarget {{ name }}
+        type: pokemon_v2_type {{ name }}
+        meta: pokemon_v2_movemeta {{
+            ailment: pokemon_v2_movemetaailment {{ name }}
+            ailment_chance crit_rate drain flinch_chance healing
+            max_hits max_turns min_hits min_turns stat_chance
+        }}
+        names: pokemon_v2_movenames({ONLY_EN}) {{ name }}
+        flavor: pokemon_v2_moveflavortexts({LATEST_EN}) {{ flavor_text }}
+    """, move),
+    'pokemon-species': ('pokemon_v2_pokemonspecies', 500, f"""
+        id name base_happiness capture_rate gender_rate hatch_counter order
+        is_baby is_legendary is_mythical generation_id
+        color: pokemon_v2_pokemoncolor {{ name }}
+        growth_rate: pokemon_v2_growthrate {{ name }}
+        habitat: pokemon_v2_pokemonhabitat {{ name }}
+        shape: pokemon_v2_pokemonshape {{ name }}
+        egg_groups: pokemon_v2_pokemonegggroups {{ egg_group: pokemon_v2_egggroup {{ name }} }}
+        names: pokemon_v2_pokemonspeciesnames({ONLY_EN}) {{ name genus }}
+        dex: pokemon_v2_pokemondexnumbers(where: {{pokemon_v2_pokedex: {{name: {{_eq: "national"}}}}}}) {{ pokedex_number }}
+        varieties: pokemon_v2_pokemons {{ id }}
+        flavor: pokemon_v2_pokemonspeciesflavortexts({LATEST_EN}) {{ flavor_text }}
+    """, pokemon_species),
+    #Learnsets make pokemon records large, so their pages are smaller
+    'pokemon': ('pokemon_v2_pokemon', 50, """
+        id name base_experience height weight order pokemon_species_id
+        abilities: pokemon_v2_pokemonabilities { ability_id slot }
+        stats: pokemon_v2_pokemonstats { base_stat effort stat: pokemon_v2_stat { name } }
+        types: pokemon_v2_pokemontypes(order_by: {slot: asc}) { type: pokemon_v2_type { name } }
+        sprites: pokemon_v2_pokemonsprites { sprites }
+        cries: pokemon_v2_pokemoncries { cries }
+        moves: pokemon_v2_pokemonmoves {
+            move_id level
+            learn_method: pokemon_v2_movelearnmethod { id name }
+            version_group: pokemon_v2_versiongroup { id name }
+        }
+    """, pokemon),
+    'evolution-chain': ('pokemon_v2_evolutionchain', 200, f"""
+        id
+        species: pokemon_v2_pokemonspecies(order_by: {{order: asc}}) {{
+            id name evolves_from_species_id
+            evolutions: pokemon_v2_pokemonevolutions {{ {EVOLUTION_FIELDS} }}
+        }}
+    """, evolution_chain),
+    'type': ('pokemon_v2_type', 100, """
+        id name
+        efficacies: pokemon_v2_typeefficacies { damage_factor target: pokemon_v2_typeByTargetTypeId { name } }
+    """, type_relations)
+}
+
+def recording_key(payload:dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class GraphQLSource:
+    def __init__(self, url:str = GRAPHQL_URL, record_dir:str|None = None):
+        self.url = url
+        self.record_dir = record_dir
+        self.session = requests.Session()
+
+    def execute(self, query:str, variables:dict|None = None) -> dict:
+        payload = {'query': query, 'variables': variables or {}}
+        response = self.session.post(self.url, json=payload, timeout=120)
+        response.raise_for_status()
+        body = response.json()
+        if body.get('errors'):
+            raise RuntimeError(body['errors'])
+
+        if self.record_dir is not None:
+            os.makedirs(self.record_dir, exist_ok=True)
+            with open(os.path.join(self.record_dir, recording_key(payload) + ".json"), "w") as f:
+                json.dump(body, f)
+
+        return body['data']
+
+    def count(self, name:str) -> int:
+        root = ENTITIES[name][0]
+        data = self.execute(f"query Count {{ total: {root}_aggregate {{ aggregate {{ count }} }} }}")
+        return data['total']['aggregate']['count']
+
+    def records(self, name:str):
+        root, page_size, selection, adapter = ENTITIES[name]
+        query = f"""
+            query Page($limit: Int!, $offset: Int!) {{
+                rows: {root}(limit: $limit, offset: $offset, order_by: {{id: asc}}) {{ {selection} }}
+            }}
+        """
+        offset = 0
+        while True:
+            rows = self.execute(query, {'limit': page_size, 'offset': offset})['rows']
+            for row in rows:
+                yield adapter(row)
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
+def record(directory:str):
+    source = GraphQLSource(record_dir=directory)
+    for name in ENTITIES:
+        print(f"Recording {source.count(name)} {name} records...")
+        for _ in source.records(name):
+            pass
+    print(f"Responses recorded in {directory}")
+
+def serve(directory:str, port:int = 8088):
+    class RecordedResponses(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            path = os.path.join(directory, recording_key(payload) + ".json")
+            if os.path.isfile(path):
+                status = 200
+                with open(path, "rb") as f:
+                    body = f.read()
+            else:
+                status = 404
+                body = json.dumps({'errors': [{'message': 'no recorded response for this query'}]}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("localhost", port), RecordedResponses)
+    print(f"Serving recorded GraphQL responses from {directory} at http://localhost:{port}/")
+    print(f"Run the loader with POKEAPI_GRAPHQL_URL=http://localhost:{port}/ python3 db_init.py --graphql")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "record" and len(sys.argv) > 2:
+        record(sys.argv[2])
+    elif command == "serve" and len(sys.argv) > 2:
+        serve(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 8088)
+    else:
+        print("Usage: graphql_source.py record <dir> | serve <dir> [port]")
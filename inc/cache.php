@@ -0,0 +1,81 @@
+<?php
+// HTTP cache validators derived from the dataset version the loader stamps
+// (see dataset_version.py). The data only changes when an ingest runs, so a
+// client that already holds the current version gets a 304 without the
+// database being queried, or even connected to.
+
+function datasetVersion($conn = null) {
+    // Published by the loader next to this file on every refresh or promotion
+    $versionFile = __DIR__ . "/dataset_version.json";
+    if (is_file($versionFile)) {
+        $version = json_decode(file_get_contents($versionFile), true);
+        if (isset($version["content_hash"], $version["loaded_at"])) {
+            return $version;
+        }
+    }
+
+    // No published file (e.g. another host serves the API): ask the database
+    if ($conn === null) {
+        return null;
+    }
+    // A database filled without the loader has no dataset_version table: unversioned
+    $result = queryParams($conn, "SELECT content_hash, extract(epoch FROM loaded_at)::bigint AS loaded_at
+        FROM dataset_version ORDER BY confirmed_at DESC LIMIT 1", []);
+    if (!$result || pg_num_rows($result) === 0) {
+        return null;
+    }
+    $row = pg_fetch_assoc($result);
+    return ["content_hash" => $row["content_hash"], "loaded_at" => (int)$row["loaded_at"]];
+}
+
+function etagMatches($header, $etag) {
+    // If-None-Match is a list of (possibly weak) tags, or "*"; comparison is weak
+    foreach (explode(",", $header) as $candidate) {
+        $candidate = trim($candidate);
+        if ($candidate === "*") {
+            return true;
+        }
+        if (strncmp($candidate, "W/", 2) === 0) {
+            $candidate = substr($candidate, 2);
+        }
+        if ($candidate === $etag) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// Sends ETag, Last-Modified and Cache-Control for $version; $variant tells
+// representations of the same data apart (e.g. the response format). Returns
+// true when the request's validators still match, after answering it with 304.
+function sendValidators($version, $variant = "") {
+    if ($version === null) {
+        // Unversioned data may change under the client at any time
+        header("Cache-Control: no-cache");
+        return false;
+    }
+
+    $etag = "\"" . substr($version["content_hash"], 0, 32) . ($variant !== "" ? "-" . $variant : "") . "\"";
+    $lastModified = gmdate("D, d M Y H:i:s", $version["loaded_at"]) . " GMT";
+
+    // Cacheable by browsers and proxies, but revalidated on every use
+    header("Cache-Control: public, no-cache");
+    header("ETag: " . $etag);
+    header("Last-Modified: " . $lastModified);
+
+    // If-None-Match takes precedence; If-Modified-Since only counts without it
+    if (isset($_SERVER["HTTP_IF_NONE_MATCH"])) {
+        $notModified = etagMatches($_SERVER["HTTP_IF_NONE_MATCH"], $etag);
+    } elseif (isset($_SERVER["HTTP_IF_MODIFIED_SINCE"])) {
+        $since = strtotime($_SERVER["HTTP_IF_MODIFIED_SINCE"]);
+        $notModified = $since !== false && $version["loaded_at"] <= $since;
+    } else {
+        $notModified = false;
+    }
+
+    if ($notModified) {
+        http_response_code(304);
+    }
+    return $notModified;
+}
+?>
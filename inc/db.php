@@ -1,20 +1,90 @@
 <?php
 // This file provides a reusable function to connect to the PostgreSQL database.
 // Include this file in any PHP script that needs database access.
+//
+// Reads can be served by the local streaming replicas that Assemble.py
+// provisions ("python3 Assemble.py replicas N"); it lists them in
+// replicas.json next to this file. Writes always go to the primary.
 
-function connectDB() {
-    // Database connection parameters
-    $host = "localhost";
-    $port = "5432";
+function openConnection($host, $port) {
     $dbname = "pokemondb";
     $user = "postgres"; // Default PostgreSQL user; change if needed
     $password = "";     // Leave empty if no password is set
 
-    // Build connection string
-    $connStr = "host=$host port=$port dbname=$dbname user=$user password=$password";
+    // Build connection string; a dead replica should cost a second, not a page load
+    $connStr = "host=$host port=$port dbname=$dbname user=$user password=$password connect_timeout=1";
+
+    return @pg_connect($connStr, PGSQL_CONNECT_FORCE_NEW);
+}
+
+function replicaLag($conn) {
+    // A standby that has replayed everything it received is current, however
+    // old its last replayed transaction is (the primary may simply be idle).
+    // That only holds while it is still receiving: a disconnected standby has
+    // both positions frozen, so without a streaming WAL receiver the lag is
+    // unknown (NULL) and the standby is skipped.
+    $result = pg_query($conn, "SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END AS lag");
+    if (!$result) {
+        return INF;
+    }
+    $lag = pg_fetch_result($result, 0, "lag");
+    return $lag === null ? INF : (float)$lag;
+}
+
+// SQLSTATE of a query on a table or view that does not exist
+const UNDEFINED_TABLE = "42P01";
+
+// pg_query_params that also reports the SQLSTATE of a failure, so a caller
+// can fall back when a relation is missing instead of checking for it first
+function queryParams($conn, $sql, $params, &$sqlState = null) {
+    $sqlState = null;
+    if (!pg_send_query_params($conn, $sql, $params)) {
+        return false;
+    }
+    $result = pg_get_result($conn);
+    while (pg_get_result($conn) !== false) {
+    }
+    if (!$result || pg_result_status($result) === PGSQL_FATAL_ERROR) {
+        $sqlState = $result ? pg_result_error_field($result, PGSQL_DIAG_SQLSTATE) : null;
+        return false;
+    }
+    return $result;
+}
+
+function connectDB($intent = "write") {
+    // Database connection parameters
+    $config = ["primary" => ["host" => "localhost", "port" => 5432], "replicas" => [], "max_lag_seconds" => 5];
+    $configFile = __DIR__ . "/replicas.json";
+    if (is_file($configFile)) {
+        $config = array_merge($config, json_decode(file_get_contents($configFile), true) ?: []);
+    }
+
+    // Reads try the replicas in random order, skipping unreachable or lagging ones
+    if ($intent === "read" && !empty($config["replicas"])) {
+        $replicas = $config["replicas"];
+        shuffle($replicas);
+        foreach ($replicas as $replica) {
+            $conn = openConnection($replica["host"], $replica["port"]);
+            if (!$conn) {
+                continue;
+            }
+            if (replicaLag($conn) <= $config["max_lag_seconds"]) {
+                if (!headers_sent()) {
+                    header("X-Database: replica:" . $replica["port"]);
+                }
+                return $conn;
+            }
+            pg_close($conn);
+        }
+    }
 
     // Attempt to connect
-    $conn = pg_connect($connStr);
+    $conn = openConnection($config["primary"]["host"], $config["primary"]["port"]);
 
     // Check for connection error
     if (!$conn) {
@@ -23,7 +93,10 @@ function connectDB() {
         die("<error>Database connection failed.</error>");
     }
 
+    if (!headers_sent()) {
+        header("X-Database: primary");
+    }
     // Return the open connection
     return $conn;
 }
-?>
\ No newline at end of file
+?>
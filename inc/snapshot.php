@@ -0,0 +1,75 @@
+<?php
+// Read access to the dataset file the loader writes next to this file
+// (dataset_snapshot.py). It holds the same list cards and detail rows as the
+// read models, so a read node can serve without a database. The file is
+// opened read-only and memory-mapped: the pages live in the OS page cache,
+// shared by every PHP worker, and opening it costs a few syscalls.
+//
+// Serving from the file is opt-in, for read nodes without a database: set
+// SERVE_DATASET_FILE=1 in the PHP environment. Elsewhere the file is ignored,
+// so a host with a database keeps reading it (and its replicas) directly.
+
+function openSnapshot() {
+    $path = __DIR__ . "/dataset.sqlite";
+    if (getenv("SERVE_DATASET_FILE") !== "1" || !is_file($path) || !class_exists("SQLite3")) {
+        return null;
+    }
+    try {
+        $db = new SQLite3($path, SQLITE3_OPEN_READONLY);
+    } catch (Exception $e) {
+        return null;
+    }
+    $db->exec("PRAGMA mmap_size = 268435456");
+    // A file written by a different loader version is ignored rather than misread
+    if ((int)$db->querySingle("PRAGMA user_version") !== 1) {
+        $db->close();
+        return null;
+    }
+    return $db;
+}
+
+function snapshotVersion($db) {
+    $hash = $db->querySingle("SELECT value FROM meta WHERE key = 'content_hash'");
+    $loadedAt = $db->querySingle("SELECT value FROM meta WHERE key = 'loaded_at'");
+    return $hash ? ["content_hash" => $hash, "loaded_at" => (int)$loadedAt] : null;
+}
+
+// Same rows and order as the list query on pokemon_list_card
+function snapshotRows($db, $searchName, $isRandom) {
+    if ($isRandom) {
+        // rowid is the position in display order, so a random pick is one lookup
+        $count = (int)$db->querySingle("SELECT value FROM meta WHERE key = 'count'");
+        if ($count === 0) {
+            return;
+        }
+        $stmt = $db->prepare("SELECT * FROM pokemon_list WHERE rowid = :position");
+        $stmt->bindValue(":position", random_int(1, $count), SQLITE3_INTEGER);
+    } elseif ($searchName !== null && $searchName !== "") {
+        // Substring match, as on Postgres; a scan of the narrow list table
+        $stmt = $db->prepare("SELECT * FROM pokemon_list WHERE name_lower LIKE :pattern ORDER BY rowid");
+        $stmt->bindValue(":pattern", "%" . strtolower($searchName) . "%", SQLITE3_TEXT);
+    } else {
+        $stmt = $db->prepare("SELECT * FROM pokemon_list ORDER BY rowid");
+    }
+    $result = $stmt->execute();
+    while ($row = $result->fetchArray(SQLITE3_ASSOC)) {
+        yield $row;
+    }
+}
+
+// One pokemon_detail row by id, or by exact name through the name index
+function snapshotDetail($db, $id, $name) {
+    if ($id !== null) {
+        $stmt = $db->prepare("SELECT * FROM pokemon_detail WHERE id = :id");
+        $stmt->bindValue(":id", $id, SQLITE3_INTEGER);
+    } else {
+        $stmt = $db->prepare("SELECT * FROM pokemon_detail WHERE name_lower = :name");
+        $stmt->bindValue(":name", strtolower($name), SQLITE3_TEXT);
+    }
+    $row = $stmt->execute()->fetchArray(SQLITE3_ASSOC);
+    if ($row) {
+        unset($row['name_lower']);
+    }
+    return $row ?: null;
+}
+?>
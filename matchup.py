@@ -0,0 +1,212 @@
+# Type matchup and damage engine. Loads base stats, learnsets and the type
+# efficacy table into NumPy arrays and computes, for every attacker/defender
+# pair at once, the expected damage of the attacker's best move as a share of
+# the defender's HP. Counter queries rank Pokémon by how hard they hit a target
+# against how hard it hits them back. The matrix is cached under cache/ per
+# dataset version (see dataset_version.py), so it is rebuilt only after the
+# data changed.
+#
+# Usage:
+#   python3 matchup.py build                          compute the matrix for the current data
+#   python3 matchup.py counters <pokemon> [k]         the k best counters to a Pokémon (name or id)
+#   python3 matchup.py damage <attacker> <defender>
+import os
+import sys
+import time
+import subprocess
+
+import sqlalchemy
+
+try:
+    import numpy as np
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy"])
+    import numpy as np
+
+from dataset_version import DatasetVersion
+
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+#Damage is computed at level 50 with perfect IVs, no EVs and neutral natures
+LEVEL = 50
+IV = 31
+STAB = 1.5
+#Mean of the 0.85-1.00 damage roll
+ROLL = 0.925
+#Defenders taking less than this share per hit count as walls; keeps counter scores finite
+MIN_TAKEN = 0.01
+
+CLASSES = ['physical', 'special']
+
+def stat(base:np.ndarray) -> np.ndarray:
+    return (2 * base + IV) * LEVEL // 100 + 5
+
+def hp_stat(base:np.ndarray) -> np.ndarray:
+    return (2 * base + IV) * LEVEL // 100 + LEVEL + 10
+
+class Matchup:
+    def __init__(self, ids:np.ndarray, names:np.ndarray, damage:np.ndarray, move:np.ndarray, move_ids:np.ndarray, move_names:np.ndarray):
+        self.ids = ids
+        self.names = names
+        #damage[a, d]: share of d's HP taken by a's best move, move[a, d]: that move's id (0: none)
+        self.damage = damage
+        self.move = move
+        self.move_names = dict(zip(move_ids.tolist(), move_names.tolist()))
+        self._index = {int(id): i for i, id in enumerate(ids)}
+        self._names = {name.lower(): i for i, name in enumerate(names.tolist())}
+
+    @staticmethod
+    def cache_path(version:dict) -> str:
+        return os.path.join(CACHE_ROOT, f"matchup-{version['content_hash'][:16]}.npz")
+
+    @staticmethod
+    def get(engine, batch_size:int = 64) -> 'Matchup':
+        #The cached matrix of the current dataset version, computed on a miss
+        with engine.connect() as conn:
+            version = DatasetVersion.current(conn)
+            path = Matchup.cache_path(version) if version else None
+            if path and os.path.isfile(path):
+                with np.load(path) as f:
+                    return Matchup(f['ids'], f['names'], f['damage'], f['move'], f['move_ids'], f['move_names'])
+            matchup = Matchup.compute(conn, batch_size)
+
+        if path is None:
+            print("No dataset version stamped yet, the matrix is not cached")
+            return matchup
+        os.makedirs(CACHE_ROOT, exist_ok=True)
+        #Written aside and renamed so a concurrent reader never loads half a file
+        temporary = path + ".tmp.npz"
+        np.savez(temporary, ids=matchup.ids, names=matchup.names, damage=matchup.damage, move=matchup.move,
+            move_ids=np.array(list(matchup.move_names.keys()), dtype=np.int32),
+            move_names=np.array(list(matchup.move_names.values())))
+        os.replace(temporary, path)
+        for name in os.listdir(CACHE_ROOT):
+            if name.startswith("matchup-") and os.path.join(CACHE_ROOT, name) != path:
+                os.remove(os.path.join(CACHE_ROOT, name))
+        return matchup
+
+    @staticmethod
+    def compute(conn, batch_size:int = 64) -> 'Matchup':
+        started = time.perf_counter()
+        pokemon = conn.execute(sqlalchemy.text("""
+            SELECT id, name, primary_type, secondary_type, hp, attack, defense, special_attack, special_defense
+            FROM pokemon ORDER BY id
+        """)).all()
+        moves = conn.execute(sqlalchemy.text("""
+            SELECT id, name, type, damage_class, power FROM move
+            WHERE power > 0 AND damage_class IN ('physical', 'special') ORDER BY id
+        """)).all()
+        learned = conn.execute(sqlalchemy.text("SELECT DISTINCT pokemon, move FROM pokemon_move")).all()
+        efficacy = conn.execute(sqlalchemy.text("SELECT attacking_type, defending_type, factor FROM type_efficacy")).all()
+
+        types = sorted({t for row in pokemon for t in row[2:4] if t} | {row[2] for row in moves} | {t for row in efficacy for t in row[:2]})
+        type_index = {t: i for i, t in enumerate(types)}
+        T, P = len(types), len(pokemon)
+
+        #Efficacy of each attacking type against each defender: the product over its one or two types.
+        #Column T is the missing second type, neutral to everything.
+        chart = np.ones((T, T + 1), dtype=np.float32)
+        for attacking, defending, factor in efficacy:
+            chart[type_index[attacking], type_index[defending]] = factor
+        first = np.array([type_index[row[2]] if row[2] else T for row in pokemon])
+        second = np.array([type_index[row[3]] if row[3] else T for row in pokemon])
+        effectiveness = chart[:, first] * chart[:, second]  #(T, P)
+
+        base = np.array([row[4:9] for row in pokemon], dtype=np.float32)
+        hp = hp_stat(base[:, 0])
+        attack = np.stack([stat(base[:, 1]), stat(base[:, 3])], axis=1)   #(P, class)
+        defense = np.stack([stat(base[:, 2]), stat(base[:, 4])], axis=1)  #(P, class)
+
+        #Only the strongest move of each type and class can be an attacker's best move against anyone,
+        #so a learnset reduces to power[a, type, class] and the move that has it
+        pokemon_index = {row[0]: i for i, row in enumerate(pokemon)}
+        move_rows = {row[0]: row for row in moves}
+        power = np.zeros((P, T, 2), dtype=np.float32)
+        best_move = np.zeros((P, T, 2), dtype=np.int32)
+        for pokemon_id, move_id in learned:
+            if pokemon_id not in pokemon_index or move_id not in move_rows:
+                continue
+            _, _, move_type, damage_class, move_power = move_rows[move_id]
+            slot = (pokemon_index[pokemon_id], type_index[move_type], CLASSES.index(damage_class))
+            if move_power > power[slot]:
+                power[slot] = move_power
+                best_move[slot] = move_id
+
+        stab = np.ones((P, T), dtype=np.float32)
+        own = first < T
+        stab[np.arange(P)[own], first[own]] = STAB
+        own = second < T
+        stab[np.arange(P)[own], second[own]] = STAB
+
+        damage = np.zeros((P, P), dtype=np.float32)
+        move = np.zeros((P, P), dtype=np.int32)
+        level_factor = (2 * LEVEL / 5 + 2) / 50
+        for start in range(0, P, batch_size):
+            batch = slice(start, min(start + batch_size, P))
+            #(B, T, class, P): damage of the best move of each type and class against every defender
+            ratio = (power[batch] * attack[batch][:, None, :])[..., None] / defense.T[None, None, :, :]
+            hit = (level_factor * ratio + 2) * stab[batch][:, :, None, None] * effectiveness[None, :, None, :] * ROLL
+            hit = np.where(power[batch][..., None] > 0, hit, 0)
+            hit = hit.reshape(hit.shape[0], T * 2, P)
+            best = hit.argmax(axis=1)  #(B, P)
+            damage[batch] = np.take_along_axis(hit, best[:, None, :], axis=1)[:, 0, :] / hp[None, :]
+            move[batch] = np.take_along_axis(best_move[batch].reshape(-1, T * 2), best, axis=1)
+
+        print(f"Computed the {P}x{P} damage matrix in {time.perf_counter() - started:.2f} s")
+        return Matchup(
+            np.array([row[0] for row in pokemon], dtype=np.int32), np.array([row[1] for row in pokemon]),
+            damage, move, np.array([row[0] for row in moves], dtype=np.int32), np.array([row[1] for row in moves])
+        )
+
+    def find(self, pokemon:str) -> int:
+        index = self._index.get(int(pokemon)) if pokemon.isdigit() else self._names.get(pokemon.lower())
+        if index is None:
+            raise KeyError(f"unknown Pokémon {pokemon}")
+        return index
+
+    def counters(self, target:int, k:int = 10) -> list[dict]:
+        #Share of the target's HP each Pokémon takes per hit, against the share it loses to the target's reply
+        dealt = self.damage[:, target]
+        taken = self.damage[target, :]
+        score = dealt / np.maximum(taken, MIN_TAKEN)
+        score[target] = -1
+        k = min(k, len(score) - 1)
+        top = np.argpartition(-score, k)[:k]
+        top = top[np.argsort(-score[top])]
+        return [{
+            'id': int(self.ids[i]),
+            'name': str(self.names[i]),
+            'score': float(score[i]),
+            'dealt': float(dealt[i]),
+            'move': self.move_names.get(int(self.move[i, target])),
+            'taken': float(taken[i]),
+            'reply': self.move_names.get(int(self.move[target, i]))
+        } for i in top]
+
+    def all_counters(self, k:int = 10) -> np.ndarray:
+        #(P, k) indexes of every Pokémon's k best counters, in one pass over the matrix
+        score = self.damage.T / np.maximum(self.damage, MIN_TAKEN)
+        np.fill_diagonal(score, -1)
+        k = min(k, len(score) - 1)
+        top = np.argpartition(-score, k, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(score, top, axis=1), axis=1)
+        return np.take_along_axis(top, order, axis=1)
+
+if __name__ == "__main__":
+    from db_init import SQLEngine
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "build":
+        Matchup.get(SQLEngine.get())
+    elif command == "counters" and len(sys.argv) > 2:
+        matchup = Matchup.get(SQLEngine.get())
+        target = matchup.find(sys.argv[2])
+        print(f"Best counters to {matchup.names[target]}:")
+        for c in matchup.counters(target, int(sys.argv[3]) if len(sys.argv) > 3 else 10):
+            print(f"  {c['name']:<24} {c['dealt']:6.0%} with {c['move'] or '-':<16} takes {c['taken']:6.0%} from {c['reply'] or '-'}")
+    elif command == "damage" and len(sys.argv) > 3:
+        matchup = Matchup.get(SQLEngine.get())
+        attacker, defender = matchup.find(sys.argv[2]), matchup.find(sys.argv[3])
+        move = matchup.move_names.get(int(matchup.move[attacker, defender]))
+        print(f"{matchup.names[attacker]} hits {matchup.names[defender]} for {matchup.damage[attacker, defender]:.0%} of its HP with {move or 'no damaging move'}")
+    else:
+        print("Usage: matchup.py build | counters <pokemon> [k] | damage <attacker> <defender>")
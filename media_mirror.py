@@ -0,0 +1,120 @@
+# Optional ingest stage: mirrors every sprite and cry referenced by the pokemon
+# table into a local content-addressed store so pages stop hot-linking GitHub.
+#
+# Usage: python3 media_mirror.py  (or python3 db_init.py --mirror-media)
+import os
+import hashlib
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+import sqlalchemy
+
+MEDIA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Web", "media")
+#Prefix of the paths written to media_asset, relative to the pages in Web/
+MEDIA_URL = "media"
+
+MEDIA_COLUMNS = [
+    'sprite_front_default', 'sprite_front_female', 'sprite_front_shiny_female', 'sprite_front_shiny',
+    'sprite_back_default', 'sprite_back_female', 'sprite_back_shiny_female', 'sprite_back_shiny',
+    'cry', 'cry_legacy'
+]
+
+class MediaMirror:
+    def __init__(self, engine, root:str = MEDIA_ROOT, workers:int = 16):
+        self.engine = engine
+        self.root = root
+        self.workers = workers
+        self._local = threading.local()
+
+    @staticmethod
+    def create_table_sql() -> str:
+        return """
+        CREATE TABLE IF NOT EXISTS media_asset (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            path TEXT NOT NULL,
+            content_type TEXT,
+            size INTEGER
+        );
+        """
+
+    @staticmethod
+    def pending_urls(conn) -> list[str]:
+        union = " UNION ".join(f"SELECT {c} AS url FROM pokemon WHERE {c} IS NOT NULL" for c in MEDIA_COLUMNS)
+        result = conn.execute(sqlalchemy.text(
+            f"SELECT url FROM ({union}) u WHERE NOT EXISTS (SELECT 1 FROM media_asset m WHERE m.url = u.url)"
+        ))
+        return [row[0] for row in result]
+
+    def session(self) -> requests.Session:
+        #requests.Session is not thread safe, keep one per worker
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def store(self, content:bytes, url:str, content_type:str|None) -> tuple[str, str]:
+        digest = hashlib.sha256(content).hexdigest()
+        extension = os.path.splitext(urlparse(url).path)[1] or mimetypes.guess_extension(content_type or "") or ""
+        relative = f"{digest[:2]}/{digest}{extension}"
+        target = os.path.join(self.root, relative)
+
+        #Identical files under different URLs land on the same path and are written once
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(content)
+            os.replace(temporary, target)
+
+        return digest, f"{MEDIA_URL}/{relative}"
+
+    def download(self, url:str) -> dict:
+        response = self.session().get(url, timeout=30)
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type")
+        digest, path = self.store(response.content, url, content_type)
+        return {
+            'url': url,
+            'sha256': digest,
+            'path': path,
+            'content_type': content_type,
+            'size': len(response.content)
+        }
+
+    def run(self):
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text(MediaMirror.create_table_sql()))
+            urls = MediaMirror.pending_urls(conn)
+        print(f"Mirroring {len(urls)} media files into {self.root}...")
+
+        rows = []
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.download, url) for url in urls]
+            for i, future in enumerate(as_completed(futures), 1):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    print(e)
+                    failed += 1
+                if i % 100 == 0:
+                    print(f"Mirrored {i} / {len(urls)} media files...")
+
+        if rows:
+            with self.engine.begin() as conn:
+                conn.execute(sqlalchemy.text(
+                    "INSERT INTO media_asset (url, sha256, path, content_type, size) "
+                    "VALUES (:url, :sha256, :path, :content_type, :size) "
+                    "ON CONFLICT (url) DO UPDATE SET sha256 = EXCLUDED.sha256, path = EXCLUDED.path, "
+                    "content_type = EXCLUDED.content_type, size = EXCLUDED.size"
+                ), rows)
+
+        unique = len({row['sha256'] for row in rows})
+        print(f"Media mirror complete: {len(rows)} URLs, {unique} unique files, {failed} failed.")
+
+if __name__ == "__main__":
+    from db_init import SQLEngine
+    MediaMirror(SQLEngine.get()).run()
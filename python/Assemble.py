@@ -1,17 +1,19 @@
 from __future__ import annotations
 import sys
 import os
-import zipfile
 import shutil
 import subprocess
-import urllib.request
-import sqlalchemy
-from sqlalchemy import create_engine, text
 from typing import Dict, Any, Optional
-import requests
 import threading
 
+# sqlalchemy, requests, zipfile and urllib are imported inside the functions
+# that use them, so start/stop/status only pay for what they run (see control.py)
+
 class PostgreSQLLinux:
+    @staticmethod
+    def binary(name: str) -> str:
+        return name
+
     @staticmethod
     def is_installed() -> bool:
       try:
@@ -46,6 +48,7 @@ class PostgreSQLLinux:
       subprocess.check_call(["mkdir", "-p", "Database"])
       subprocess.check_call(["sudo", "initdb", "-D", os.path.abspath("Database"), "--username=postgres", "--encoding=UTF8", "--no-locale"])
       print("PostgreSQL database initialized at:", os.path.abspath("Database"))
+      Tuning.report("serve", Tuning.write(os.path.abspath("Database"), "serve"))
       print("You can now start the PostgreSQL server with 'pg_ctl -D Database start'.")
 
     @staticmethod
@@ -56,6 +59,7 @@ class PostgreSQLLinux:
             "pg_ctl",
             "-D", db_dir,
             "-l", os.path.join(db_dir, "logfile.txt"),
+            "-w",
             "start"
         ])
         print("PostgreSQL server started.")
@@ -74,10 +78,13 @@ class PostgreSQLLinux:
 
     @staticmethod
     def create_engine():
+        from sqlalchemy import create_engine
         return create_engine('postgresql+psycopg2://postgres@localhost:5432/postgres', echo=False)
 
     @staticmethod
     def fetch_and_insert_pokemon_data():
+        from sqlalchemy import text
+        remove_published_files()
         engine = PostgreSQLLinux.create_engine()
         with engine.connect() as conn:
             print("Creating tables if they do not exist...")
@@ -128,8 +135,13 @@ class PostgreSQLLinux:
         if os.path.exists(db_dir):
             print(f"Removing database directory: {db_dir}")
             shutil.rmtree(db_dir)
+        remove_published_files()
 
 class PostgreSQLWindows:
+  @staticmethod
+  def binary(name: str) -> str:
+    return os.path.join("postgresql", "pgsql", "bin", name + ".exe")
+
   @staticmethod
   def is_installed() -> bool:
     for path in os.environ["PATH"].split(os.pathsep):
@@ -140,6 +152,9 @@ class PostgreSQLWindows:
   
   @staticmethod
   def install() -> None:
+    import zipfile
+    import urllib.request
+    
     # Configuration
     POSTGRESQL_VERSION = "16.2-1"
     POSTGRESQL_URL = f"https://get.enterprisedb.com/postgresql/postgresql-{POSTGRESQL_VERSION}-windows-x64-binaries.zip"
@@ -204,6 +219,7 @@ class PostgreSQLWindows:
       "--no-locale"
     ])
     print("Database initialized at:", DB_DIR)
+    Tuning.report("serve", Tuning.write(DB_DIR, "serve"))
   
   @staticmethod
   def run() -> None:
@@ -217,6 +233,7 @@ class PostgreSQLWindows:
       PG_CTL_PATH,
       "-D", DB_DIR,
       "-l", os.path.join(DB_DIR, "logfile.txt"),
+      "-w",
       "start"
     ])
     print("PostgreSQL server started.")
@@ -239,12 +256,15 @@ class PostgreSQLWindows:
     
   @staticmethod
   def create_engine():
+    from sqlalchemy import create_engine
     DB_DIR = os.path.abspath("Database")
     engine = create_engine(f'postgresql+psycopg2://postgres@localhost:5432/postgres', echo=False)
     return engine
   
   @staticmethod
   def fetch_and_insert_pokemon_data():
+    from sqlalchemy import text
+    remove_published_files()
     engine = PostgreSQL.create_engine()
     with engine.connect() as conn:
       print("Creating tables if they do not exist...")
@@ -311,6 +331,7 @@ class PostgreSQLWindows:
     if os.path.exists(DB_DIR):
       print(f"Removing database directory: {DB_DIR}")
       shutil.rmtree(DB_DIR)
+    remove_published_files()
 
     # Remove PostgreSQL binaries directory
     if os.path.exists(UNPACK_DIR):
@@ -319,6 +340,318 @@ class PostgreSQLWindows:
 
 PostgreSQL = PostgreSQLWindows if sys.platform.startswith('win') else PostgreSQLLinux
 
+PRIMARY_PORT = 5432
+REPLICA_BASE_PORT = 5433
+# Read by inc/db.php to route read queries to the replicas
+REPLICA_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inc", "replicas.json")
+MAX_REPLICA_LAG_SECONDS = 5
+
+# Published by the loader for the PHP API (see dataset_version.py and
+# dataset_snapshot.py). They describe this cluster's data, so they go
+# whenever that data is replaced without the loader: the API would otherwise
+# keep answering from them.
+PUBLISHED_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inc", "dataset_version.json"),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inc", "dataset.sqlite")
+]
+
+def remove_published_files() -> None:
+    for path in PUBLISHED_FILES:
+        if os.path.exists(path):
+            print(f"Removing {os.path.abspath(path)}")
+            os.remove(path)
+
+class Replicas:
+    """
+    Local hot standbys of the Database/ cluster, each in ReplicaN/ on port
+    5432 + N, streaming from the primary through their own replication slot.
+    """
+
+    @staticmethod
+    def directory(index: int) -> str:
+        return os.path.abspath(f"Replica{index}")
+
+    @staticmethod
+    def port(index: int) -> int:
+        return REPLICA_BASE_PORT + index - 1
+
+    @staticmethod
+    def existing() -> list[int]:
+        indexes = []
+        for name in os.listdir("."):
+            if name.startswith("Replica") and name[len("Replica"):].isdigit() and os.path.isdir(name):
+                indexes.append(int(name[len("Replica"):]))
+        return sorted(indexes)
+
+    @staticmethod
+    def is_running(index: int) -> bool:
+        return subprocess.run(
+            [PostgreSQL.binary("pg_ctl"), "-D", Replicas.directory(index), "status"],
+            stdout=subprocess.DEVNULL
+        ).returncode == 0
+
+    @staticmethod
+    def create(index: int) -> None:
+        db_dir = Replicas.directory(index)
+        print(f"Cloning the primary into {db_dir}...")
+        # -R writes standby.signal and primary_conninfo, -C -S keeps WAL on the
+        # primary until this standby has received it
+        subprocess.check_call([
+            PostgreSQL.binary("pg_basebackup"),
+            "-h", "localhost",
+            "-p", str(PRIMARY_PORT),
+            "-U", "postgres",
+            "-D", db_dir,
+            "-X", "stream",
+            "-R",
+            "-C", "-S", f"replica_{index}"
+        ])
+        with open(os.path.join(db_dir, "postgresql.auto.conf"), "a") as f:
+            f.write(f"port = {Replicas.port(index)}\n")
+            # Report running queries to the primary so vacuum during an ingest
+            # does not cancel page reads on the standby
+            f.write("hot_standby = on\n")
+            f.write("hot_standby_feedback = on\n")
+        print(f"Replica {index} created on port {Replicas.port(index)}.")
+
+    @staticmethod
+    def run(index: int) -> None:
+        db_dir = Replicas.directory(index)
+        print(f"Starting replica {index}...")
+        subprocess.check_call([
+            PostgreSQL.binary("pg_ctl"),
+            "-D", db_dir,
+            "-l", os.path.join(db_dir, "logfile.txt"),
+            "-w",
+            "start"
+        ])
+
+    @staticmethod
+    def stop(index: int) -> None:
+        print(f"Stopping replica {index}...")
+        subprocess.check_call([
+            PostgreSQL.binary("pg_ctl"),
+            "-D", Replicas.directory(index),
+            "stop",
+            "-m", "fast"
+        ])
+
+    @staticmethod
+    def remove(index: int) -> None:
+        if Replicas.is_running(index):
+            Replicas.stop(index)
+        shutil.rmtree(Replicas.directory(index))
+        subprocess.call([
+            PostgreSQL.binary("psql"),
+            "-h", "localhost",
+            "-p", str(PRIMARY_PORT),
+            "-U", "postgres",
+            "-c", f"SELECT pg_drop_replication_slot('replica_{index}') FROM pg_replication_slots WHERE slot_name = 'replica_{index}'"
+        ])
+        print(f"Replica {index} removed.")
+
+    @staticmethod
+    def write_config() -> None:
+        import json
+        config = {
+            "primary": {"host": "localhost", "port": PRIMARY_PORT},
+            "replicas": [{"host": "localhost", "port": Replicas.port(i)} for i in Replicas.existing()],
+            "max_lag_seconds": MAX_REPLICA_LAG_SECONDS
+        }
+        with open(REPLICA_CONFIG, "w") as f:
+            json.dump(config, f, indent=2)
+
+    @staticmethod
+    def provision(count: int) -> None:
+        for index in range(1, count + 1):
+            if not os.path.isdir(Replicas.directory(index)):
+                Replicas.create(index)
+            if not Replicas.is_running(index):
+                Replicas.run(index)
+        for index in Replicas.existing():
+            if index > count:
+                Replicas.remove(index)
+        Replicas.write_config()
+
+    @staticmethod
+    def run_all() -> None:
+        for index in Replicas.existing():
+            if not Replicas.is_running(index):
+                Replicas.run(index)
+
+    @staticmethod
+    def stop_all() -> None:
+        for index in Replicas.existing():
+            if Replicas.is_running(index):
+                Replicas.stop(index)
+
+    @staticmethod
+    def uninstall() -> None:
+        for index in Replicas.existing():
+            if Replicas.is_running(index):
+                Replicas.stop(index)
+            print(f"Removing replica directory: {Replicas.directory(index)}")
+            shutil.rmtree(Replicas.directory(index))
+        if os.path.exists(REPLICA_CONFIG):
+            os.remove(REPLICA_CONFIG)
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+class Tuning:
+    """
+    postgresql.conf settings derived from the host's CPU count and memory,
+    written to tuning.conf in the data directory and included from
+    postgresql.conf. Both profiles share every setting that needs a restart,
+    so switching between them is a reload.
+    """
+
+    PROFILES = ("serve", "bulk-load")
+
+    @staticmethod
+    def host() -> Dict[str, int]:
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+
+        memory = 4 * GB
+        if sys.platform.startswith("win"):
+            import ctypes
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                memory = status.ullTotalPhys
+        else:
+            try:
+                memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+            except (ValueError, OSError, AttributeError):
+                pass
+            # Inside a container the cgroup limit is what the server really gets
+            try:
+                with open("/sys/fs/cgroup/memory.max") as f:
+                    limit = f.read().strip()
+                if limit.isdigit():
+                    memory = min(memory, int(limit))
+            except OSError:
+                pass
+
+        return {"cpus": cpus, "memory": memory}
+
+    @staticmethod
+    def settings(profile: str, host: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+        if profile not in Tuning.PROFILES:
+            raise ValueError(f"Unknown profile {profile}, expected one of {', '.join(Tuning.PROFILES)}")
+        host = host or Tuning.host()
+        cpus, memory = host["cpus"], host["memory"]
+
+        def clamp(value, low, high):
+            return max(low, min(high, int(value)))
+
+        def size(value):
+            return f"{value // MB}MB"
+
+        max_connections = 100
+        shared_buffers = clamp(memory / 4, 128 * MB, 8 * GB)
+        parallel = max(1, min(4, cpus // 2))
+
+        # Shared by both profiles, including every setting that needs a restart
+        settings = {
+            "max_connections": str(max_connections),
+            "shared_buffers": size(shared_buffers),
+            "wal_buffers": "16MB",
+            "max_worker_processes": str(max(8, cpus)),
+            "effective_cache_size": size(clamp(memory * 3 / 4, 256 * MB, 1024 * GB)),
+            "max_parallel_workers": str(cpus),
+            "max_parallel_workers_per_gather": str(parallel),
+            "max_parallel_maintenance_workers": str(parallel),
+            "checkpoint_completion_target": "0.9",
+            "random_page_cost": "1.1"
+        }
+        if sys.platform.startswith("linux"):
+            # Only platforms with posix_fadvise accept a non-zero value
+            settings["effective_io_concurrency"] = "200"
+
+        if profile == "serve":
+            # Many short page queries: modest per-query memory, durable commits, no JIT warm-up
+            settings.update({
+                "work_mem": size(clamp((memory - shared_buffers) / (max_connections * 3), 4 * MB, 64 * MB)),
+                "maintenance_work_mem": size(clamp(memory / 16, 64 * MB, 1 * GB)),
+                "checkpoint_timeout": "15min",
+                "max_wal_size": "2GB",
+                "min_wal_size": "512MB",
+                "synchronous_commit": "on",
+                "jit": "off"
+            })
+        else:
+            # A few writers moving a lot of data: big sorts for index builds, rare checkpoints,
+            # and commits that do not wait for the WAL flush (a crash loses the last moments
+            # of a load that is rerun anyway, never consistency)
+            settings.update({
+                "work_mem": size(clamp((memory - shared_buffers) / (cpus * 8), 16 * MB, 256 * MB)),
+                "maintenance_work_mem": size(clamp(memory / 8, 256 * MB, 2 * GB)),
+                "checkpoint_timeout": "30min",
+                "max_wal_size": "8GB",
+                "min_wal_size": "1GB",
+                "synchronous_commit": "off",
+                "wal_compression": "on"
+            })
+        return settings
+
+    @staticmethod
+    def write(db_dir: str, profile: str) -> Dict[str, str]:
+        import json
+        import time
+        host = Tuning.host()
+        settings = Tuning.settings(profile, host)
+
+        with open(os.path.join(db_dir, "tuning.conf"), "w") as f:
+            f.write(f"# Generated by Assemble.py for {host['cpus']} CPUs and {host['memory'] // MB} MB of memory\n")
+            f.write(f"# profile: {profile}\n")
+            for name, value in settings.items():
+                f.write(f"{name} = '{value}'\n")
+
+        config = os.path.join(db_dir, "postgresql.conf")
+        with open(config) as f:
+            included = "include_if_exists = 'tuning.conf'" in f.read()
+        if not included:
+            with open(config, "a") as f:
+                f.write("\ninclude_if_exists = 'tuning.conf'\n")
+
+        # Kept next to the include so benchmark runs can record which settings they ran under
+        with open(os.path.join(db_dir, "tuning.json"), "w") as f:
+            json.dump({"profile": profile, "host": host, "settings": settings,
+                       "written_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        return settings
+
+    @staticmethod
+    def report(profile: str, settings: Dict[str, str]) -> None:
+        print(f"PostgreSQL profile '{profile}':")
+        longest = max(len(name) for name in settings)
+        for name, value in settings.items():
+            print(f"  {name.ljust(longest)}  {value}")
+
+    @staticmethod
+    def switch(profile: str, db_dir: Optional[str] = None) -> None:
+        db_dir = db_dir or os.path.abspath("Database")
+        if not os.path.isfile(os.path.join(db_dir, "postgresql.conf")):
+            print(f"No PostgreSQL cluster in {db_dir}, run Assemble.py first.")
+            return
+        settings = Tuning.write(db_dir, profile)
+        Tuning.report(profile, settings)
+        running = subprocess.run(
+            [PostgreSQL.binary("pg_ctl"), "-D", db_dir, "status"], stdout=subprocess.DEVNULL
+        ).returncode == 0
+        if running:
+            subprocess.check_call([PostgreSQL.binary("pg_ctl"), "-D", db_dir, "reload"])
+            print("Configuration reloaded.")
+
 class Data:
   @staticmethod
   def get_url_index(url:str):
@@ -328,6 +661,7 @@ class Data:
       
   @staticmethod
   def fetch_json(name:str, id:int|None=None):
+    import requests
     url = f'https://pokeapi.co/api/v2/{name}'
     if id is None:
       url = url + "?limit=100000&offset=0"
@@ -344,7 +678,7 @@ class PokemonSpecies:
   def __init__(self, id: int, base_happiness: int, capture_rate: int, gender_rate: int, hatch_counter: int,
           order: int, generation: int, national_pokedex_number: int, is_baby: bool, is_legendary: bool,
           is_mythical: bool, color: str, growth_rate: str, habitat: str, shape: str, genera: str, name: str,
-          egg_group: str, varieties: str, description: str):
+          egg_group: list[str], varieties: list[int], description: str):
     self.id = id
     self.base_happiness = base_happiness
     self.capture_rate = capture_rate
@@ -387,10 +721,12 @@ class PokemonSpecies:
       shape TEXT,
       genera TEXT,
       name TEXT,
-      egg_group TEXT,
-      varieties TEXT,
+      egg_group TEXT[],
+      varieties INTEGER[],
       description TEXT
     );
+    CREATE INDEX IF NOT EXISTS pokemon_species_egg_group ON pokemon_species USING GIN (egg_group);
+    CREATE INDEX IF NOT EXISTS pokemon_species_varieties ON pokemon_species USING GIN (varieties);
     """
 
   def insert_sql(self) -> tuple[str, Dict[str, Any]]:
@@ -410,7 +746,7 @@ class PokemonSpecies:
       pokemon_dict[key] = json[key]['name'].replace("-", " ") if json[key] else None
     
     #Egg groups
-    pokemon_dict['egg_group'] = str([g['name'] for g in json['egg_groups']]) if json['egg_groups'] else None
+    pokemon_dict['egg_group'] = [g['name'] for g in json['egg_groups']]
     
     #Genera
     pokemon_dict['genera'] = ""
@@ -441,12 +777,7 @@ class PokemonSpecies:
     
     #Varieties
     try:
-      pokemon_dict['varieties'] = ""
-      for i, s in enumerate([Data.get_url_index(v['pokemon']['url']) for v in json['varieties']]):
-        pokemon_dict['varieties'] += str(s)
-        if i > 0:
-          pokemon_dict['varieties'] += ", "
-      pokemon_dict['varieties'] = "[" + pokemon_dict['varieties'] + "]"
+      pokemon_dict['varieties'] = [Data.get_url_index(v['pokemon']['url']) for v in json['varieties']]
     except:
       pass
     
@@ -484,6 +815,7 @@ class PokemonSpecies:
     
   @staticmethod
   def read() -> list[PokemonSpecies]:
+    import requests
     url = "https://pokeapi.co/api/v2/pokemon-species?limit=100000"
     response = requests.get(url)
     results = response.json().get("results", [])
@@ -680,6 +1012,7 @@ class Pokemon:
     
   @staticmethod
   def read() -> list[Pokemon]:
+    import requests
     url = "https://pokeapi.co/api/v2/pokemon?limit=100000"
     response = requests.get(url)
     results = response.json().get("results", [])
@@ -766,6 +1099,7 @@ class Ability:
 
   @staticmethod
   def read() -> list[Ability]:
+    import requests
     url = "https://pokeapi.co/api/v2/ability?limit=100000"
     response = requests.get(url)
     results = response.json().get("results", [])
@@ -779,13 +1113,18 @@ class Ability:
       abilities.append(Ability.from_json(ability_json))
     return abilities
 
-mode = sys.argv[1] if len(sys.argv) > 1 else "default"
-
-if __name__ == "__main__":
+def main(mode:str = "default", argument:str|None = None) -> None:
   if mode == "uninstall" or mode == "reinstall":
+    Replicas.uninstall()
     PostgreSQL.uninstall()
   if mode == "stop":
+    Replicas.stop_all()
     PostgreSQL.stop()
+  if mode == "replicas":
+    # The primary has to be up for pg_basebackup
+    Replicas.provision(int(argument) if argument is not None else 1)
+  if mode == "tune":
+    Tuning.switch(argument or "serve")
   if mode == "default" or mode == "reinstall":
     run = False
     if not PostgreSQL.is_installed():
@@ -799,5 +1138,10 @@ if __name__ == "__main__":
       t.join()
     if not run:
       PostgreSQL.run()
-  
-  
+    Replicas.run_all()
+
+if __name__ == "__main__":
+  main(
+    sys.argv[1] if len(sys.argv) > 1 else "default",
+    sys.argv[2] if len(sys.argv) > 2 else None
+  )
@@ -0,0 +1,116 @@
+# control.py
+# One entry point for the local services, run in this interpreter: each
+# command imports only the module it needs, and status never spawns a process.
+#
+# Usage: python3 control.py start | stop | restart | status | tune [serve|bulk-load]
+import os
+import sys
+import socket
+
+DB_DIR = "Database"
+DB_HOST = "localhost"
+DB_PORT = 5432
+HTTP_HOST = "localhost"
+HTTP_PORT = 8000
+# similar.py serve, optional: only api/similar.php needs it
+SIMILAR_PORT = int(os.environ.get("SIMILAR_PORT", 8091))
+USAGE = "Usage: control.py start | stop | restart | status | tune [serve|bulk-load]"
+# Written by "Assemble.py replicas N"
+REPLICA_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inc", "replicas.json")
+
+def port_is_open(host, port, timeout=0.2):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def postgres_pid():
+    # The first line of postmaster.pid is the server's PID; the file is left
+    # behind after a crash, so check that the process still exists
+    try:
+        with open(os.path.join(DB_DIR, "postmaster.pid")) as f:
+            pid = int(f.readline().strip())
+    except (OSError, ValueError):
+        return None
+    if sys.platform.startswith("win"):
+        return pid if port_is_open(DB_HOST, DB_PORT) else None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return pid
+
+def status():
+    pid = postgres_pid()
+    http = port_is_open(HTTP_HOST, HTTP_PORT)
+    print(f"PostgreSQL: {f'running (pid {pid})' if pid else 'stopped'}")
+    if os.path.isfile(REPLICA_CONFIG):
+        import json
+        with open(REPLICA_CONFIG) as f:
+            for replica in json.load(f)["replicas"]:
+                up = port_is_open(replica["host"], replica["port"])
+                print(f"Replica:    {replica['host']}:{replica['port']} {'accepting connections' if up else 'down'}")
+    print(f"PHP server: {f'listening on {HTTP_HOST}:{HTTP_PORT}' if http else 'not running'}")
+    print(f"Similarity: {'listening on 127.0.0.1:' + str(SIMILAR_PORT) if port_is_open('127.0.0.1', SIMILAR_PORT) else 'not running'}")
+    # Same convention as pg_ctl status: 3 when something is not running
+    return 0 if pid and http else 3
+
+def start():
+    import start
+    start.main()
+    return 0
+
+def stop():
+    import subprocess
+    if postgres_pid() is None:
+        print("PostgreSQL is not running.")
+        # Replicas run from their own data directories and can outlive the primary
+        import Assemble
+        try:
+            Assemble.Replicas.stop_all()
+        except subprocess.CalledProcessError as e:
+            print("❌ Error stopping replicas:", e)
+            return 1
+        return 0
+    import stop
+    try:
+        stop.stop_services()
+    except subprocess.CalledProcessError as e:
+        print("❌ Error stopping services:", e)
+        return 1
+    return 0
+
+def tune(profile="serve"):
+    # Rewrites Database/tuning.conf for "serve" or "bulk-load" and reloads
+    import Assemble
+    try:
+        Assemble.Tuning.switch(profile)
+    except ValueError as e:
+        print(e)
+        print(USAGE)
+        return 2
+    return 0
+
+def restart():
+    stop()
+    return start()
+
+COMMANDS = {
+    'start': start,
+    'stop': stop,
+    'restart': restart,
+    'status': status,
+    'tune': tune
+}
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    arguments = sys.argv[2:]
+    # Only tune takes an argument; anything more is a usage error, not a TypeError
+    if command not in COMMANDS or len(arguments) > COMMANDS[command].__code__.co_argcount:
+        print(USAGE)
+        sys.exit(2)
+    sys.exit(COMMANDS[command](*arguments))
@@ -1,25 +1,107 @@
 # start.py
+import socket
 import subprocess
 import time
 import os
 
+DB_HOST = "localhost"
+DB_PORT = 5432
+HTTP_HOST = "localhost"
+HTTP_PORT = 8000
+
+# Per-phase startup timings, filled in by timed()
+timings = []
+
+def timed(phase, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings.append((phase, time.perf_counter() - start))
+    return result
+
+def print_timings():
+    print("⏱️  Startup timings:")
+    longest = max(len(phase) for phase, _ in timings)
+    for phase, seconds in timings:
+        print(f"   {phase.ljust(longest)}  {seconds * 1000:8.1f} ms")
+    print(f"   {'total'.ljust(longest)}  {sum(s for _, s in timings) * 1000:8.1f} ms")
+
+def wait_until(probe, what, timeout=30.0, initial_delay=0.05, max_delay=1.0):
+    # Poll with exponential backoff: a fast host is noticed within ~50 ms,
+    # a slow one is not hammered with attempts.
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if probe():
+            return
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{what} not ready after {timeout:.0f} s")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+def port_is_open(host, port):
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+def database_is_ready(host=DB_HOST, port=DB_PORT):
+    # pg_isready exits with 0 only once the server accepts connections;
+    # fall back to a plain TCP probe when the client tools are not on PATH.
+    try:
+        return subprocess.run(
+            ["pg_isready", "-q", "-h", host, "-p", str(port)]
+        ).returncode == 0
+    except FileNotFoundError:
+        return port_is_open(host, port)
+
 def run_assemble():
+    # In-process instead of a second interpreter; Assemble only imports
+    # sqlalchemy/requests when it has to fill a fresh cluster
+    import Assemble
     print("🔧 Initializing PostgreSQL via Assemble.py...")
-    subprocess.run(["python3", "Assemble.py"], check=True)
+    Assemble.main("default")
+
+def wait_for_database():
+    print(f"⏳ Waiting for PostgreSQL on {DB_HOST}:{DB_PORT}...")
+    wait_until(database_is_ready, "PostgreSQL")
 
 def start_php_server():
-    print("🚀 Starting PHP server at http://localhost:8000 ...")
+    print(f"🚀 Starting PHP server at http://{HTTP_HOST}:{HTTP_PORT} ...")
     # Run PHP server in background
-    return subprocess.Popen(["php", "-S", "0.0.0.0:8000"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return subprocess.Popen(["php", "-S", f"0.0.0.0:{HTTP_PORT}"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-if __name__ == "__main__":
+def wait_for_http(php_process):
+    def probe():
+        if php_process.poll() is not None:
+            raise subprocess.CalledProcessError(php_process.returncode, php_process.args)
+        return port_is_open(HTTP_HOST, HTTP_PORT)
+    wait_until(probe, "PHP server")
+
+def main():
+    php_process = None
     try:
-        run_assemble()
-        time.sleep(1)  # small buffer to ensure DB starts up
-        php_process = start_php_server()
+        timed("assemble", run_assemble)
+        timed("database ready", wait_for_database)
+        php_process = timed("php spawn", start_php_server)
+        timed("http ready", wait_for_http, php_process)
+        print_timings()
         print("✅ Server is running. Press Ctrl+C to exit.\n")
         php_process.wait()
     except KeyboardInterrupt:
         print("\n🛑 Shutting down...")
+    except TimeoutError as e:
+        print("❌ Timeout:", e)
     except subprocess.CalledProcessError as e:
-        print("❌ Error:", e)
\ No newline at end of file
+        print("❌ Error:", e)
+    finally:
+        # A server that never became ready, or outlived an error, must not keep the port
+        if php_process is not None and php_process.poll() is None:
+            php_process.terminate()
+            try:
+                php_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                php_process.kill()
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,15 @@
 import subprocess
 
 def stop_services():
+    # Assemble is imported here, in-process: its heavy dependencies are only
+    # loaded by the install/fill paths, so stopping costs one pg_ctl call
+    import Assemble
     print("🛑 Stopping PostgreSQL and services via Assemble.py...")
-    subprocess.run(["python3", "Assemble.py", "stop"], check=True)
+    Assemble.main("stop")
     print("✅ Shutdown complete.")
 
 if __name__ == "__main__":
     try:
         stop_services()
     except subprocess.CalledProcessError as e:
-        print("❌ Error stopping services:", e)
\ No newline at end of file
+        print("❌ Error stopping services:", e)
@@ -0,0 +1,238 @@
+# Blue/green reloads. A load writes into the pokedex_next schema while the site
+# keeps reading pokedex; the shadow is then checked (row counts against the
+# live copy, orphaned references) and warmed, and one short transaction of
+# schema renames makes it live. The replaced schema stays as pokedex_previous
+# until the next promotion, so a rollback is another rename.
+#
+# The first promotion sets the database's search_path to (pokedex, public).
+# That only reaches sessions opened afterwards: a session resolves pokedex by
+# name on every query, so once it has that search_path it follows later
+# renames, but one opened before the first promotion keeps reading public
+# until it reconnects. The PHP API connects per request; the loader's own
+# pool is recycled after each swap. Before the first promotion the live
+# tables are the ones in public; the first promotion moves them into
+# pokedex_previous, so it can be rolled back like any other and no stale
+# copy stays behind in public.
+#
+# Usage:
+#   python3 db_init.py --blue-green
+#   python3 schema_swap.py status | validate | promote | rollback
+import sys
+
+import sqlalchemy
+
+from dataset_version import DatasetVersion
+from dataset_snapshot import DatasetSnapshot
+
+LIVE = "pokedex"
+SHADOW = "pokedex_next"
+PREVIOUS = "pokedex_previous"
+
+#Caches filled by optional ingest stages, carried into the shadow so a reload does not empty them,
+#and the version history, so reloading unchanged data keeps its Last-Modified
+CARRIED = ['media_asset', 'sprite_atlas', 'dataset_version']
+
+#References that are not declared as foreign keys; (table, column, referenced table, referenced column)
+SOFT_REFERENCES = [
+    ('pokemon', 'primary_ability', 'ability', 'id'),
+    ('pokemon', 'secondary_ability', 'ability', 'id'),
+    ('pokemon', 'hidden_ability', 'ability', 'id'),
+    ('learnset', 'pokemon', 'pokemon', 'id'),
+    ('learnset', 'move', 'move', 'id'),
+    ('learnset', 'version_group', 'version_group', 'id'),
+    ('learnset', 'learn_method', 'move_learn_method', 'id'),
+    ('evolution_closure', 'ancestor', 'pokemon_species', 'id'),
+    ('evolution_closure', 'descendant', 'pokemon_species', 'id')
+]
+
+def schema_exists(conn, schema:str) -> bool:
+    return conn.execute(sqlalchemy.text("SELECT to_regnamespace(:schema) IS NOT NULL"), {'schema': schema}).scalar()
+
+def tables(conn, schema:str) -> list[str]:
+    #Plain and partitioned tables, not the partitions themselves
+    return [row[0] for row in conn.execute(sqlalchemy.text("""
+        SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+        ORDER BY c.relname
+    """), {'schema': schema})]
+
+def declared_references(conn, schema:str) -> list[tuple[str, str, str, str]]:
+    return [tuple(row) for row in conn.execute(sqlalchemy.text("""
+        SELECT t.relname, a.attname, r.relname, ra.attname
+        FROM pg_constraint k
+        JOIN pg_class t ON t.oid = k.conrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_class r ON r.oid = k.confrelid
+        JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = k.conkey[1]
+        JOIN pg_attribute ra ON ra.attrelid = k.confrelid AND ra.attnum = k.confkey[1]
+        WHERE k.contype = 'f' AND n.nspname = :schema AND cardinality(k.conkey) = 1
+    """), {'schema': schema})]
+
+def movable_relations(conn, schema:str) -> list[tuple[str, str]]:
+    #Tables (partitions included), views, materialized views and free-standing sequences; not what an
+    #extension owns, nor sequences owned by a column, which move with their table
+    return [tuple(row) for row in conn.execute(sqlalchemy.text("""
+        SELECT c.relname, c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'v', 'm', 'f', 'S')
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_depend d WHERE d.classid = 'pg_class'::regclass AND d.objid = c.oid
+                    AND (d.deptype = 'e' OR (c.relkind = 'S' AND d.deptype IN ('a', 'i')))
+            )
+        ORDER BY c.relname
+    """), {'schema': schema})]
+
+RELATION_KINDS = {'r': "TABLE", 'p': "TABLE", 'v': "VIEW", 'm': "MATERIALIZED VIEW", 'f': "FOREIGN TABLE", 'S': "SEQUENCE"}
+
+class SchemaSwap:
+    def __init__(self, engine, min_ratio:float = 0.9):
+        self.engine = engine
+        #A shadow table with fewer rows than this share of the live one is taken as a partial load
+        self.min_ratio = min_ratio
+
+    def live_schema(self, conn) -> str:
+        return LIVE if schema_exists(conn, LIVE) else "public"
+
+    def prepare(self):
+        with self.engine.begin() as conn:
+            #Extensions stay in public so dropping an old schema never takes them along
+            conn.execute(sqlalchemy.text("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public"))
+            conn.execute(sqlalchemy.text(f"DROP SCHEMA IF EXISTS {SHADOW} CASCADE"))
+            conn.execute(sqlalchemy.text(f"CREATE SCHEMA {SHADOW}"))
+            live = self.live_schema(conn)
+            present = tables(conn, live)
+            for table in CARRIED:
+                if table in present:
+                    conn.execute(sqlalchemy.text(f"CREATE TABLE {SHADOW}.{table} (LIKE {live}.{table} INCLUDING ALL)"))
+                    conn.execute(sqlalchemy.text(f"INSERT INTO {SHADOW}.{table} SELECT * FROM {live}.{table}"))
+        print(f"Loading into schema {SHADOW}")
+
+    def validate(self) -> list[str]:
+        problems = []
+        with self.engine.connect() as conn:
+            if not schema_exists(conn, SHADOW):
+                return [f"schema {SHADOW} does not exist"]
+            live = self.live_schema(conn)
+            live_tables = set(tables(conn, live))
+
+            print(f"{'table':<24} {SHADOW:>14} {live:>14}")
+            for table in tables(conn, SHADOW):
+                count = conn.execute(sqlalchemy.text(f'SELECT count(*) FROM {SHADOW}."{table}"')).scalar()
+                current = conn.execute(sqlalchemy.text(f'SELECT count(*) FROM {live}."{table}"')).scalar() if table in live_tables else None
+                print(f"{table:<24} {count:>14d} {current if current is not None else '-':>14}")
+                if count == 0 and table not in CARRIED:
+                    problems.append(f"{table} is empty")
+                elif current and count < current * self.min_ratio:
+                    problems.append(f"{table} has {count} rows, the live copy {current}")
+
+            present = set(tables(conn, SHADOW))
+            references = declared_references(conn, SHADOW) + SOFT_REFERENCES
+            for table, column, referenced, referenced_column in dict.fromkeys(references):
+                if table not in present or referenced not in present:
+                    continue
+                #Ids are positive; the loader writes -1 for "none"
+                orphans = conn.execute(sqlalchemy.text(f"""
+                    SELECT count(*) FROM {SHADOW}."{table}" c
+                    WHERE c."{column}" > 0 AND NOT EXISTS (
+                        SELECT 1 FROM {SHADOW}."{referenced}" p WHERE p."{referenced_column}" = c."{column}"
+                    )
+                """)).scalar()
+                if orphans:
+                    problems.append(f"{orphans} {table}.{column} values missing from {referenced}.{referenced_column}")
+
+        for problem in problems:
+            print(f"Validation failed: {problem}")
+        return problems
+
+    def warm(self):
+        #Statistics and a filled buffer cache before the first request arrives
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in tables(conn, SHADOW):
+                conn.execute(sqlalchemy.text(f'ANALYZE {SHADOW}."{table}"'))
+            try:
+                conn.execute(sqlalchemy.text("CREATE EXTENSION IF NOT EXISTS pg_prewarm WITH SCHEMA public"))
+            except sqlalchemy.exc.DBAPIError:
+                print("pg_prewarm is not available, skipping the cache warm-up")
+                return
+            blocks = conn.execute(sqlalchemy.text("""
+                SELECT coalesce(sum(public.pg_prewarm(c.oid)), 0) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = :schema AND c.relkind IN ('r', 'i', 'm')
+            """), {'schema': SHADOW}).scalar()
+            print(f"Prewarmed {blocks} blocks of {SHADOW}")
+
+    def promote(self):
+        with self.engine.begin() as conn:
+            if not schema_exists(conn, SHADOW):
+                raise RuntimeError(f"schema {SHADOW} does not exist")
+            #Dropped ahead of the swap so the swap itself only renames
+            conn.execute(sqlalchemy.text(f"DROP SCHEMA IF EXISTS {PREVIOUS} CASCADE"))
+
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("SET LOCAL lock_timeout = '5s'"))
+            if schema_exists(conn, LIVE):
+                conn.execute(sqlalchemy.text(f"ALTER SCHEMA {LIVE} RENAME TO {PREVIOUS}"))
+            else:
+                #First promotion: the data served so far is in public, it becomes the previous version
+                conn.execute(sqlalchemy.text(f"CREATE SCHEMA {PREVIOUS}"))
+                for name, kind in movable_relations(conn, "public"):
+                    conn.execute(sqlalchemy.text(f'ALTER {RELATION_KINDS[kind]} public."{name}" SET SCHEMA {PREVIOUS}'))
+            conn.execute(sqlalchemy.text(f"ALTER SCHEMA {SHADOW} RENAME TO {LIVE}"))
+            database = conn.execute(sqlalchemy.text("SELECT current_database()")).scalar()
+            conn.execute(sqlalchemy.text(f'ALTER DATABASE "{database}" SET search_path = {LIVE}, public'))
+        #Pooled connections predate the search_path change, new ones pick it up
+        self.engine.dispose()
+        print(f"Schema {SHADOW} is live as {LIVE}")
+        self.publish()
+
+    def rollback(self):
+        with self.engine.begin() as conn:
+            if not schema_exists(conn, PREVIOUS):
+                raise RuntimeError(f"there is no {PREVIOUS} schema to roll back to")
+            conn.execute(sqlalchemy.text("SET LOCAL lock_timeout = '5s'"))
+            conn.execute(sqlalchemy.text(f"ALTER SCHEMA {LIVE} RENAME TO {LIVE}_rollback"))
+            conn.execute(sqlalchemy.text(f"ALTER SCHEMA {PREVIOUS} RENAME TO {LIVE}"))
+            conn.execute(sqlalchemy.text(f"ALTER SCHEMA {LIVE}_rollback RENAME TO {PREVIOUS}"))
+            #The restored data is older than what clients hold, Last-Modified has to move forward anyway
+            DatasetVersion.restamp(conn, LIVE)
+        print(f"Rolled back, {PREVIOUS} now holds the version that was live")
+        self.publish()
+
+    def publish(self):
+        #Read from the live schema by name, pooled connections may still carry the search_path from before the swap
+        with self.engine.connect() as conn:
+            DatasetSnapshot.write(conn, LIVE)
+            DatasetVersion.publish(DatasetVersion.current(conn, LIVE))
+
+    def status(self):
+        with self.engine.connect() as conn:
+            for schema in (LIVE, SHADOW, PREVIOUS, "public"):
+                if schema_exists(conn, schema):
+                    print(f"{schema:<18} {len(tables(conn, schema)):3d} tables")
+            print(f"Live data is read from {self.live_schema(conn)}")
+
+    def run(self) -> bool:
+        #Validate, warm and promote a finished load; a failed shadow is left in place for inspection
+        if self.validate():
+            print(f"Not promoting, {LIVE} is unchanged")
+            return False
+        self.warm()
+        self.promote()
+        return True
+
+if __name__ == "__main__":
+    from db_init import SQLEngine
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    swap = SchemaSwap(SQLEngine.get())
+    try:
+        if command == "status":
+            swap.status()
+        elif command == "validate":
+            sys.exit(1 if swap.validate() else 0)
+        elif command == "promote":
+            sys.exit(0 if swap.run() else 1)
+        elif command == "rollback":
+            swap.rollback()
+        else:
+            print("Usage: schema_swap.py status | validate | promote | rollback")
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,312 @@
+# Sharded full crawl of the REST API. The coordinator splits every entity's id
+# list into shards and queues them in the crawl_shard table; workers (local
+# processes, or "worker" runs on other hosts pointed at the same database)
+# claim shards with SKIP LOCKED, fetch and transform them with the same
+# process threads as db_init.py, and COPY the rows in through the bulk loader.
+# A shard commits together with its rows, so a failed or abandoned shard is
+# simply claimed again.
+#
+# Usage:
+#   python3 sharded_crawl.py run [workers] [shard size]   plan, crawl with local workers, refresh read models
+#   python3 sharded_crawl.py plan [shard size]            only queue the shards, prints the crawl id
+#   python3 sharded_crawl.py worker [crawl]               work on a queued crawl (latest by default)
+#   python3 sharded_crawl.py status [crawl]
+import os
+import sys
+import time
+import uuid
+import socket
+import multiprocessing
+
+import requests
+import sqlalchemy
+
+import db_init
+from db_init import Data, FetchThread, SQLEngine, ReadModels, LearnsetSQLThread
+#csv_import installs pandas when it is missing
+from csv_import import copy_frame, pd
+
+SHARD_SIZE = 100
+MAX_ATTEMPTS = 3
+#A running shard whose worker went silent this long is handed out again
+LEASE_SECONDS = 600
+
+#Entity -> (phase, [(process thread, SQL thread)]). A phase starts once every
+#shard of the earlier phases is done, so foreign keys always resolve.
+ENTITIES = {
+    'ability': (0, [(db_init.AbilityProcessThread, db_init.AbilitySQLThread)]),
+    'move': (0, [(db_init.MoveProcessThread, db_init.MoveSQLThread)]),
+    'pokemon-species': (0, [(db_init.PokemonSpeciesProcessThread, db_init.PokemonSpeciesSQLThread)]),
+    'type': (0, [(db_init.TypeEfficacyProcessThread, db_init.TypeEfficacySQLThread)]),
+    'pokemon': (1, [
+        (db_init.PokemonProcessThread, db_init.PokemonSQLThread),
+        (db_init.PokemonMoveProcessThread, db_init.PokemonMoveSQLThread),
+        (db_init.LearnsetProcessThread, db_init.LearnsetSQLThread)
+    ]),
+    'evolution-chain': (2, [
+        (db_init.EvolutionChainProcessThread, db_init.EvolutionChainSQLThread),
+        (db_init.EvolutionClosureProcessThread, db_init.EvolutionClosureSQLThread)
+    ])
+}
+
+#Rows owned by a shard that are replaced as a whole instead of upserted by primary key
+OWNED_BY = {
+    'pokemon_move': 'pokemon',
+    'learnset': 'pokemon',
+    'evolution_chain': 'chain',
+    'evolution_closure': 'chain'
+}
+
+def create_table_sql() -> str:
+    return """
+    CREATE TABLE IF NOT EXISTS crawl_shard (
+        crawl TEXT NOT NULL,
+        entity TEXT NOT NULL,
+        shard INTEGER NOT NULL,
+        phase INTEGER NOT NULL,
+        ids INTEGER[] NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        claimed_at TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ,
+        error TEXT,
+        PRIMARY KEY (crawl, entity, shard)
+    );
+    CREATE INDEX IF NOT EXISTS crawl_shard_status ON crawl_shard (crawl, status, phase);
+    """
+
+def create_tables(engine):
+    metadata = sqlalchemy.MetaData()
+    for _, pairs in ENTITIES.values():
+        for _, sql_class in pairs:
+            sql_class.define_table(metadata)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(LearnsetSQLThread.lookup_tables_sql()))
+        conn.execute(sqlalchemy.text(create_table_sql()))
+
+def plan(engine, shard_size:int = SHARD_SIZE) -> str:
+    create_tables(engine)
+    #Sorts by start time for latest_crawl; microseconds and a random suffix keep plans made in the same second apart
+    now = time.time()
+    crawl = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000000) % 1000000:06d}-{uuid.uuid4().hex[:8]}"
+    with engine.begin() as conn:
+        for name, (phase, _) in ENTITIES.items():
+            ids = [Data.get_url_index(node['url']) for node in Data.fetch_json(name)['results']]
+            shards = [ids[i:i + shard_size] for i in range(0, len(ids), shard_size)]
+            conn.execute(
+                sqlalchemy.text("INSERT INTO crawl_shard (crawl, entity, shard, phase, ids) VALUES (:crawl, :entity, :shard, :phase, :ids)"),
+                [{'crawl': crawl, 'entity': name, 'shard': i, 'phase': phase, 'ids': shard} for i, shard in enumerate(shards)]
+            )
+            print(f"Queued {len(ids)} {name} ids in {len(shards)} shards")
+    return crawl
+
+def latest_crawl(engine) -> str|None:
+    with engine.connect() as conn:
+        return conn.execute(sqlalchemy.text("SELECT max(crawl) FROM crawl_shard")).scalar()
+
+class Worker:
+    def __init__(self, engine, crawl:str, name:str|None = None):
+        self.engine = engine
+        self.crawl = crawl
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.session = requests.Session()
+        self.tables = {}
+        metadata = sqlalchemy.MetaData()
+        for _, pairs in ENTITIES.values():
+            for _, sql_class in pairs:
+                table = sql_class.define_table(metadata)
+                self.tables[table.name] = table
+
+    def claim(self):
+        with self.engine.begin() as conn:
+            return conn.execute(sqlalchemy.text("""
+                UPDATE crawl_shard SET status = 'running', attempts = attempts + 1, worker = :worker, claimed_at = now()
+                WHERE (crawl, entity, shard) = (
+                    SELECT s.crawl, s.entity, s.shard FROM crawl_shard s
+                    WHERE s.crawl = :crawl AND s.attempts < :max_attempts
+                      AND (s.status = 'pending' OR (s.status = 'running' AND s.claimed_at < now() - make_interval(secs => :lease)))
+                      AND NOT EXISTS (
+                          SELECT 1 FROM crawl_shard d WHERE d.crawl = s.crawl AND d.phase < s.phase AND d.status <> 'done'
+                      )
+                    ORDER BY s.phase, s.entity, s.shard
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING entity, shard, ids, attempts
+            """), {'worker': self.name, 'crawl': self.crawl, 'max_attempts': MAX_ATTEMPTS, 'lease': LEASE_SECONDS}).first()
+
+    def remaining(self) -> int:
+        #Shards that can still run; the ones behind a failed phase never will
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("""
+                UPDATE crawl_shard SET status = 'failed', error = 'lease expired on the last attempt'
+                WHERE crawl = :crawl AND status = 'running' AND attempts >= :max_attempts
+                  AND claimed_at < now() - make_interval(secs => :lease)
+            """), {'crawl': self.crawl, 'max_attempts': MAX_ATTEMPTS, 'lease': LEASE_SECONDS})
+            return conn.execute(sqlalchemy.text("""
+                SELECT count(*) FROM crawl_shard s
+                WHERE s.crawl = :crawl AND s.status IN ('pending', 'running')
+                  AND NOT EXISTS (
+                      SELECT 1 FROM crawl_shard d WHERE d.crawl = s.crawl AND d.phase < s.phase AND d.status = 'failed'
+                  )
+            """), {'crawl': self.crawl}).scalar()
+
+    def release(self, entity:str, shard:int, attempts:int, error:Exception):
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("""
+                UPDATE crawl_shard SET status = :status, error = :error
+                WHERE crawl = :crawl AND entity = :entity AND shard = :shard
+            """), {
+                'status': 'pending' if attempts < MAX_ATTEMPTS else 'failed',
+                'error': f"{type(error).__name__}: {error}",
+                'crawl': self.crawl, 'entity': entity, 'shard': shard
+            })
+
+    def fetch(self, entity:str, ids:list[int]) -> list[dict]:
+        documents = []
+        for id in ids:
+            response = self.session.get(f"{Data.URL}/{entity}/{id}/", timeout=60)
+            response.raise_for_status()
+            documents.append(response.json())
+        return documents
+
+    def transform(self, entity:str, documents:list[dict]) -> dict[str, list[dict]]:
+        rows = {}
+        for process_class, sql_class in ENTITIES[entity][1]:
+            #Process threads only need a fetch thread to attach to; neither is started
+            processor = process_class(FetchThread(entity))
+            table = sql_class.define_table(sqlalchemy.MetaData()).name
+            rows[table] = []
+            for document in documents:
+                result = processor.process(document)
+                for item in result if isinstance(result, list) else [result]:
+                    rows[table].extend(item if isinstance(item, list) else [item])
+        return rows
+
+    def load(self, conn, table_name:str, rows:list[dict], ids:list[int]):
+        table = self.tables[table_name]
+        frame = pd.DataFrame(rows)
+        cursor = conn.connection.cursor()
+
+        if table_name == 'learnset':
+            conn.execute(sqlalchemy.text("SELECT pg_advisory_xact_lock(hashtext('learnset_partitions'))"))
+            for version_group, name in frame[['version_group', 'version_group_name']].drop_duplicates().itertuples(index=False):
+                conn.execute(sqlalchemy.text(LearnsetSQLThread.partition_sql(int(version_group))))
+                conn.execute(sqlalchemy.text("INSERT INTO version_group (id, name) VALUES (:id, :name) ON CONFLICT (id) DO NOTHING"), {'id': int(version_group), 'name': name})
+            for method, name in frame[['learn_method', 'learn_method_name']].drop_duplicates().itertuples(index=False):
+                conn.execute(sqlalchemy.text("INSERT INTO move_learn_method (id, name) VALUES (:id, :name) ON CONFLICT (id) DO NOTHING"), {'id': int(method), 'name': name})
+            frame = frame.drop_duplicates(subset=LearnsetSQLThread.COLUMNS)
+
+        if table_name in OWNED_BY:
+            #Replace everything the shard owns; a retried shard starts from a clean slate
+            condition = table.c[OWNED_BY[table_name]].in_(ids)
+            if table_name == 'evolution_closure' and len(frame):
+                species = [int(s) for s in frame['descendant'].unique()]
+                condition = sqlalchemy.or_(condition, table.c.descendant.in_(species), table.c.ancestor.in_(species))
+            conn.execute(table.delete().where(condition))
+            copy_frame(cursor, table, frame)
+            return
+
+        #Upsert by primary key through a staging table, other tables reference these rows
+        columns = [c for c in table.columns if c.name in frame.columns]
+        stage = f"stage_{table_name}"
+        conn.execute(sqlalchemy.text(f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"))
+        copy_frame(cursor, sqlalchemy.table(stage, *[sqlalchemy.column(c.name, c.type) for c in columns]), frame)
+        names = ", ".join(f'"{c.name}"' for c in columns)
+        keys = ", ".join(f'"{c.name}"' for c in table.primary_key.columns)
+        updates = ", ".join(f'"{c.name}" = EXCLUDED."{c.name}"' for c in columns if not c.primary_key)
+        conn.execute(sqlalchemy.text(
+            f"INSERT INTO {table_name} ({names}) SELECT {names} FROM {stage} ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+        ))
+
+    def run(self):
+        done = 0
+        while True:
+            claimed = self.claim()
+            if claimed is None:
+                if self.remaining() == 0:
+                    break
+                #Waiting on shards held by other workers or on an earlier phase
+                time.sleep(0.5)
+                continue
+
+            entity, shard, ids, attempts = claimed
+            try:
+                rows = self.transform(entity, self.fetch(entity, ids))
+                with self.engine.begin() as conn:
+                    for table_name, table_rows in rows.items():
+                        if table_rows:
+                            self.load(conn, table_name, table_rows, ids)
+                    conn.execute(sqlalchemy.text("""
+                        UPDATE crawl_shard SET status = 'done', finished_at = now(), error = NULL
+                        WHERE crawl = :crawl AND entity = :entity AND shard = :shard
+                    """), {'crawl': self.crawl, 'entity': entity, 'shard': shard})
+                done += 1
+            except Exception as e:
+                print(f"{self.name}: {entity} shard {shard} failed (attempt {attempts}/{MAX_ATTEMPTS}): {e}")
+                self.release(entity, shard, attempts, e)
+        return done
+
+def work(crawl:str):
+    #Entry point of a local worker process; never reuse the parent's pooled connections
+    SQLEngine.get().dispose(close=False)
+    worker = Worker(SQLEngine.get(), crawl)
+    print(f"{worker.name}: {worker.run()} shards loaded")
+
+def status(engine, crawl:str) -> bool:
+    with engine.connect() as conn:
+        rows = conn.execute(sqlalchemy.text("""
+            SELECT entity, status, count(*), sum(cardinality(ids)), max(attempts)
+            FROM crawl_shard WHERE crawl = :crawl GROUP BY phase, entity, status ORDER BY phase, entity, status
+        """), {'crawl': crawl}).all()
+        errors = conn.execute(sqlalchemy.text(
+            "SELECT entity, shard, error FROM crawl_shard WHERE crawl = :crawl AND status = 'failed' ORDER BY entity, shard"
+        ), {'crawl': crawl}).all()
+    print(f"Crawl {crawl}:")
+    for entity, state, shards, ids, attempts in rows:
+        print(f"  {entity:<16} {state:<8} {shards:5d} shards {ids:7d} ids  (max {attempts} attempts)")
+    for entity, shard, error in errors:
+        print(f"  failed {entity} shard {shard}: {error}")
+    return len(errors) == 0 and all(state == 'done' for _, state, _, _, _ in rows)
+
+def run(workers:int, shard_size:int):
+    engine = SQLEngine.get()
+    started = time.perf_counter()
+    crawl = plan(engine, shard_size)
+    print(f"Crawling {crawl} with {workers} workers...")
+
+    processes = [multiprocessing.Process(target=work, args=(crawl,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    complete = status(engine, crawl)
+    if complete:
+        print("Refreshing read models...")
+        ReadModels.refresh(engine)
+    print(f"Crawl {'complete' if complete else 'incomplete'} in {time.perf_counter() - started:.2f} s")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "run":
+        run(
+            int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 4,
+            int(sys.argv[3]) if len(sys.argv) > 3 else SHARD_SIZE
+        )
+    elif command == "plan":
+        print(plan(SQLEngine.get(), int(sys.argv[2]) if len(sys.argv) > 2 else SHARD_SIZE))
+    elif command in ("worker", "status"):
+        crawl = sys.argv[2] if len(sys.argv) > 2 else latest_crawl(SQLEngine.get())
+        if crawl is None:
+            print("No crawl has been planned yet")
+            sys.exit(1)
+        if command == "worker":
+            worker = Worker(SQLEngine.get(), crawl)
+            print(f"{worker.name}: {worker.run()} shards loaded")
+        else:
+            sys.exit(0 if status(SQLEngine.get(), crawl) else 1)
+    else:
+        print("Usage: sharded_crawl.py run [workers] [shard size] | plan [shard size] | worker [crawl] | status [crawl]")
@@ -0,0 +1,221 @@
+# "Pokémon like this one": nearest neighbours over base stats, height and
+# weight. The features are normalized (height and weight on a log scale, then
+# every column to zero mean and unit variance) and held in a NumPy matrix;
+# queries are brute-force batched distances, which at this size beat building
+# a tree, filtered by type and generation before the distances are taken.
+#
+# The index is served over HTTP for api/similar.php and rebuilt whenever the
+# loader publishes a new dataset version (see dataset_version.py).
+#
+# Usage:
+#   python3 similar.py serve [port]                 default port 8091 (SIMILAR_PORT)
+#   python3 similar.py query <pokemon> [k] [type,...] [generation,...]
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import sqlalchemy
+
+try:
+    import numpy as np
+except ImportError:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy"])
+    import numpy as np
+
+from dataset_version import VERSION_FILE
+
+PORT = int(os.environ.get("SIMILAR_PORT", 8091))
+
+FEATURES = ['hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed', 'height', 'weight']
+#Spanning from 1 kg to 1000 kg, so compared by ratio rather than difference
+LOG_FEATURES = ['height', 'weight']
+#Cells of the (queries x candidates) distance matrix per batch, 64 MB of float32 for each temporary
+BATCH_CELLS = 16 * 1024 * 1024
+
+class SimilarityIndex:
+    def __init__(self, ids:np.ndarray, names:list[str], features:np.ndarray, types:np.ndarray, generation:np.ndarray, type_names:list[str]):
+        self.ids = ids
+        self.names = names
+        self.raw = features
+        self.types = types            #(N, 2) type indexes, -1 for none
+        self.generation = generation  #(N,), 0 when unknown
+        self.type_names = type_names
+        self._type_index = {t: i for i, t in enumerate(type_names)}
+        self._index = {int(id): i for i, id in enumerate(ids)}
+        self._names = {name.lower(): i for i, name in enumerate(names)}
+
+        columns = features.astype(np.float64)
+        for feature in LOG_FEATURES:
+            column = FEATURES.index(feature)
+            columns[:, column] = np.log1p(columns[:, column])
+        self.mean = columns.mean(axis=0)
+        self.std = columns.std(axis=0)
+        self.std[self.std == 0] = 1
+        self.vectors = ((columns - self.mean) / self.std).astype(np.float32)
+        self.norms = (self.vectors ** 2).sum(axis=1)
+
+    @staticmethod
+    def load(conn) -> 'SimilarityIndex':
+        rows = conn.execute(sqlalchemy.text(f"""
+            SELECT p.id, p.name, p.primary_type, p.secondary_type, COALESCE(s.generation, 0),
+                {", ".join(f"COALESCE(p.{f}, 0)" for f in FEATURES)}
+            FROM pokemon p LEFT JOIN pokemon_species s ON s.id = p.species
+            ORDER BY p.id
+        """)).all()
+        type_names = sorted({t for row in rows for t in row[2:4] if t})
+        type_index = {t: i for i, t in enumerate(type_names)}
+        return SimilarityIndex(
+            np.array([row[0] for row in rows], dtype=np.int32),
+            [row[1] for row in rows],
+            np.array([row[5:] for row in rows], dtype=np.float32),
+            np.array([[type_index.get(row[2], -1), type_index.get(row[3], -1)] for row in rows], dtype=np.int16).reshape(-1, 2),
+            np.array([row[4] for row in rows], dtype=np.int16),
+            type_names
+        )
+
+    def find(self, pokemon:str) -> int:
+        index = self._index.get(int(pokemon)) if pokemon.isdigit() else self._names.get(pokemon.lower())
+        if index is None:
+            raise KeyError(f"unknown Pokémon {pokemon}")
+        return index
+
+    def mask(self, types:list[str]|None = None, generations:list[int]|None = None) -> np.ndarray|None:
+        #Rows passing the filters: every listed type, any listed generation; None when unfiltered
+        if not types and not generations:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for name in types or []:
+            t = self._type_index.get(name, -2)
+            mask &= (self.types == t).any(axis=1)
+        if generations:
+            mask &= np.isin(self.generation, generations)
+        return mask
+
+    def nearest(self, vectors:np.ndarray, k:int = 10, mask:np.ndarray|None = None, exclude:np.ndarray|None = None, batch_size:int = 1024) -> tuple[np.ndarray, np.ndarray]:
+        #(Q, 8) normalized query vectors -> (Q, k) row indexes and distances, nearest first.
+        #|x - q|^2 = |x|^2 - 2 x.q + |q|^2, so a batch of queries is one matrix product.
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self.ids))
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        #One slot is lost to an excluded row only when a filter has not already removed it
+        k = min(k, len(candidates) - (1 if exclude is not None and np.isin(exclude, candidates).any() else 0))
+        if k <= 0:
+            return np.zeros((len(vectors), 0), dtype=np.int64), np.zeros((len(vectors), 0), dtype=np.float32)
+
+        #Fewer queries per batch against large indexes, so the temporaries stay bounded
+        batch_size = max(1, min(batch_size, BATCH_CELLS // len(candidates)))
+        matrix = self.vectors[candidates]
+        norms = self.norms[candidates]
+        rows = np.empty((len(vectors), k), dtype=np.int64)
+        distances = np.empty((len(vectors), k), dtype=np.float32)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            squared = norms[None, :] - 2 * batch @ matrix.T + (batch ** 2).sum(axis=1)[:, None]
+            if exclude is not None:
+                #The query's own row, when it is a Pokémon of the index
+                own = exclude[start:start + batch_size, None] == candidates[None, :]
+                squared[own] = np.inf
+            top = np.argpartition(squared, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(squared, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            rows[start:start + len(batch)] = candidates[top]
+            distances[start:start + len(batch)] = np.sqrt(np.maximum(np.take_along_axis(squared, top, axis=1), 0))
+        return rows, distances
+
+    def similar(self, pokemon:str, k:int = 10, types:list[str]|None = None, generations:list[int]|None = None) -> dict:
+        target = self.find(pokemon)
+        rows, distances = self.nearest(self.vectors[target], k, self.mask(types, generations), exclude=np.array([target]))
+        return {
+            'target': self.describe(target),
+            'results': [dict(self.describe(row), distance=round(float(d), 4)) for row, d in zip(rows[0], distances[0])]
+        }
+
+    def describe(self, row:int) -> dict:
+        return {
+            'id': int(self.ids[row]),
+            'name': self.names[row],
+            'types': [self.type_names[t] for t in self.types[row] if t >= 0],
+            'generation': int(self.generation[row]),
+            'stats': {feature: int(value) for feature, value in zip(FEATURES, self.raw[row])}
+        }
+
+class IndexHolder:
+    #Rebuilds the index when the loader publishes a new dataset version
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.index = None
+        self.version_mtime = None
+
+    def get(self) -> SimilarityIndex:
+        mtime = os.path.getmtime(VERSION_FILE) if os.path.isfile(VERSION_FILE) else None
+        with self.lock:
+            if self.index is None or mtime != self.version_mtime:
+                started = time.perf_counter()
+                with self.engine.connect() as conn:
+                    self.index = SimilarityIndex.load(conn)
+                self.version_mtime = mtime
+                print(f"Indexed {len(self.index.ids)} Pokémon in {time.perf_counter() - started:.3f} s")
+            return self.index
+
+def serve(port:int = PORT):
+    from db_init import SQLEngine
+    holder = IndexHolder(SQLEngine.get())
+    holder.get()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path != "/similar" or "pokemon" not in query:
+                return self.reply(404, {'error': "use /similar?pokemon=<name or id>&k=&type=&generation="})
+            try:
+                result = holder.get().similar(
+                    query['pokemon'],
+                    max(1, min(100, int(query.get('k', 10)))),
+                    [t for t in query.get('type', "").lower().split(",") if t],
+                    [int(g) for g in query.get('generation', "").split(",") if g.strip().isdigit()]
+                )
+            except KeyError as e:
+                return self.reply(404, {'error': str(e.args[0])})
+            except ValueError as e:
+                return self.reply(400, {'error': str(e)})
+            self.reply(200, result)
+
+        def reply(self, status:int, body:dict):
+            payload = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Serving similarity queries on 127.0.0.1:{port}")
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "serve":
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else PORT)
+    elif command == "query" and len(sys.argv) > 2:
+        from db_init import SQLEngine
+        with SQLEngine.get().connect() as conn:
+            index = SimilarityIndex.load(conn)
+        result = index.similar(
+            sys.argv[2],
+            int(sys.argv[3]) if len(sys.argv) > 3 else 10,
+            sys.argv[4].lower().split(",") if len(sys.argv) > 4 else None,
+            [int(g) for g in sys.argv[5].split(",")] if len(sys.argv) > 5 else None
+        )
+        print(f"Pokémon like {result['target']['name']}:")
+        for r in result['results']:
+            print(f"  {r['name']:<24} {r['distance']:7.3f}  {'/'.join(r['types']):<18} gen {r['generation']}")
+    else:
+        print("Usage: similar.py serve [port] | query <pokemon> [k] [type,...] [generation,...]")
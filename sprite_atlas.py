@@ -0,0 +1,158 @@
+# Offline build step: packs every default front sprite into a few atlas sheets
+# so the list page needs a handful of image requests instead of one per card.
+#
+# Usage: python3 sprite_atlas.py  (or python3 db_init.py --sprite-atlas)
+import os
+import sys
+import io
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import sqlalchemy
+
+#Pillow is only needed when the atlas is actually built, see SpriteAtlas.require_pillow
+Image = None
+
+WEB_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Web")
+ATLAS_ROOT = os.path.join(WEB_ROOT, "atlas")
+#Prefix of the sheet paths, relative to the pages in Web/
+ATLAS_URL = "atlas"
+
+#Default sprites are 96x96; 32x32 cells keeps a sheet at 3072 px, below common GPU texture limits
+CELL = 96
+COLUMNS = 32
+ROWS = 32
+
+class SpriteAtlas:
+    def __init__(self, engine, root:str = ATLAS_ROOT, workers:int = 16):
+        self.engine = engine
+        self.root = root
+        self.workers = workers
+        SpriteAtlas.require_pillow()
+
+    @staticmethod
+    def require_pillow():
+        global Image
+        try:
+            from PIL import Image
+        except ImportError:
+            subprocess.check_call([sys.executable, "-m", "pip", "install", "pillow"])
+            from PIL import Image
+
+    @staticmethod
+    def create_table_sql() -> str:
+        return """
+        CREATE TABLE IF NOT EXISTS sprite_atlas (
+            pokemon INTEGER PRIMARY KEY,
+            sheet TEXT NOT NULL,
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL
+        );
+        """
+
+    @staticmethod
+    def sources(conn) -> list[tuple[int, str, str|None]]:
+        #Prefer the local copy written by the media mirror when there is one
+        return list(conn.execute(sqlalchemy.text("""
+            SELECT p.id, p.sprite_front_default, m.path
+            FROM pokemon p
+            LEFT JOIN media_asset m ON m.url = p.sprite_front_default
+            WHERE p.sprite_front_default IS NOT NULL
+            ORDER BY p."order", p.id
+        """)))
+
+    @staticmethod
+    def load(url:str, path:str|None) -> 'Image.Image':
+        if path is not None and os.path.isfile(os.path.join(WEB_ROOT, path)):
+            image = Image.open(os.path.join(WEB_ROOT, path))
+        else:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            image = Image.open(io.BytesIO(response.content))
+        image = image.convert("RGBA")
+        if image.width > CELL or image.height > CELL:
+            image.thumbnail((CELL, CELL))
+        return image
+
+    def save(self, sheet:'Image.Image') -> str:
+        buffer = io.BytesIO()
+        sheet.save(buffer, format="PNG", optimize=True)
+        content = buffer.getvalue()
+        #Content hash in the file name lets browsers cache sheets forever
+        name = f"sprites-{hashlib.sha256(content).hexdigest()[:16]}.png"
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, name), "wb") as f:
+            f.write(content)
+        return f"{ATLAS_URL}/{name}"
+
+    def pack(self, images:list[tuple[int, 'Image.Image']]) -> list[dict]:
+        per_sheet = COLUMNS * ROWS
+        rows = []
+        for start in range(0, len(images), per_sheet):
+            chunk = images[start:start + per_sheet]
+            used_rows = (len(chunk) + COLUMNS - 1) // COLUMNS
+            sheet = Image.new("RGBA", (min(len(chunk), COLUMNS) * CELL, used_rows * CELL))
+            placed = []
+            for i, (pokemon, image) in enumerate(chunk):
+                x = (i % COLUMNS) * CELL
+                y = (i // COLUMNS) * CELL
+                sheet.paste(image, (x, y))
+                placed.append({'pokemon': pokemon, 'x': x, 'y': y, 'width': image.width, 'height': image.height})
+            path = self.save(sheet)
+            for entry in placed:
+                entry['sheet'] = path
+            rows.extend(placed)
+        return rows
+
+    def write_index(self, rows:list[dict]):
+        index = {
+            'cell': CELL,
+            'sheets': sorted({row['sheet'] for row in rows}),
+            'sprites': {
+                str(row['pokemon']): [row['sheet'], row['x'], row['y'], row['width'], row['height']]
+                for row in rows
+            }
+        }
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "sprites.json"), "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+
+    def run(self):
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text(SpriteAtlas.create_table_sql()))
+            sources = SpriteAtlas.sources(conn)
+        print(f"Building sprite atlas from {len(sources)} sprites...")
+
+        def load(source):
+            pokemon, url, path = source
+            try:
+                return pokemon, SpriteAtlas.load(url, path)
+            except Exception as e:
+                print(e)
+                return pokemon, None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            images = [(p, image) for p, image in executor.map(load, sources) if image is not None]
+
+        rows = self.pack(images)
+        self.write_index(rows)
+
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.text("TRUNCATE sprite_atlas"))
+            if rows:
+                conn.execute(sqlalchemy.text(
+                    "INSERT INTO sprite_atlas (pokemon, sheet, x, y, width, height) "
+                    "VALUES (:pokemon, :sheet, :x, :y, :width, :height)"
+                ), rows)
+
+        sheets = len({row['sheet'] for row in rows})
+        print(f"Sprite atlas complete: {len(rows)} sprites in {sheets} sheets, {len(sources) - len(rows)} failed.")
+
+if __name__ == "__main__":
+    from db_init import SQLEngine
+    SpriteAtlas(SQLEngine.get()).run()
@@ -0,0 +1,124 @@
+# Sampling profiler for the ingest pipeline. Every few milliseconds it records
+# the Python stack of each watched stage thread, so time can be attributed per
+# stage (Fetch / Process / SQL) and per entity, and written out as collapsed
+# stacks for flamegraph.pl, inferno or speedscope plus a top-N hotspot summary.
+#
+# Usage: python3 db_init.py --profile
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+PROFILE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile")
+
+#Checked from the innermost frame outwards, the first match names the sample
+CATEGORIES = [
+    ('database', lambda name, path: name in ('do_execute', 'do_executemany', 'copy_expert') or 'psycopg2' in path),
+    ('sqlalchemy compile', lambda name, path: f'sqlalchemy{os.sep}sql{os.sep}' in path),
+    ('json decode', lambda name, path: f'{os.sep}json{os.sep}' in path),
+    ('network', lambda name, path: any(part in path for part in (f'{os.sep}requests{os.sep}', f'{os.sep}urllib3{os.sep}', f'{os.sep}http{os.sep}', 'socket.py', 'ssl.py'))),
+    ('process', lambda name, path: name == 'process'),
+    ('pipeline polling', lambda name, path: name in ('run', 'next', 'has_finished') and path.endswith('db_init.py'))
+]
+
+def frame_label(frame:tuple[str, str, int]) -> str:
+    name, path, line = frame
+    return f"{name} ({os.path.basename(path)}:{line})"
+
+def categorize(stack:tuple) -> str:
+    for name, path, _ in reversed(stack):
+        for category, matches in CATEGORIES:
+            if matches(name, path):
+                return category
+    return 'other'
+
+class StageProfiler(threading.Thread):
+    def __init__(self, interval:float = 0.005, top:int = 25, root:str = PROFILE_ROOT):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.top = top
+        self.root = root
+        self.targets = {}
+        self.samples = Counter()
+        self._finished = threading.Event()
+        self._started_at = None
+        self._elapsed = 0.0
+        self._ticks = 0
+
+    def watch(self, thread:threading.Thread, stage:str, entity:str):
+        self.targets[thread.ident] = (stage, entity)
+
+    def unwatch(self, thread:threading.Thread):
+        self.targets.pop(thread.ident, None)
+
+    def run(self):
+        self._started_at = time.perf_counter()
+        while not self._finished.wait(self.interval):
+            self._ticks += 1
+            frames = sys._current_frames()
+            for ident, (stage, entity) in list(self.targets.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append((frame.f_code.co_name, frame.f_code.co_filename, frame.f_code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    self.samples[(stage, entity, tuple(stack))] += 1
+        self._elapsed = time.perf_counter() - self._started_at
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+    def collapsed(self, stage:str|None = None) -> list[str]:
+        lines = Counter()
+        for (s, entity, stack), count in self.samples.items():
+            if stage is None or s == stage:
+                lines[";".join([s, entity] + [frame_label(f) for f in stack])] += count
+        return [f"{line} {count}" for line, count in sorted(lines.items())]
+
+    def summary(self) -> list[str]:
+        total = sum(self.samples.values()) or 1
+        per_entity = Counter()
+        per_category = {}
+        self_time = Counter()
+        inclusive = Counter()
+        for (stage, entity, stack), count in self.samples.items():
+            key = f"{stage} {entity}"
+            per_entity[key] += count
+            per_category.setdefault(key, Counter())[categorize(stack)] += count
+            self_time[frame_label(stack[-1])] += count
+            for label in {frame_label(f) for f in stack}:
+                inclusive[label] += count
+
+        #Ticks drift behind the nominal interval under load, so convert samples with the measured one
+        tick = self._elapsed / self._ticks if self._ticks else self.interval
+        lines = [f"{total} samples, one every {tick * 1000:.1f} ms over {self._elapsed:.1f} s", "", "Per stage thread (samples, categories):"]
+        for key, count in per_entity.most_common():
+            categories = ", ".join(f"{c} {n * 100 / count:.0f}%" for c, n in per_category[key].most_common())
+            lines.append(f"  {key:<32} {count:8d}  ~{count * tick:7.1f} s  {categories}")
+        lines += ["", f"Top {self.top} self time:"]
+        lines += [f"  {count * 100 / total:5.1f}%  {label}" for label, count in self_time.most_common(self.top)]
+        lines += ["", f"Top {self.top} inclusive time:"]
+        lines += [f"  {count * 100 / total:5.1f}%  {label}" for label, count in inclusive.most_common(self.top)]
+        return lines
+
+    def write(self) -> str:
+        directory = os.path.join(self.root, time.strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "all.collapsed"), "w") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+        for stage in sorted({stage for stage, _, _ in self.samples}):
+            with open(os.path.join(directory, f"{stage.lower()}.collapsed"), "w") as f:
+                f.write("\n".join(self.collapsed(stage)) + "\n")
+
+        summary = self.summary()
+        with open(os.path.join(directory, "summary.txt"), "w") as f:
+            f.write("\n".join(summary) + "\n")
+
+        print("\n".join(summary))
+        print(f"\nProfile written to {directory} (render with flamegraph.pl all.collapsed > all.svg)")
+        return directory